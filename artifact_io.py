@@ -0,0 +1,220 @@
+"""
+artifact_io.py — Read/write pipeline artifacts as CSV, Parquet or Feather.
+
+``apply_schema`` is the pipeline's dtype policy: datetime64 timestamps,
+categorical dimensions, the smallest integer type for calendar features and
+flags, float32 for engineered usage features and float32 for measures that
+round-trip exactly (the target ``usage_units`` stays float64). Stages apply
+it to the frames they produce and CSV reads apply it on load, so the lean
+dtypes are kept end to end. Columnar formats store the typed schema so
+downstream stages get their dtypes back without re-parsing, and support
+column projection on read. CSV is kept for compatibility with existing
+artifacts. The format is picked from the file extension.
+
+Tree models (RandomForest, XGBoost) split on float32 copies of their
+inputs, so float32 features give the same fits and metrics as float64.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+
+# Format used for intermediate artifacts (cleaned / featured data)
+ARTIFACT_FORMAT = os.environ.get("PIPELINE_ARTIFACT_FORMAT", "csv")
+EXTENSIONS = {"csv": ".csv", "parquet": ".parquet", "feather": ".feather"}
+
+CATEGORY_COLS = ["region", "service_type"]
+INT_COLS = [
+    "hour", "day_of_week", "day_of_month", "month", "quarter",
+    "is_weekend", "is_holiday", "day_of_year", "year",
+]
+FLOAT32_PREFIXES = ("usage_lag_", "usage_rolling_mean_")
+FLOAT32_COLS = [
+    "usage_lag_1", "usage_lag_7", "usage_rolling_mean_3",
+    "usage_rolling_mean_7", "usage_spike",
+]
+# Stored as float32 only when every value survives the round trip exactly
+LOSSLESS_FLOAT32_COLS = ["provisioned_capacity_allocated", "cost_usd", "availability_pct"]
+
+
+def artifact_path(stem: str, fmt: str = None) -> str:
+    """Return ``stem`` with the extension of ``fmt`` (default ARTIFACT_FORMAT)."""
+    fmt = fmt or ARTIFACT_FORMAT
+    if fmt not in EXTENSIONS:
+        raise ValueError(f"Unknown artifact format '{fmt}'. Choose from {list(EXTENSIONS)}")
+    return stem + EXTENSIONS[fmt]
+
+
+def _format_of(path) -> str:
+    ext = os.path.splitext(str(path))[1].lower()
+    for fmt, known in EXTENSIONS.items():
+        if ext == known:
+            return fmt
+    raise ValueError(f"Unsupported artifact extension '{ext}' for {path}")
+
+
+def _smallest_int(values: pd.Series):
+    """Narrowest signed integer dtype for an integral column (None if not integral)."""
+    if not pd.api.types.is_numeric_dtype(values) or values.isna().any():
+        return None
+    if values.dtype.kind == "f" and not (values % 1 == 0).all():
+        return None
+    lo, hi = (values.min(), values.max()) if len(values) else (0, 0)
+    for dtype in ("int8", "int16", "int32"):
+        info = np.iinfo(dtype)
+        if info.min <= lo and hi <= info.max:
+            return dtype
+    return "int64"
+
+
+def apply_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """Apply the dtype policy to known pipeline columns (returns a new frame)."""
+    dtypes = {}
+    if "timestamp" in df.columns and not pd.api.types.is_datetime64_any_dtype(df["timestamp"]):
+        df = df.assign(timestamp=pd.to_datetime(df["timestamp"]))
+    for col in CATEGORY_COLS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            dtypes[col] = "category"
+    for col in INT_COLS:
+        # Only narrow integral columns; leave anything unexpected untouched
+        if col in df.columns:
+            narrow = _smallest_int(df[col])
+            if narrow is not None and narrow != df[col].dtype:
+                dtypes[col] = narrow
+    for col in df.columns:
+        if (col in FLOAT32_COLS or col.startswith(FLOAT32_PREFIXES)) and df[col].dtype != "float32":
+            dtypes[col] = "float32"
+    for col in LOSSLESS_FLOAT32_COLS:
+        if col in df.columns and pd.api.types.is_numeric_dtype(df[col]) and df[col].dtype != "float32":
+            values = df[col].to_numpy(dtype="float64")
+            if np.array_equal(values.astype("float32").astype("float64"), values, equal_nan=True):
+                dtypes[col] = "float32"
+    return df.astype(dtypes) if dtypes else df
+
+
+def frame_mb(df: pd.DataFrame) -> float:
+    """Deep memory footprint of ``df`` in MB."""
+    return df.memory_usage(deep=True).sum() / 2 ** 20
+
+
+def memory_report(before, after, label: str = "") -> dict:
+    """Print and return the footprint of ``before`` vs ``after`` (frames or MB)."""
+    mb_before = frame_mb(before) if isinstance(before, pd.DataFrame) else before
+    mb_after = frame_mb(after) if isinstance(after, pd.DataFrame) else after
+    saved = 100 * (1 - mb_after / mb_before) if mb_before else 0.0
+    print(f"Memory{' (' + label + ')' if label else ''}: {mb_before:,.1f} MB → "
+          f"{mb_after:,.1f} MB ({saved:.0f}% saved)")
+    return {"before_mb": mb_before, "after_mb": mb_after, "saved_pct": saved}
+
+
+def _available_columns(path, fmt: str) -> list:
+    if fmt == "csv":
+        return pd.read_csv(path, nrows=0).columns.tolist()
+    import pyarrow.dataset as ds
+    return ds.dataset(path, format="feather" if fmt == "feather" else "parquet").schema.names
+
+
+def read_table(path, columns: list = None, schema: bool = True) -> pd.DataFrame:
+    """Load an artifact, optionally projecting to ``columns``.
+
+    Requested columns that are missing from the file are skipped rather than
+    raising, so callers can run their own schema validation. CSV reads get
+    the dtype policy applied unless ``schema`` is False (raw input that is
+    still to be cleaned).
+    """
+    fmt = _format_of(path)
+    if columns is not None:
+        available = set(_available_columns(path, fmt))
+        columns = [c for c in columns if c in available]
+    if fmt == "csv":
+        df = pd.read_csv(path, usecols=columns)
+        return apply_schema(df) if schema else df
+    if fmt == "parquet":
+        return pd.read_parquet(path, columns=columns)
+    return pd.read_feather(path, columns=columns)
+
+
+def iter_table(path, columns: list = None, chunksize: int = 500_000):
+    """Yield ``path`` as DataFrames of at most ``chunksize`` rows.
+
+    Missing ``columns`` are skipped as in ``read_table``.
+    """
+    fmt = _format_of(path)
+    if columns is not None:
+        available = set(_available_columns(path, fmt))
+        columns = [c for c in columns if c in available]
+    if fmt == "csv":
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunksize)
+        return
+    import pyarrow.dataset as ds
+    dataset = ds.dataset(path, format="feather" if fmt == "feather" else "parquet")
+    for batch in dataset.to_batches(columns=columns, batch_size=chunksize):
+        if batch.num_rows:
+            yield batch.to_pandas()
+
+
+def write_table(df: pd.DataFrame, path) -> None:
+    """Write ``df`` to ``path``; columnar formats get the typed schema applied."""
+    fmt = _format_of(path)
+    if fmt == "csv":
+        df.to_csv(path, index=False)
+    elif fmt == "parquet":
+        apply_schema(df).to_parquet(path, index=False)
+    else:
+        apply_schema(df).reset_index(drop=True).to_feather(path)
+
+
+def load_frame(source, columns: list = None, schema: bool = True) -> pd.DataFrame:
+    """Return ``source`` unchanged if it is a DataFrame, otherwise read it."""
+    if isinstance(source, pd.DataFrame):
+        return source
+    return read_table(source, columns=columns, schema=schema)
+
+
+class ChunkedTableWriter:
+    """Append DataFrame chunks to a CSV or Parquet artifact.
+
+    Used by the streaming stages, which never hold the full table in memory.
+    Feather has no append support and is rejected.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.format = _format_of(path)
+        if self.format == "feather":
+            raise ValueError("Chunked writes support CSV or Parquet, not Feather")
+        self._writer = None
+        self._first = True
+        self.rows = 0
+
+    def write(self, df: pd.DataFrame) -> None:
+        if self.format == "csv":
+            df.to_csv(self.path, mode="w" if self._first else "a",
+                      header=self._first, index=False)
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(apply_schema(df), preserve_index=False)
+            if self._writer is None:
+                # Fix dictionary index width so later chunks with more
+                # categories still match the file schema
+                fields = [
+                    pa.field(f.name, pa.dictionary(pa.int32(), f.type.value_type))
+                    if pa.types.is_dictionary(f.type) else f
+                    for f in table.schema
+                ]
+                self._writer = pq.ParquetWriter(self.path, pa.schema(fields))
+            self._writer.write_table(table.cast(self._writer.schema))
+        self._first = False
+        self.rows += len(df)
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,205 @@
+"""
+backtest.py — Rolling-origin (walk-forward) backtesting of RF and XGBoost.
+
+The featured data is loaded once into contiguous arrays. Folds are
+(train_start, train_end, test_end) row offsets aligned to timestamp
+boundaries, so every fold's train/test slice is a NumPy view rather than a
+copy. Worker processes receive the arrays once through the pool initializer
+(inherited without copying under fork) and are then sent only fold offsets.
+
+Random Forest folds are independent and run in parallel. XGBoost folds form
+a warm-start chain: each fold continues boosting the previous fold's booster
+with a few extra trees instead of refitting from scratch. Use
+``--no-warm-start`` to fit every XGBoost fold cold and in parallel.
+
+Usage:
+    python backtest.py --folds 20 --test-days 30 --mode expanding --workers 4
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+import xgboost as xgb
+from artifact_io import artifact_path, load_frame
+from milestone_3_model_development import FEATURES, RF_PARAMS, TARGET, XGB_PARAMS
+from model_search import thread_budget
+
+FOLD_METRICS_PATH = "backtest_fold_metrics.csv"
+SERIES_METRICS_PATH = "backtest_series_metrics.csv"
+WARM_START_TREES = 20    # extra boosting rounds per warm-started XGBoost fold
+
+# Per-worker arrays, set once by _init_worker
+_DATA = {}
+
+
+def rolling_origin_folds(timestamps, n_folds: int, test_days: int,
+                         mode: str = "expanding", train_days: int = None) -> list:
+    """Return ``[(train_start, train_end, test_end), ...]`` row offsets.
+
+    ``timestamps`` must be sorted. The last ``n_folds * test_days`` days are
+    split into consecutive test windows; each fold trains on everything
+    before its window (``expanding``) or on the preceding ``train_days``
+    (``sliding``).
+    """
+    if mode not in ("expanding", "sliding"):
+        raise ValueError("mode must be 'expanding' or 'sliding'")
+    if mode == "sliding" and not train_days:
+        raise ValueError("sliding mode needs train_days")
+    ts = pd.DatetimeIndex(timestamps)
+    last = ts[-1].normalize() + pd.Timedelta(days=1)
+    folds = []
+    for k in range(n_folds, 0, -1):
+        test_start_ts = last - pd.Timedelta(days=k * test_days)
+        test_end_ts = test_start_ts + pd.Timedelta(days=test_days)
+        train_end = int(ts.searchsorted(test_start_ts, side="left"))
+        test_end = int(ts.searchsorted(test_end_ts, side="left"))
+        train_start = 0
+        if mode == "sliding":
+            train_start = int(ts.searchsorted(test_start_ts - pd.Timedelta(days=train_days)))
+        if train_end - train_start < 1 or test_end <= train_end:
+            raise ValueError(f"Fold ending {test_end_ts.date()} has no train or test rows; "
+                             "use fewer folds or a shorter test window")
+        folds.append((train_start, train_end, test_end))
+    return folds
+
+
+def _init_worker(X, y, codes, n_threads):
+    _DATA.update(X=X, y=y, codes=codes, n_threads=n_threads)
+
+
+def _fold_result(model_name, fold, bounds, preds, start):
+    train_start, train_end, test_end = bounds
+    err = preds - _DATA["y"][train_end:test_end]
+    return {
+        "model": model_name, "fold": fold,
+        "train_rows": train_end - train_start, "test_rows": test_end - train_end,
+        "mae": float(np.mean(np.abs(err))), "rmse": float(np.sqrt(np.mean(err ** 2))),
+        "fit_seconds": time.time() - start,
+        "errors": err,
+    }
+
+
+def _run_rf_fold(fold, bounds):
+    start = time.time()
+    train_start, train_end, test_end = bounds
+    X, y = _DATA["X"], _DATA["y"]
+    model = RandomForestRegressor(**RF_PARAMS, n_jobs=_DATA["n_threads"])
+    model.fit(X[train_start:train_end], y[train_start:train_end])
+    return [_fold_result("Random Forest", fold, bounds, model.predict(X[train_end:test_end]), start)]
+
+
+def _run_xgb_folds(folds, warm_start: bool):
+    """Fit XGBoost on ``folds`` in order, warm-starting each from the last."""
+    X, y = _DATA["X"], _DATA["y"]
+    results, booster = [], None
+    for fold, bounds in folds:
+        start = time.time()
+        train_start, train_end, test_end = bounds
+        params = dict(XGB_PARAMS, n_jobs=_DATA["n_threads"])
+        if warm_start and booster is not None:
+            params["n_estimators"] = WARM_START_TREES
+        model = xgb.XGBRegressor(**params)
+        model.fit(X[train_start:train_end], y[train_start:train_end],
+                  xgb_model=booster if warm_start else None)
+        booster = model.get_booster()
+        results.append(_fold_result("XGBoost", fold, bounds, model.predict(X[train_end:test_end]), start))
+    return results
+
+
+def run_backtest(featured, n_folds: int = 20, test_days: int = 30, mode: str = "expanding",
+                 train_days: int = None, n_workers: int = None, warm_start: bool = True):
+    """Walk-forward evaluation of RF and XGBoost.
+
+    Returns ``(fold_metrics, series_metrics)`` DataFrames: MAE/RMSE per
+    (model, fold), and per (model, region, service_type) over all folds.
+    """
+    df = load_frame(featured, columns=["timestamp", "region", "service_type"] + FEATURES + [TARGET])
+    df = df.assign(timestamp=pd.to_datetime(df["timestamp"]))
+    if not df["timestamp"].is_monotonic_increasing:
+        df = df.sort_values("timestamp", kind="stable").reset_index(drop=True)
+
+    X = np.ascontiguousarray(df[FEATURES].to_numpy(dtype="float32"))
+    y = df[TARGET].to_numpy(dtype="float64")
+    grouped = df.groupby(["region", "service_type"], sort=True, observed=True)
+    codes = grouped.ngroup().to_numpy()
+    series_keys = list(grouped.groups.keys())
+
+    folds = rolling_origin_folds(df["timestamp"], n_folds, test_days, mode, train_days)
+    n_workers = n_workers or min(os.cpu_count() or 1, 4)
+    n_threads = thread_budget(n_workers)
+    print(f"Backtest: {len(folds)} {mode} folds × 2 models, "
+          f"{n_workers} workers × {n_threads} threads, XGBoost warm start={warm_start}")
+
+    start = time.time()
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker,
+                             initargs=(X, y, codes, n_threads)) as pool:
+        # Submit the sequential XGBoost chain first so it overlaps the RF folds
+        if warm_start:
+            futures = [pool.submit(_run_xgb_folds, list(enumerate(folds)), True)]
+        else:
+            futures = [pool.submit(_run_xgb_folds, [(i, b)], False) for i, b in enumerate(folds)]
+        futures += [pool.submit(_run_rf_fold, i, b) for i, b in enumerate(folds)]
+        results = [r for f in futures for r in f.result()]
+    print(f"Backtest finished in {time.time() - start:.1f}s")
+
+    # Per-series metrics: scatter fold errors back onto series codes
+    series_rows = []
+    for model_name in ("Random Forest", "XGBoost"):
+        abs_sum = np.zeros(len(series_keys))
+        sq_sum = np.zeros(len(series_keys))
+        count = np.zeros(len(series_keys))
+        for r in (r for r in results if r["model"] == model_name):
+            _, train_end, test_end = folds[r["fold"]]
+            c = codes[train_end:test_end]
+            abs_sum += np.bincount(c, weights=np.abs(r["errors"]), minlength=len(series_keys))
+            sq_sum += np.bincount(c, weights=r["errors"] ** 2, minlength=len(series_keys))
+            count += np.bincount(c, minlength=len(series_keys))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mae, rmse = abs_sum / count, np.sqrt(sq_sum / count)
+        for (region, s_type), n, m, r in zip(series_keys, count, mae, rmse):
+            series_rows.append({"model": model_name, "region": region, "service_type": s_type,
+                                "test_rows": int(n), "mae": m, "rmse": r})
+
+    fold_metrics = pd.DataFrame([{k: v for k, v in r.items() if k != "errors"} for r in results])
+    fold_metrics = fold_metrics.sort_values(["model", "fold"]).reset_index(drop=True)
+    return fold_metrics, pd.DataFrame(series_rows)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Rolling-origin backtest of RF and XGBoost")
+    parser.add_argument("--input", default=artifact_path("milestone_2_featured_data"))
+    parser.add_argument("--folds", type=int, default=20)
+    parser.add_argument("--test-days", type=int, default=30)
+    parser.add_argument("--mode", choices=["expanding", "sliding"], default="expanding")
+    parser.add_argument("--train-days", type=int, default=None,
+                        help="training window length for --mode sliding")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--no-warm-start", action="store_true",
+                        help="fit every XGBoost fold from scratch")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.input):
+        print(f"Error: '{args.input}' not found. Please run Milestone 2 first.")
+        return 1
+    fold_metrics, series_metrics = run_backtest(
+        args.input, n_folds=args.folds, test_days=args.test_days, mode=args.mode,
+        train_days=args.train_days, n_workers=args.workers, warm_start=not args.no_warm_start,
+    )
+    fold_metrics.to_csv(FOLD_METRICS_PATH, index=False)
+    series_metrics.to_csv(SERIES_METRICS_PATH, index=False)
+
+    summary = fold_metrics.groupby("model")[["mae", "rmse"]].agg(["mean", "std"])
+    print("\nMAE / RMSE across folds:")
+    print(summary.round(2).to_string())
+    print(f"\nPer-fold metrics saved to {FOLD_METRICS_PATH}")
+    print(f"Per-series metrics saved to {SERIES_METRICS_PATH}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
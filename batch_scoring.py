@@ -0,0 +1,188 @@
+"""
+batch_scoring.py — Full-fleet scoring: every series, every time point.
+
+Unlike ``run_integration`` (which scores the latest 500 rows), the featured
+data is streamed in fixed-size chunks: each chunk is predicted, run through
+``compute_capacity_actions`` and appended to a partitioned report
+
+    <out>/region=<region>/period=<YYYY-MM>/part.<csv|parquet>
+
+so memory stays bounded by the chunk size (times the number of chunks in
+flight). At most ``max_open_writers`` partition writers stay open (least
+recently written closed first); a partition written again after its writer
+was closed continues in ``part.1``, ``part.2``, ... next to ``part``. With ``--workers N`` chunks are scored in a process pool; each
+worker loads the model once, which is cheap with a ``model_store``
+directory because forest arrays are memory-mapped and shared.
+
+Usage:
+    python batch_scoring.py --out scored_fleet --chunksize 200000 --workers 4
+    python milestone_4_integration.py --batch
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from artifact_io import ChunkedTableWriter, artifact_path, iter_table
+from milestone_4_integration import CAPACITY_COL, FEATURES, REPORT_COLS, _load_model, plan_capacity
+from quantile_forecast import SERVICE_LEVEL, load_quantile_model, quantile_col
+
+BATCH_DIR = "scored_fleet"
+SUMMARY_FILE = "_summary.json"
+DEFAULT_CHUNKSIZE = 200_000
+MAX_OPEN_WRITERS = 64
+PERIOD_FORMATS = {"day": "%Y-%m-%d", "month": "%Y-%m", "year": "%Y"}
+SCORED_COLS = REPORT_COLS + ["potential_savings"]
+
+# Per-worker model and thresholds, set once by _init_worker
+_STATE = {}
+
+
+def _init_worker(model_path, thresholds, service_level=SERVICE_LEVEL) -> None:
+    model = _load_model(model_path)
+    quantile_model = load_quantile_model(model_path)
+    scored_cols = SCORED_COLS + ([quantile_col(q) for q in quantile_model.quantiles]
+                                 if quantile_model is not None else [])
+    _STATE.update(model=model, thresholds=thresholds, quantile_model=quantile_model,
+                  service_level=service_level, scored_cols=scored_cols,
+                  model_cols=FEATURES + list(getattr(model, "group_cols", [])))
+
+
+def _score_chunk(chunk: pd.DataFrame) -> pd.DataFrame:
+    """Forecast and classify one chunk; returns ``SCORED_COLS`` (+ quantile forecasts)."""
+    missing = [c for c in _STATE["model_cols"] + ["timestamp", CAPACITY_COL] if c not in chunk.columns]
+    if missing:
+        raise ValueError(f"Missing required columns in featured data: {missing}")
+    chunk = chunk.reset_index(drop=True)
+    chunk["forecasted_usage"] = _STATE["model"].predict(chunk[_STATE["model_cols"]])
+    chunk["timestamp"] = pd.to_datetime(chunk["timestamp"])
+    chunk = plan_capacity(chunk, _STATE["quantile_model"], _STATE["thresholds"],
+                          _STATE["service_level"])
+    return chunk[_STATE["scored_cols"]]
+
+
+def _prepare_out_dir(out_dir: str, overwrite: bool) -> None:
+    if os.path.isdir(out_dir) and os.listdir(out_dir):
+        if not overwrite:
+            raise FileExistsError(f"{out_dir} is not empty; pass overwrite=True (--overwrite) to replace it")
+        shutil.rmtree(out_dir)
+    os.makedirs(out_dir, exist_ok=True)
+
+
+def score_fleet(featured_path: str, model_path, out_dir: str = BATCH_DIR,
+                chunksize: int = DEFAULT_CHUNKSIZE, n_workers: int = 1,
+                period: str = "month", fmt: str = "csv", thresholds=None,
+                service_level: float = SERVICE_LEVEL, overwrite: bool = False,
+                max_open_writers: int = MAX_OPEN_WRITERS) -> dict:
+    """Score all rows of ``featured_path`` into a partitioned report.
+
+    Returns a summary dict (rows, seconds, rows_per_sec, partitions, action
+    counts, savings), which is also written to ``<out_dir>/_summary.json``.
+    """
+    if period not in PERIOD_FORMATS:
+        raise ValueError(f"period must be one of {list(PERIOD_FORMATS)}")
+    _prepare_out_dir(out_dir, overwrite)
+    if thresholds is not None and not isinstance(thresholds, pd.DataFrame):
+        thresholds = pd.read_csv(thresholds)
+
+    start = time.time()
+    # Open writers in LRU order; part files written so far per partition
+    writers, parts, action_counts = OrderedDict(), {}, {}
+    rows, total_savings = 0, 0.0
+
+    def _write(scored: pd.DataFrame) -> None:
+        nonlocal rows, total_savings
+        rows += len(scored)
+        total_savings += float(scored["potential_savings"].sum())
+        for action, n in scored["infrastructure_action"].value_counts().items():
+            action_counts[action] = action_counts.get(action, 0) + int(n)
+        periods = scored["timestamp"].dt.strftime(PERIOD_FORMATS[period])
+        for (region, p), part in scored.groupby([scored["region"].astype(str), periods], sort=False):
+            key = (region, p)
+            if key in writers:
+                writers.move_to_end(key)
+            else:
+                if len(writers) >= max_open_writers:
+                    writers.popitem(last=False)[1].close()
+                part_dir = os.path.join(out_dir, f"region={region}", f"period={p}")
+                os.makedirs(part_dir, exist_ok=True)
+                n = parts.get(key, 0)
+                name = "part" if n == 0 else f"part.{n}"
+                writers[key] = ChunkedTableWriter(os.path.join(part_dir, artifact_path(name, fmt)))
+                parts[key] = n + 1
+            writers[key].write(part)
+
+    chunks = iter_table(featured_path, chunksize=chunksize)
+    print(f"Scoring {featured_path} in chunks of {chunksize:,} rows with {n_workers} worker(s)...")
+    try:
+        if n_workers <= 1:
+            _init_worker(model_path, thresholds, service_level)
+            for chunk in chunks:
+                _write(_score_chunk(chunk))
+        else:
+            with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker,
+                                     initargs=(model_path, thresholds, service_level)) as pool:
+                # At most 2 chunks per worker in flight; results are written
+                # in input order so the output does not depend on scheduling
+                pending = deque()
+                for chunk in chunks:
+                    pending.append(pool.submit(_score_chunk, chunk))
+                    if len(pending) >= 2 * n_workers:
+                        _write(pending.popleft().result())
+                while pending:
+                    _write(pending.popleft().result())
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    seconds = time.time() - start
+    summary = {
+        "rows": rows, "seconds": round(seconds, 3),
+        "rows_per_sec": round(rows / seconds, 1) if seconds > 0 else None,
+        "chunksize": chunksize, "workers": n_workers, "period": period,
+        "partitions": len(parts), "part_files": sum(parts.values()), "actions": action_counts,
+        "potential_savings": total_savings,
+    }
+    with open(os.path.join(out_dir, SUMMARY_FILE), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    print(f"Scored {rows:,} rows in {seconds:.2f}s ({summary['rows_per_sec']:,} rows/sec) "
+          f"into {len(parts)} partitions under {out_dir}")
+    return summary
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Full-fleet batch scoring")
+    parser.add_argument("--input", default=artifact_path("milestone_2_featured_data"))
+    parser.add_argument("--model", default="best_demand_forecast_model")
+    parser.add_argument("--out", default=BATCH_DIR)
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--period", choices=list(PERIOD_FORMATS), default="month")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--thresholds", default=None,
+                        help="CSV of per region/service_type buffer_pct and action_margin")
+    parser.add_argument("--service-level", type=float, default=SERVICE_LEVEL,
+                        help="forecast quantile capacity is planned at (with a quantile model)")
+    parser.add_argument("--overwrite", action="store_true", help="replace an existing --out directory")
+    parser.add_argument("--max-open-writers", type=int, default=MAX_OPEN_WRITERS,
+                        help="partition writers kept open at once (bounds open files)")
+    args = parser.parse_args(argv)
+
+    for path in (args.input, args.model):
+        if not os.path.exists(path):
+            print(f"Error: '{path}' not found. Please run Milestones 1–3 first.")
+            return 1
+    score_fleet(args.input, args.model, out_dir=args.out, chunksize=args.chunksize,
+                n_workers=args.workers, period=args.period, fmt=args.format,
+                thresholds=args.thresholds, service_level=args.service_level,
+                overwrite=args.overwrite, max_open_writers=args.max_open_writers)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,252 @@
+"""
+bench_pipeline.py — Stage-by-stage pipeline benchmark on synthetic data.
+
+``iter_synthetic`` generates raw demand data with the schema of
+``azure_compute_storage_demand_10000_rows.csv`` at any size, vectorised per
+chunk: 5 regions × 2 service types spread over 3 years of daily timestamps
+(several rows per series per day, as in the sample), the same value ranges,
+and a small fraction of exact duplicates and missing values so the cleaning
+paths do real work. ``write_synthetic`` streams the chunks to disk through
+``ChunkedTableWriter``, so generating 100M+ rows needs memory for one chunk.
+
+For every size, each stage — ``prepare_data``, ``engineer_features``,
+``train_and_evaluate``, ``run_integration`` — runs in its own subprocess on
+the previous stage's artifact, so wall time, peak RSS and rows/sec are per
+stage and not polluted by earlier stages. From the timings a scaling
+exponent (time ∝ rows^k) is fitted per stage and the first size at which a
+stage grows clearly faster than linearly is reported.
+
+Usage:
+    python bench_pipeline.py --sizes 10000 100000 1000000
+    python bench_pipeline.py --sizes 1e6 1e7 --stages prep features --format parquet
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from artifact_io import ChunkedTableWriter, write_table
+from bench_utils import git_commit, peak_rss_mb
+
+RESULTS_PATH = "bench_pipeline.json"
+STAGES = ["prep", "features", "train", "integrate"]
+REGIONS = ["westus", "eastus", "southeastasia", "centralindia", "northeurope"]
+SERVICES = ["Compute", "Storage"]
+COST_PER_UNIT = {"Compute": 1.5, "Storage": 0.5}
+LINEAR_TOLERANCE = 0.15      # local exponent above 1 + this counts as superlinear
+CHUNK_ROWS = 1_000_000       # rows generated and written at a time
+
+
+def iter_synthetic(n_rows: int, seed: int = 0, start: str = "2022-01-01", days: int = 1095,
+                   duplicate_frac: float = 0.001, missing_frac: float = 0.001,
+                   chunk_rows: int = CHUNK_ROWS):
+    """Raw demand data shaped like the 10k-row sample, in timestamp order.
+
+    Yields frames of at most ``chunk_rows`` rows with categorical ``region``
+    and ``service_type``. Rows per day are drawn up front, so each chunk is
+    generated on its own and the chunks still come out sorted.
+    """
+    ends = np.cumsum(np.random.default_rng(seed).multinomial(n_rows, np.full(days, 1 / days)))
+    cost = np.array([COST_PER_UNIT[s] for s in SERVICES])
+    for i, lo in enumerate(range(0, n_rows, chunk_rows)):
+        n = min(chunk_rows, n_rows - lo)
+        rng = np.random.default_rng([seed, i])
+        day = np.searchsorted(ends, np.arange(lo, lo + n), side="right")
+        region = rng.integers(0, len(REGIONS), n)
+        service = rng.integers(0, len(SERVICES), n)
+        usage = rng.integers(4_000, 30_000, n)
+        cols = {
+            "timestamp": (np.datetime64(start, "D") + day).astype("datetime64[ns]"),
+            "region": region,
+            "service_type": service,
+            "usage_units": usage,
+            "provisioned_capacity_allocated": (usage * rng.uniform(1.05, 1.35, n)).astype("int64"),
+            "cost_usd": usage * cost[service],
+            "availability_pct": np.round(rng.uniform(99.5, 99.99, n), 2),
+            "is_holiday": (rng.random(n) < 0.1).astype("int64"),
+        }
+        # Exact duplicates of the preceding row keep the chunk sorted
+        n_dupes = min(int(n * duplicate_frac), n - 1)
+        if n_dupes > 0:
+            dupes = rng.choice(np.arange(1, n), n_dupes, replace=False)
+            for values in cols.values():
+                values[dupes] = values[dupes - 1]
+        if missing_frac > 0:
+            # Always float64, so every chunk has the same schema
+            for col in ("usage_units", "cost_usd", "availability_pct"):
+                values = cols[col].astype("float64")
+                values[rng.random(n) < missing_frac] = np.nan
+                cols[col] = values
+        cols["region"] = pd.Categorical.from_codes(region, REGIONS)
+        cols["service_type"] = pd.Categorical.from_codes(service, SERVICES)
+        yield pd.DataFrame(cols, index=pd.RangeIndex(lo, lo + n))
+
+
+def generate_synthetic(n_rows: int, seed: int = 0, **kwargs) -> pd.DataFrame:
+    """All of ``iter_synthetic`` in one frame (small sizes and tests)."""
+    return pd.concat(iter_synthetic(n_rows, seed=seed, **kwargs))
+
+
+def write_synthetic(path: str, n_rows: int, seed: int = 0, **kwargs) -> None:
+    """Write ``iter_synthetic`` chunk by chunk, never holding the full table.
+
+    Feather has no append support, so a Feather target is assembled in memory.
+    """
+    chunks = iter_synthetic(n_rows, seed=seed, **kwargs)
+    if path.endswith(".feather"):
+        write_table(pd.concat(chunks), path)
+        return
+    with ChunkedTableWriter(path) as writer:
+        for chunk in chunks:
+            writer.write(chunk)
+
+
+def _paths(workdir: str, fmt: str) -> dict:
+    ext = {"csv": ".csv", "parquet": ".parquet", "feather": ".feather"}[fmt]
+    return {"raw": os.path.join(workdir, "raw" + ext),
+            "cleaned": os.path.join(workdir, "cleaned" + ext),
+            "featured": os.path.join(workdir, "featured" + ext),
+            "model": os.path.join(workdir, "model"),
+            "report": os.path.join(workdir, "report.csv")}
+
+
+def run_stage(stage: str, workdir: str, fmt: str) -> dict:
+    """Run one stage in this process (called in the per-stage subprocess)."""
+    paths = _paths(workdir, fmt)
+    if stage == "prep":
+        from milestone_1_data_prep import prepare_data
+        call = lambda: prepare_data(paths["raw"], paths["cleaned"])
+    elif stage == "features":
+        from milestone_2_feature_engineering import engineer_features
+        call = lambda: engineer_features(paths["cleaned"], paths["featured"])
+    elif stage == "train":
+        from milestone_3_model_development import train_and_evaluate
+        call = lambda: train_and_evaluate(paths["featured"], paths["model"])
+    elif stage == "integrate":
+        from milestone_4_integration import run_integration
+        # Keep the synthetic snapshot out of the real drift monitor state
+        drift_state = os.path.join(os.path.dirname(paths["report"]), "drift_state.pkl")
+        call = lambda: run_integration(paths["featured"], paths["model"], paths["report"],
+                                       drift_state=drift_state)
+    else:
+        raise ValueError(f"Unknown stage '{stage}'")
+    rss_start = peak_rss_mb()
+    start = time.perf_counter()
+    call()
+    return {"seconds": time.perf_counter() - start, "peak_rss_mb": peak_rss_mb(),
+            "rss_start_mb": rss_start}
+
+
+def scaling(results: list, tolerance: float = LINEAR_TOLERANCE) -> dict:
+    """Fitted and local exponents of time vs rows per stage.
+
+    ``superlinear_from`` is the first size whose step from the previous size
+    has a local exponent above ``1 + tolerance``.
+    """
+    out = {}
+    for stage in STAGES:
+        ok = sorted((r["rows"], r["seconds"]) for r in results
+                    if r["stage"] == stage and r["status"] == "ok" and r["seconds"] > 0)
+        if len(ok) < 2:
+            continue
+        rows, secs = np.log([r for r, _ in ok]), np.log([s for _, s in ok])
+        local = [{"from": ok[i][0], "to": ok[i + 1][0],
+                  "exponent": float((secs[i + 1] - secs[i]) / (rows[i + 1] - rows[i]))}
+                 for i in range(len(ok) - 1)]
+        superlinear = next((step["to"] for step in local if step["exponent"] > 1 + tolerance), None)
+        out[stage] = {"exponent": float(np.polyfit(rows, secs, 1)[0]), "local": local,
+                      "superlinear_from": superlinear}
+    return out
+
+
+def run_suite(sizes: list, stages: list = STAGES, fmt: str = "csv", workdir: str = None,
+              timeout: float = None, seed: int = 0, keep: bool = False) -> dict:
+    """Generate each size and time ``stages`` in subprocesses."""
+    base = workdir or tempfile.mkdtemp(prefix="bench_pipeline_")
+    repo = os.path.dirname(os.path.abspath(__file__))
+    env = {**os.environ, "PYTHONPATH": repo + os.pathsep + os.environ.get("PYTHONPATH", ""),
+           "PYTHONIOENCODING": "utf-8"}
+    results = []
+    try:
+        for n in sizes:
+            size_dir = os.path.join(base, str(n))
+            os.makedirs(size_dir, exist_ok=True)
+            start = time.perf_counter()
+            write_synthetic(_paths(size_dir, fmt)["raw"], n, seed=seed)
+            print(f"\n[{n:,} rows] generated in {time.perf_counter() - start:.1f}s")
+
+            failed = False
+            for stage in stages:
+                row = {"rows": n, "stage": stage, "status": "skipped", "seconds": None,
+                       "peak_rss_mb": None, "rows_per_sec": None}
+                if not failed:
+                    cmd = [sys.executable, os.path.abspath(__file__), "--stage", stage,
+                           "--workdir", size_dir, "--format", fmt]
+                    with open(os.path.join(size_dir, f"{stage}.log"), "w", encoding="utf-8") as log:
+                        try:
+                            proc = subprocess.run(cmd, cwd=size_dir, env=env, stdout=log,
+                                                  stderr=subprocess.STDOUT, timeout=timeout)
+                            row["status"] = "ok" if proc.returncode == 0 else "failed"
+                        except subprocess.TimeoutExpired:
+                            row["status"] = "timeout"
+                    if row["status"] == "ok":
+                        with open(os.path.join(size_dir, f"{stage}.json"), encoding="utf-8") as f:
+                            row.update(json.load(f))
+                        row["rows_per_sec"] = n / row["seconds"] if row["seconds"] else None
+                    failed = row["status"] != "ok"
+                results.append(row)
+                shown = (f"{row['seconds']:8.2f}s  {row['peak_rss_mb']:8.0f} MB  "
+                         f"{row['rows_per_sec']:12,.0f} rows/s" if row["status"] == "ok"
+                         else row["status"].upper())
+                print(f"  {stage:<10} {shown}")
+    finally:
+        if not keep and workdir is None:
+            shutil.rmtree(base, ignore_errors=True)
+
+    return {"commit": git_commit(), "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "format": fmt, "cpu_count": os.cpu_count(), "sizes": sizes,
+            "results": results, "scaling": scaling(results)}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Per-stage pipeline scaling benchmark")
+    parser.add_argument("--sizes", type=float, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--format", choices=["csv", "parquet", "feather"], default="csv")
+    parser.add_argument("--workdir", default=None, help="keep artifacts here instead of a temp dir")
+    parser.add_argument("--timeout", type=float, default=None, help="per-stage timeout (s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=RESULTS_PATH)
+    parser.add_argument("--stage", choices=STAGES, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.stage:
+        # Child process: run a single stage and leave its measurements next to it
+        result = run_stage(args.stage, args.workdir, args.format)
+        with open(os.path.join(args.workdir, f"{args.stage}.json"), "w", encoding="utf-8") as f:
+            json.dump(result, f)
+        return 0
+
+    sizes = [int(s) for s in args.sizes]
+    report = run_suite(sizes, stages=args.stages, fmt=args.format, workdir=args.workdir,
+                       timeout=args.timeout, seed=args.seed)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print("\nScaling (time ∝ rows^k):")
+    for stage, info in report["scaling"].items():
+        where = (f"superlinear from {info['superlinear_from']:,} rows"
+                 if info["superlinear_from"] else "linear or better")
+        print(f"  {stage:<10} k = {info['exponent']:.2f}  ({where})")
+    print(f"\nResults saved to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
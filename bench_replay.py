@@ -0,0 +1,264 @@
+"""
+bench_replay.py — Replay a JSONL request file against the scoring path.
+
+Each line of the request file becomes one forecast/recommendation request.
+Lines that carry ``region`` / ``service_type`` / ``timestamp`` /
+``provisioned_capacity`` are used as given; any other record (e.g. the
+backlog entries in ``requests.jsonl``) is mapped deterministically onto a
+known series and a capacity near the series' last usage via a CRC of the
+record, at the day after the history watermark (the service forecasts one
+step ahead), so every run replays the same workload.
+
+Targets:
+    inprocess  ForecastService scoring path (features → micro-batched
+               predict → plan_capacity, at the service level when a
+               quantile model is stored next to --model) without HTTP
+    http       a running forecast_service.py at --url
+
+Load is closed-loop with ``--concurrency`` workers, or open-loop at
+``--rate`` requests/sec (latency then counts from the scheduled send time,
+so queueing delay is not hidden). Results are JSON with the git commit, so
+runs can be compared across commits with ``--baseline``.
+
+Usage:
+    python bench_replay.py --requests requests.jsonl --count 5000 --concurrency 16
+    python bench_replay.py --target http --url http://127.0.0.1:8080 --rate 500
+    python bench_replay.py --baseline bench_replay_prev.json --tolerance 0.10
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+import zlib
+from urllib.parse import urlparse
+import numpy as np
+import pandas as pd
+from artifact_io import artifact_path
+from bench_utils import git_commit, peak_rss_mb
+from forecast_service import ForecastService
+from horizon_forecast import _parse_features
+from incremental_features import FeatureState
+from milestone_3_model_development import FEATURES, MODEL_PATH
+from milestone_4_integration import _load_model
+from quantile_forecast import load_quantile_model
+
+RESULTS_PATH = "bench_replay.json"
+
+
+def load_requests(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def map_request(record: dict, series: list, last_usage: dict, origin: pd.Timestamp) -> dict:
+    """Turn ``record`` into a scoring request, filling missing fields deterministically."""
+    crc = zlib.crc32(json.dumps(record, sort_keys=True).encode())
+    region, service_type = record.get("region"), record.get("service_type")
+    if region is None or service_type is None:
+        region, service_type = series[crc % len(series)]
+    timestamp = record.get("timestamp") or str((origin + pd.Timedelta(days=1)).date())
+    capacity = record.get("provisioned_capacity")
+    if capacity is None:
+        capacity = round(last_usage.get((region, service_type), 1.0) * (0.8 + (crc >> 8) % 50 / 100), 1)
+    return {"region": region, "service_type": service_type,
+            "timestamp": timestamp, "provisioned_capacity": capacity}
+
+
+def _percentiles(latencies_ms: list) -> dict:
+    lat = np.asarray(latencies_ms)
+    if not lat.size:
+        return {}
+    return {"p50": float(np.percentile(lat, 50)), "p95": float(np.percentile(lat, 95)),
+            "p99": float(np.percentile(lat, 99)), "mean": float(lat.mean()), "max": float(lat.max())}
+
+
+class _HttpClient:
+    """One keep-alive connection to the forecast service."""
+
+    def __init__(self, host: str, port: int):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def post(self, path: str, payload: dict) -> int:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = json.dumps(payload).encode()
+        self.writer.write(f"POST {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+                          f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n"
+                          .encode() + body)
+        await self.writer.drain()
+        head = await self.reader.readuntil(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        length = next(int(l.split(":", 1)[1]) for l in lines if l.lower().startswith("content-length"))
+        await self.reader.readexactly(length)
+        return int(lines[0].split()[1])
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+
+
+async def _replay(requests: list, send, concurrency: int, rate: float = None) -> tuple:
+    """Run ``send(worker, request)`` for all requests; returns (latencies_ms, errors, seconds)."""
+    latencies, errors = [], 0
+    queue = asyncio.Queue()
+    start = time.perf_counter()
+    for i, req in enumerate(requests):
+        # Open loop: request i is due at i / rate seconds after start
+        queue.put_nowait((start + i / rate if rate else None, req))
+
+    async def worker(worker_id: int) -> None:
+        nonlocal errors
+        while True:
+            try:
+                due, req = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            if due is not None:
+                await asyncio.sleep(max(0.0, due - time.perf_counter()))
+            t0 = due if due is not None else time.perf_counter()
+            try:
+                ok = await send(worker_id, req)
+            except Exception:
+                ok = False
+            latencies.append((time.perf_counter() - t0) * 1000)
+            errors += not ok
+
+    await asyncio.gather(*(worker(w) for w in range(concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+
+def run_benchmark(request_file: str, target: str = "inprocess", count: int = 2000,
+                  concurrency: int = 16, rate: float = None, model_path: str = MODEL_PATH,
+                  history: str = None, url: str = "http://127.0.0.1:8080",
+                  endpoint: str = "/recommend", max_batch: int = 256,
+                  max_wait_ms: float = 1.0, warmup: int = 50) -> dict:
+    """Replay ``count`` requests (cycling through ``request_file``) and return the result dict."""
+    records = load_requests(request_file)
+    if not records:
+        raise ValueError(f"No requests in {request_file}")
+    history = history or artifact_path("milestone_1_cleaned_data")
+
+    model = _load_model(model_path)
+    features = list(getattr(model, "features", None) or FEATURES)
+    lags, windows = _parse_features(features)
+    state = FeatureState(lags, windows).fit(history)
+    last = state.tail.groupby(["region", "service_type"], observed=True)["usage_units"].last()
+    last_usage = {(str(r), str(s)): float(v) for (r, s), v in last.items()}
+    series = sorted(last_usage)
+    mapped = [map_request(r, series, last_usage, pd.Timestamp(state.watermark)) for r in records]
+    workload = [mapped[i % len(mapped)] for i in range(count)]
+    if endpoint == "/forecast":
+        workload = [{k: v for k, v in r.items() if k != "provisioned_capacity"} for r in workload]
+
+    rss_before = peak_rss_mb()
+
+    async def main() -> tuple:
+        if target == "inprocess":
+            service = ForecastService(model, state, features=features, max_batch=max_batch,
+                                      max_wait_ms=max_wait_ms,
+                                      quantile_model=load_quantile_model(model_path))
+            service.start_batching()
+
+            async def send(_, req):
+                await service.submit(req)
+                return True
+            try:
+                await _replay(workload[:warmup], send, concurrency)
+                return await _replay(workload, send, concurrency, rate)
+            finally:
+                await service.stop()
+        parsed = urlparse(url)
+        clients = [_HttpClient(parsed.hostname, parsed.port or 80) for _ in range(concurrency)]
+
+        async def send(worker_id, req):
+            return await clients[worker_id].post(endpoint, req) == 200
+        try:
+            await _replay(workload[:warmup], send, concurrency)
+            return await _replay(workload, send, concurrency, rate)
+        finally:
+            for c in clients:
+                c.close()
+
+    latencies, errors, seconds = asyncio.run(main())
+    return {
+        "commit": git_commit(),
+        "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "target": target, "endpoint": endpoint, "request_file": os.path.basename(request_file),
+        "requests": count, "concurrency": concurrency, "rate": rate,
+        "max_batch": max_batch, "max_wait_ms": max_wait_ms,
+        "seconds": round(seconds, 4),
+        "throughput_rps": count / seconds if seconds > 0 else None,
+        "errors": errors,
+        "latency_ms": _percentiles(latencies),
+        "peak_rss_mb": peak_rss_mb(), "rss_before_mb": rss_before,
+        "python": platform.python_version(), "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(result: dict, baseline: dict, tolerance: float = 0.10) -> list:
+    """Regressions of ``result`` vs ``baseline`` beyond ``tolerance`` (relative)."""
+    regressions = []
+    if result.get("throughput_rps") and baseline.get("throughput_rps"):
+        change = result["throughput_rps"] / baseline["throughput_rps"] - 1
+        if change < -tolerance:
+            regressions.append(f"throughput {change:+.1%}")
+    for q in ("p50", "p95", "p99"):
+        new, old = result["latency_ms"].get(q), baseline.get("latency_ms", {}).get(q)
+        if new and old and new / old - 1 > tolerance:
+            regressions.append(f"{q} latency {new / old - 1:+.1%}")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Replay a JSONL request file against the scoring path")
+    parser.add_argument("--requests", default="requests.jsonl", help="JSONL request file")
+    parser.add_argument("--target", choices=["inprocess", "http"], default="inprocess")
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--endpoint", choices=["/forecast", "/recommend"], default="/recommend")
+    parser.add_argument("--count", type=int, default=2000, help="requests to send (file is cycled)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rate", type=float, default=None, help="open-loop arrival rate (req/s)")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--history", default=artifact_path("milestone_1_cleaned_data"))
+    parser.add_argument("--max-batch", type=int, default=256)
+    parser.add_argument("--max-wait-ms", type=float, default=1.0)
+    parser.add_argument("--output", default=RESULTS_PATH)
+    parser.add_argument("--baseline", default=None, help="earlier result JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args(argv)
+
+    for path in (args.requests, args.model, args.history):
+        if not os.path.exists(path):
+            print(f"Error: '{path}' not found.")
+            return 1
+    result = run_benchmark(args.requests, target=args.target, count=args.count,
+                           concurrency=args.concurrency, rate=args.rate, model_path=args.model,
+                           history=args.history, url=args.url, endpoint=args.endpoint,
+                           max_batch=args.max_batch, max_wait_ms=args.max_wait_ms)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    lat = result["latency_ms"]
+    print(f"{result['requests']} requests in {result['seconds']:.2f}s "
+          f"({result['throughput_rps']:,.0f} req/s, {result['errors']} errors) — "
+          f"p50 {lat['p50']:.2f} ms, p95 {lat['p95']:.2f} ms, p99 {lat['p99']:.2f} ms")
+    print(f"Results saved to {args.output} (commit {result['commit']})")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.tolerance)
+        if regressions:
+            print(f"REGRESSION vs {baseline.get('commit')}: " + ", ".join(regressions))
+            return 2
+        print(f"No regression vs {baseline.get('commit')} (tolerance {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,312 @@
+"""
+drift_monitor.py — Per-series drift statistics and retrain events from scored output.
+
+For every (region, service_type) the monitor keeps exponentially weighted
+sums of the forecast error, absolute error, actual demand and each monitored
+feature (and its square, for the variance) at two speeds: a fast
+half-life (recent behaviour) and a slow one (the long-run reference). A
+batch of scored rows is folded in with a few ``np.bincount`` calls, using
+the closed form of the EW recurrence. That is O(1) work per observation and
+gives exactly what feeding the rows one at a time would.
+
+A series is flagged once it has ``min_obs`` observations and
+
+    * bias drift:    |fast mean error| > ``bias_drift`` × fast mean actual
+                     (the summary report's "bias drift > 10%" trigger),
+    * MAE drift:     fast MAE > ``mae_ratio`` × slow MAE, or
+    * feature shift: |fast mean − slow mean| > ``feature_shift`` slow std devs
+
+A retrain event is emitted when a series becomes flagged, and no repeat
+events follow while it stays flagged. A series is unflagged when its
+statistics recover, or by ``acknowledge`` after it has been retrained;
+acknowledging also resets its slow reference to the fast statistics. Rows at
+or before a series' watermark are ignored, so overlapping snapshots can be
+fed again safely.
+
+Usage:
+    python milestone_4_integration.py                 # feeds drift_state.pkl
+    python drift_monitor.py update --input optimization_actions_report.csv
+    python drift_monitor.py status [--shards region]
+    python drift_monitor.py acknowledge --series westus/compute
+"""
+
+import argparse
+import json
+import os
+import sys
+import joblib
+import numpy as np
+import pandas as pd
+from artifact_io import load_frame
+
+STATE_PATH = "drift_state.pkl"
+EVENTS_PATH = "drift_events.jsonl"
+SERIES_COLS = ["region", "service_type"]
+ACTUAL_COL = "usage_units"
+FORECAST_COL = "forecasted_usage"
+MONITORED_FEATURES = ["usage_units", "provisioned_capacity_allocated"]
+DEFAULTS = {
+    "half_life_fast": 24,      # observations
+    "half_life_slow": 720,
+    "bias_drift": 0.10,
+    "mae_ratio": 1.5,
+    "feature_shift": 1.0,
+    "min_obs": 48,
+}
+SPEEDS = ("fast", "slow")
+
+
+def _rank_from_end(codes: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """For each row, the number of later rows of the same code."""
+    order = np.argsort(codes, kind="stable")
+    starts = np.cumsum(counts) - counts
+    rank = np.empty(len(codes), dtype="int64")
+    rank[order] = np.arange(len(codes)) - starts[codes[order]]
+    return counts[codes] - 1 - rank
+
+
+def ew_accumulate(S: np.ndarray, W: np.ndarray, codes: np.ndarray, values: np.ndarray,
+                  decay: float) -> None:
+    """Fold ``values`` (time-ordered within each code) into EW sums, in place.
+
+    ``S / W`` is the exponentially weighted mean with per-observation decay
+    ``decay``; NaN values are skipped.
+    """
+    valid = ~np.isnan(values)
+    codes, values = codes[valid], values[valid]
+    counts = np.bincount(codes, minlength=len(S))
+    w = decay ** _rank_from_end(codes, counts)
+    carry = decay ** counts
+    S *= carry
+    W *= carry
+    S += np.bincount(codes, weights=w * values, minlength=len(S))
+    W += np.bincount(codes, weights=w, minlength=len(S))
+
+
+def series_key(values) -> str:
+    return "/".join(str(v) for v in values)
+
+
+class DriftMonitor:
+    """Fast/slow EW statistics per series with drift flags."""
+
+    def __init__(self, features=MONITORED_FEATURES, **config):
+        unknown = set(config) - set(DEFAULTS)
+        if unknown:
+            raise ValueError(f"Unknown drift settings: {sorted(unknown)}")
+        self.features = list(features)
+        self.config = {**DEFAULTS, **config}
+        self.keys = []
+        self._index = {}
+        self.stats = ["err", "abs_err", "actual"] + [
+            s for f in self.features for s in (f, f"{f}^2")]
+        self.arrays = {"n": np.zeros(0, dtype="int64"),
+                       "watermark": np.zeros(0, dtype="datetime64[ns]"),
+                       "flagged": np.zeros(0, dtype=bool)}
+        for speed in SPEEDS:
+            for stat in self.stats:
+                for part in ("S", "W"):
+                    self.arrays[f"{speed}:{stat}:{part}"] = np.zeros(0)
+
+    def _codes(self, keys: pd.Series) -> np.ndarray:
+        codes, uniques = pd.factorize(keys)
+        new = [k for k in uniques if k not in self._index]
+        if new:
+            for k in new:
+                self._index[k] = len(self.keys)
+                self.keys.append(k)
+            for name, arr in self.arrays.items():
+                fill = np.datetime64("NaT") if name == "watermark" else 0
+                self.arrays[name] = np.concatenate([arr, np.full(len(new), fill, dtype=arr.dtype)])
+        return np.array([self._index[k] for k in uniques], dtype="int64")[codes]
+
+    def _mean(self, speed: str, stat: str) -> np.ndarray:
+        W = self.arrays[f"{speed}:{stat}:W"]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(W > 0, self.arrays[f"{speed}:{stat}:S"] / W, np.nan)
+
+    def update(self, scored) -> list:
+        """Absorb scored rows; returns the retrain events they trigger."""
+        frame = scored if isinstance(scored, pd.DataFrame) else load_frame(scored)
+        missing = [c for c in SERIES_COLS + ["timestamp", ACTUAL_COL, FORECAST_COL]
+                   if c not in frame.columns]
+        if missing:
+            raise ValueError(f"Missing columns in scored data: {missing}")
+        frame = frame.assign(timestamp=pd.to_datetime(frame["timestamp"]))
+        keys = frame[SERIES_COLS[0]].astype(str)
+        for col in SERIES_COLS[1:]:
+            keys = keys + "/" + frame[col].astype(str)
+        codes = self._codes(keys)
+
+        # Drop rows a previous (overlapping) snapshot already delivered
+        ts = frame["timestamp"].to_numpy(dtype="datetime64[ns]").view("int64")
+        fresh = ts > self.arrays["watermark"].view("int64")[codes]
+        order = np.argsort(ts[fresh], kind="stable")
+        rows = np.flatnonzero(fresh)[order]
+        if rows.size == 0:
+            return []
+        codes, ts = codes[rows], ts[rows]
+
+        actual = frame[ACTUAL_COL].to_numpy(dtype="float64")[rows]
+        err = frame[FORECAST_COL].to_numpy(dtype="float64")[rows] - actual
+        values = {"err": err, "abs_err": np.abs(err), "actual": actual}
+        for f in self.features:
+            x = (frame[f].to_numpy(dtype="float64")[rows] if f in frame.columns
+                 else np.full(rows.size, np.nan))
+            values[f], values[f"{f}^2"] = x, x * x
+        for speed in SPEEDS:
+            decay = 0.5 ** (1 / self.config[f"half_life_{speed}"])
+            for stat, v in values.items():
+                ew_accumulate(self.arrays[f"{speed}:{stat}:S"], self.arrays[f"{speed}:{stat}:W"],
+                              codes, v, decay)
+        self.arrays["n"] += np.bincount(codes, minlength=len(self.keys))
+        wm = self.arrays["watermark"].view("int64")
+        np.maximum.at(wm, codes, ts)
+        return self._check(np.unique(codes))
+
+    def status(self) -> pd.DataFrame:
+        """Current drift statistics for every series."""
+        fast_actual = self._mean("fast", "actual")
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out = pd.DataFrame({
+                "series": self.keys, "n": self.arrays["n"],
+                "watermark": self.arrays["watermark"],
+                "bias_pct": self._mean("fast", "err") / np.abs(fast_actual),
+                "mae_fast": self._mean("fast", "abs_err"),
+                "mae_slow": self._mean("slow", "abs_err"),
+            })
+            out["mae_ratio"] = out["mae_fast"] / out["mae_slow"]
+            for f in self.features:
+                slow_mean = self._mean("slow", f)
+                slow_var = np.maximum(self._mean("slow", f"{f}^2") - slow_mean ** 2, 0.0)
+                out[f"shift_{f}"] = (np.abs(self._mean("fast", f) - slow_mean)
+                                     / np.sqrt(np.maximum(slow_var, 1e-12)))
+        out["flagged"] = self.arrays["flagged"]
+        return out
+
+    def _reasons(self, row) -> list:
+        cfg = self.config
+        reasons = []
+        if abs(row.bias_pct) > cfg["bias_drift"]:
+            reasons.append("bias")
+        if row.mae_ratio > cfg["mae_ratio"]:
+            reasons.append("mae")
+        for f in self.features:
+            if getattr(row, f"shift_{f}") > cfg["feature_shift"]:
+                reasons.append(f"shift:{f}")
+        return reasons
+
+    def _check(self, touched: np.ndarray) -> list:
+        status = self.status().iloc[touched]
+        events = []
+        for i, row in zip(touched, status.itertuples(index=False)):
+            reasons = self._reasons(row) if row.n >= self.config["min_obs"] else []
+            if reasons and not self.arrays["flagged"][i]:
+                events.append({
+                    "series": row.series, "reasons": reasons,
+                    "watermark": str(pd.Timestamp(row.watermark)), "n": int(row.n),
+                    "bias_pct": round(float(row.bias_pct), 4),
+                    "mae_ratio": round(float(row.mae_ratio), 4),
+                })
+            self.arrays["flagged"][i] = bool(reasons)
+        return events
+
+    def flagged(self) -> list:
+        return [k for k, f in zip(self.keys, self.arrays["flagged"]) if f]
+
+    def retrain_targets(self, group_cols=SERIES_COLS) -> list:
+        """Shard keys (see ``sharded_model.shard_key``) covering the flagged series."""
+        positions = [SERIES_COLS.index(c) for c in group_cols]
+        return sorted({series_key(k.split("/")[p] for p in positions) for k in self.flagged()})
+
+    def acknowledge(self, series=None) -> list:
+        """Mark ``series`` (default: all flagged) as retrained.
+
+        Their slow reference is reset to the recent statistics and the flag
+        cleared. Returns the series acknowledged.
+        """
+        series = self.flagged() if series is None else list(series)
+        idx = np.array([self._index[s] for s in series if s in self._index], dtype="int64")
+        for stat in self.stats:
+            for part in ("S", "W"):
+                self.arrays[f"slow:{stat}:{part}"][idx] = self.arrays[f"fast:{stat}:{part}"][idx]
+        self.arrays["flagged"][idx] = False
+        return [self.keys[i] for i in idx]
+
+    def save(self, path: str = STATE_PATH) -> None:
+        joblib.dump({"features": self.features, "config": self.config,
+                     "keys": self.keys, "arrays": self.arrays}, path)
+
+    @classmethod
+    def load(cls, path: str = STATE_PATH) -> "DriftMonitor":
+        payload = joblib.load(path)
+        monitor = cls(payload["features"], **payload["config"])
+        monitor.keys = list(payload["keys"])
+        monitor._index = {k: i for i, k in enumerate(monitor.keys)}
+        monitor.arrays = payload["arrays"]
+        return monitor
+
+
+def record_events(events: list, path: str = EVENTS_PATH) -> None:
+    """Append retrain events to a JSON-lines log."""
+    if not events:
+        return
+    with open(path, "a", encoding="utf-8") as f:
+        for event in events:
+            f.write(json.dumps(event) + "\n")
+
+
+def monitor_scored(scored, state_path: str = STATE_PATH, events_path: str = EVENTS_PATH):
+    """Feed ``scored`` to the persisted monitor; returns ``(monitor, new events)``."""
+    monitor = DriftMonitor.load(state_path) if os.path.exists(state_path) else DriftMonitor()
+    events = monitor.update(scored)
+    monitor.save(state_path)
+    record_events(events, events_path)
+    return monitor, events
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Per-series drift monitor")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_update = sub.add_parser("update", help="feed scored rows to the monitor")
+    p_update.add_argument("--input", default="optimization_actions_report.csv")
+    p_update.add_argument("--events", default=EVENTS_PATH)
+    p_status = sub.add_parser("status", help="show per-series drift statistics")
+    p_status.add_argument("--shards", nargs="+", default=SERIES_COLS,
+                          help="group columns of the sharded model to retrain")
+    p_ack = sub.add_parser("acknowledge", help="mark series as retrained")
+    p_ack.add_argument("--series", nargs="+", default=None, help="default: all flagged")
+    for p in (p_update, p_status, p_ack):
+        p.add_argument("--state", default=STATE_PATH)
+    args = parser.parse_args(argv)
+
+    if args.command == "update":
+        if not os.path.exists(args.input):
+            print(f"Error: '{args.input}' not found. Please run Milestone 4 first.")
+            return 1
+        monitor, events = monitor_scored(args.input, args.state, args.events)
+        for event in events:
+            print(f"Retrain {event['series']}: {', '.join(event['reasons'])}")
+        print(f"{len(monitor.flagged())} of {len(monitor.keys)} series flagged "
+              f"({len(events)} new events → {args.events})")
+        return 0
+
+    if not os.path.exists(args.state):
+        print(f"Error: '{args.state}' not found. Run 'update' first.")
+        return 1
+    monitor = DriftMonitor.load(args.state)
+    if args.command == "status":
+        print(monitor.status().to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+        targets = monitor.retrain_targets(args.shards)
+        if targets:
+            print(f"\nRetrain: python sharded_model.py --group-cols {' '.join(args.shards)} "
+                  f"--only {' '.join(targets)}")
+    else:
+        done = monitor.acknowledge(args.series)
+        monitor.save(args.state)
+        print(f"Acknowledged {len(done)} series: {', '.join(done) or '-'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,387 @@
+"""
+forecast_service.py — Long-running local HTTP forecast service.
+
+Loads the model and the per-series feature state once and answers forecast
+and capacity-recommendation requests over plain HTTP/1.1 (stdlib asyncio,
+keep-alive supported, no web framework or Azure dependency).
+
+Concurrent requests are queued and coalesced into micro-batches: the
+batcher waits at most ``max_wait_ms`` (or until ``max_batch`` rows) and then
+makes one ``predict`` call for the whole batch in a worker thread, so the
+event loop keeps accepting requests while the model runs. Each series'
+usage features (lags, rolling means, spike — computed as in
+``horizon_forecast``) are kept in an LRU cache of ``cache_size`` series and
+invalidated when new actuals are observed.
+
+Forecasts are one step ahead: a request may ask for any timestamp up to one
+``--freq`` step past the series' latest observation (the state watermark,
+advanced one step per ``/observe`` of that series). Later timestamps would be
+scored with stale lags and are rejected with 400; use ``horizon_forecast.py``
+for multi-step forecasts.
+
+Recommendations are sized like Milestone 4: from the quantile model stored
+next to ``--model`` at ``--service-level`` when there is one, otherwise the
+point forecast plus the flat buffer.
+
+Endpoints (JSON bodies; POST bodies may be one object or a list):
+    POST /forecast   {"region", "service_type", "timestamp"}
+    POST /recommend  ... plus "provisioned_capacity"
+    POST /observe    {"region", "service_type", "usage_units"}
+    GET  /metrics    counts, batch sizes, cache hit rate, p50/p99 latency (ms)
+    GET  /health
+
+Usage:
+    python forecast_service.py --port 8080
+    curl -s localhost:8080/forecast -d '{"region": "eastus", "service_type": "compute", "timestamp": "2025-01-01"}'
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from artifact_io import artifact_path
+from horizon_forecast import _calendar, _parse_features, fill_usage_features
+from incremental_features import FeatureState, VALUE_COL
+from milestone_2_feature_engineering import GROUP_COLS
+from milestone_3_model_development import FEATURES, MODEL_PATH
+from milestone_4_integration import CAPACITY_COL, _load_model, plan_capacity
+from quantile_forecast import SERVICE_LEVEL, SERVICE_LEVEL_COL, load_quantile_model
+
+LATENCY_WINDOW = 10_000      # most recent requests used for p50/p99
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error"}
+
+
+class ForecastService:
+    """Micro-batching forecast server over a fitted model and a FeatureState."""
+
+    def __init__(self, model, state: FeatureState, features: list = None,
+                 max_batch: int = 256, max_wait_ms: float = 1.0, cache_size: int = 4096,
+                 thresholds=None, holidays=None, quantile_model=None,
+                 service_level: float = SERVICE_LEVEL, freq: str = "D"):
+        self.model = model
+        self.quantile_model = quantile_model
+        self.service_level = service_level
+        self.features = list(features or getattr(model, "features", None) or FEATURES)
+        self.col = {name: j for j, name in enumerate(self.features)}
+        self.group_cols = list(getattr(model, "group_cols", []))
+        self.lags, self.windows = _parse_features(self.features)
+        self.depth = state.depth
+        self.watermark = state.watermark
+        self.step = pd.tseries.frequencies.to_offset(freq)
+        self._observed = {}      # actuals appended per series since the watermark
+        self.history = {
+            tuple(str(v) for v in key): grp[VALUE_COL].to_numpy(dtype="float64")[-self.depth:]
+            for key, grp in state.tail.groupby(GROUP_COLS, sort=False, observed=True)
+        }
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.cache_size = cache_size
+        if thresholds is not None and not isinstance(thresholds, pd.DataFrame):
+            thresholds = pd.read_csv(thresholds)
+        self.thresholds = thresholds
+        self.holidays = {pd.Timestamp(d).normalize() for d in (holidays or [])}
+
+        self._cache = OrderedDict()
+        self._queue = None
+        self._batcher_task = None
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self.latencies_ms = deque(maxlen=LATENCY_WINDOW)
+        self.stats = {"requests": 0, "errors": 0, "batches": 0, "batched_rows": 0,
+                      "max_batch_rows": 0, "cache_hits": 0, "cache_misses": 0}
+
+    # --- Feature state -------------------------------------------------------
+
+    def _usage_row(self, key: tuple) -> np.ndarray:
+        """Feature row with the usage features of ``key`` filled (LRU cached)."""
+        row = self._cache.get(key)
+        if row is not None:
+            self._cache.move_to_end(key)
+            self.stats["cache_hits"] += 1
+            return row
+        self.stats["cache_misses"] += 1
+        hist = self.history.get(key)
+        if hist is None:
+            raise KeyError(f"Unknown series {'/'.join(key)}")
+        values = np.full((1, self.depth + 1), np.nan)
+        values[0, self.depth - len(hist):self.depth] = hist
+        values[0, self.depth] = values[0, self.depth - 1]   # persistence estimate
+        X = np.zeros((1, len(self.features)), dtype="float32")
+        fill_usage_features(X, self.col, values, self.depth, self.lags, self.windows)
+        self._cache[key] = row = X[0]
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return row
+
+    def observe(self, key: tuple, usage: float) -> None:
+        """Append the next actual for ``key`` and drop its cached features."""
+        hist = self.history.get(key, np.empty(0))
+        self.history[key] = np.append(hist, float(usage))[-self.depth:]
+        self._observed[key] = self._observed.get(key, 0) + 1
+        self._cache.pop(key, None)
+
+    def _check_step(self, key: tuple, ts: pd.Timestamp) -> None:
+        """Reject ``ts`` more than one step past the latest observation of ``key``."""
+        if self.watermark is None:
+            return
+        latest = pd.Timestamp(self.watermark) + self._observed.get(key, 0) * self.step
+        if ts > latest + self.step:
+            raise ValueError(
+                f"timestamp {ts} is more than one step ({self.step.freqstr}) past the latest "
+                f"observation of {'/'.join(key)} at {latest}; use horizon_forecast.py "
+                f"for multi-step forecasts"
+            )
+
+    # --- Micro-batching ------------------------------------------------------
+
+    async def submit(self, item: dict) -> dict:
+        """Queue one request for the next micro-batch and await its result."""
+        key = (str(item["region"]), str(item["service_type"]))
+        ts = pd.Timestamp(item["timestamp"])
+        X = self._usage_row(key).copy()
+        self._check_step(key, ts)
+        for name, value in _calendar(ts, self.holidays).items():
+            if name in self.col:
+                X[self.col[name]] = value
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((key, ts, item.get("provisioned_capacity"), X, future))
+        return await future
+
+    def _predict(self, keys: list, X: np.ndarray) -> np.ndarray:
+        frame = pd.DataFrame(X, columns=self.features, copy=False)
+        if self.group_cols:
+            keys_frame = pd.DataFrame(keys, columns=GROUP_COLS)[self.group_cols]
+            frame = pd.concat([frame, keys_frame], axis=1)
+        return np.asarray(self.model.predict(frame), dtype="float64")
+
+    def _score(self, batch: list) -> list:
+        X = np.stack([b[3] for b in batch])
+        preds = self._predict([b[0] for b in batch], X)
+        return self._results(batch, preds, X)
+
+    async def _batcher(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            futures = [b[4] for b in batch]
+            try:
+                results = await loop.run_in_executor(self._executor, self._score, batch)
+            except Exception as exc:   # fail the whole batch, keep serving
+                for f in futures:
+                    if not f.done():
+                        f.set_exception(exc)
+                continue
+            self.stats["batches"] += 1
+            self.stats["batched_rows"] += len(batch)
+            self.stats["max_batch_rows"] = max(self.stats["max_batch_rows"], len(batch))
+            for f, result in zip(futures, results):
+                if not f.done():
+                    f.set_result(result)
+
+    def _results(self, batch: list, preds: np.ndarray, X: np.ndarray) -> list:
+        results = [{"region": key[0], "service_type": key[1], "timestamp": str(ts),
+                    "forecasted_usage": float(p)}
+                   for (key, ts, _, _, _), p in zip(batch, preds)]
+        capacity = [b[2] for b in batch]
+        wanted = [i for i, c in enumerate(capacity) if c is not None]
+        if wanted:
+            frame = pd.DataFrame(X[wanted], columns=self.features).assign(
+                region=[batch[i][0][0] for i in wanted],
+                service_type=[batch[i][0][1] for i in wanted],
+                forecasted_usage=preds[wanted],
+                **{CAPACITY_COL: [float(capacity[i]) for i in wanted]},
+            )
+            actions = plan_capacity(frame, self.quantile_model, thresholds=self.thresholds,
+                                    service_level=self.service_level)
+            for j, i in enumerate(wanted):
+                results[i].update(recommended_capacity=float(actions["recommended_capacity"].iat[j]),
+                                  potential_savings=float(actions["potential_savings"].iat[j]),
+                                  infrastructure_action=str(actions["infrastructure_action"].iat[j]))
+                if self.quantile_model is not None:
+                    results[i][SERVICE_LEVEL_COL] = float(actions[SERVICE_LEVEL_COL].iat[j])
+        return results
+
+    # --- HTTP ----------------------------------------------------------------
+
+    def metrics(self) -> dict:
+        lat = np.asarray(self.latencies_ms)
+        lookups = self.stats["cache_hits"] + self.stats["cache_misses"]
+        return {
+            **self.stats,
+            "mean_batch_rows": (self.stats["batched_rows"] / self.stats["batches"]
+                                if self.stats["batches"] else 0.0),
+            "cache_hit_rate": self.stats["cache_hits"] / lookups if lookups else 0.0,
+            "cached_series": len(self._cache),
+            "latency_ms": {
+                "count": int(lat.size),
+                "p50": float(np.percentile(lat, 50)) if lat.size else None,
+                "p99": float(np.percentile(lat, 99)) if lat.size else None,
+            },
+        }
+
+    async def _route(self, method: str, path: str, body: bytes) -> tuple:
+        if method == "GET" and path == "/health":
+            return 200, {"status": "ok", "series": len(self.history),
+                         "watermark": str(self.watermark)}
+        if method == "GET" and path == "/metrics":
+            return 200, self.metrics()
+        if method != "POST" or path not in ("/forecast", "/recommend", "/observe"):
+            return 404, {"error": f"No route for {method} {path}"}
+
+        payload = json.loads(body or b"null")
+        items = payload if isinstance(payload, list) else [payload]
+        if not all(isinstance(i, dict) for i in items):
+            raise ValueError("Body must be a JSON object or a list of objects")
+        required = {"/forecast": ["timestamp"], "/recommend": ["timestamp", "provisioned_capacity"],
+                    "/observe": ["usage_units"]}[path]
+        for item in items:
+            missing = [k for k in GROUP_COLS + required if item.get(k) is None]
+            if missing:
+                raise ValueError(f"Missing fields: {missing}")
+
+        if path == "/observe":
+            for item in items:
+                self.observe((str(item["region"]), str(item["service_type"])), item["usage_units"])
+            return 200, {"observed": len(items)}
+        if path == "/forecast":
+            items = [{k: v for k, v in i.items() if k != "provisioned_capacity"} for i in items]
+        results = await asyncio.gather(*(self.submit(i) for i in items))
+        return 200, results if isinstance(payload, list) else results[0]
+
+    async def _handle_connection(self, reader, writer) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target = request_line.decode("latin-1").split()[:2]
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length") or 0))
+
+                start = time.perf_counter()
+                path = target.split("?", 1)[0]
+                try:
+                    status, result = await self._route(method, path, body)
+                except KeyError as exc:
+                    status, result = 404, {"error": str(exc.args[0])}
+                except (ValueError, TypeError) as exc:
+                    status, result = 400, {"error": str(exc)}
+                except Exception as exc:
+                    status, result = 500, {"error": f"{type(exc).__name__}: {exc}"}
+                keep_alive = headers.get("connection", "").lower() != "close"
+                data = json.dumps(result).encode()
+                head = (f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                        f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                        + ("" if keep_alive else "Connection: close\r\n") + "\r\n")
+                writer.write(head.encode("latin-1") + data)
+                await writer.drain()
+
+                if path in ("/forecast", "/recommend"):
+                    self.stats["requests"] += 1
+                    self.stats["errors"] += status != 200
+                    self.latencies_ms.append((time.perf_counter() - start) * 1000)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def start_batching(self) -> None:
+        """Start the micro-batcher on the running loop (``submit`` needs it)."""
+        self._queue = asyncio.Queue()
+        self._batcher_task = asyncio.create_task(self._batcher())
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8080):
+        """Start the batcher and listen; returns the ``asyncio`` server."""
+        self.start_batching()
+        return await asyncio.start_server(self._handle_connection, host, port)
+
+    async def stop(self, server=None) -> None:
+        if server is not None:
+            server.close()
+            await server.wait_closed()
+        if self._batcher_task is not None:
+            self._batcher_task.cancel()
+        self._executor.shutdown(wait=False)
+
+
+async def _serve(service: ForecastService, host: str, port: int) -> None:
+    server = await service.start(host, port)
+    print(f"Serving {len(service.history)} series on http://{host}:{port} "
+          f"(max batch {service.max_batch}, max wait {service.max_wait * 1000:g} ms)")
+    try:
+        await server.serve_forever()
+    finally:
+        await service.stop(server)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Local HTTP forecast service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--input", default=artifact_path("milestone_1_cleaned_data"),
+                        help="cleaned history used to build the feature state")
+    parser.add_argument("--state", default=None, help="saved feature state instead of --input")
+    parser.add_argument("--max-batch", type=int, default=256)
+    parser.add_argument("--max-wait-ms", type=float, default=1.0)
+    parser.add_argument("--cache-size", type=int, default=4096)
+    parser.add_argument("--thresholds", default=None,
+                        help="CSV of per region/service_type buffer_pct and action_margin")
+    parser.add_argument("--service-level", type=float, default=SERVICE_LEVEL,
+                        help="forecast quantile capacity is planned at (default: 0.9 → P90)")
+    parser.add_argument("--freq", default="D",
+                        help="series step as a pandas offset alias; requests may be one step ahead")
+    args = parser.parse_args(argv)
+
+    source = args.state or args.input
+    for path in (source, args.model):
+        if not os.path.exists(path):
+            print(f"Error: '{path}' not found. Please run Milestones 1–3 first.")
+            return 1
+    model = _load_model(args.model)
+    features = list(getattr(model, "features", None) or FEATURES)
+    lags, windows = _parse_features(features)
+    state = FeatureState.load(args.state) if args.state else FeatureState(lags, windows).fit(args.input)
+    service = ForecastService(model, state, features=features, max_batch=args.max_batch,
+                              max_wait_ms=args.max_wait_ms, cache_size=args.cache_size,
+                              thresholds=args.thresholds,
+                              quantile_model=load_quantile_model(args.model),
+                              service_level=args.service_level, freq=args.freq)
+    try:
+        asyncio.run(_serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        print("\nStopped.")
+        print(json.dumps(service.metrics(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
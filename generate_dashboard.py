@@ -1,22 +1,49 @@
 """
 generate_dashboard.py — Builds dashboard.html from project output files.
-Run: python generate_dashboard.py  →  opens dashboard.html
+Run: python generate_dashboard.py [--report PATH] [--max-points N] [--no-open]
+
+Built to stay fast on fleet-wide, multi-year reports. Rows are grouped by
+region in a single pass and each region's series is downsampled for
+display: the min and max of every series per x-bucket are kept, so spikes
+survive. Per-region chart data goes into gzip-compressed shards under
+``dashboard_data/``, which the page loads only when a region tab is
+opened. Shards are small script files (base64 gzip in a JS call), so the
+dashboard also works from ``file://``. A shard is rewritten only when its
+region's rows change (content hash in ``dashboard_data/manifest.json``).
+
+``--report`` may also be a ``batch_scoring.py`` output directory; its
+partition files are read and combined, as in ``render_charts.py``.
 """
-import pandas as pd
+import argparse
+import base64
+import glob
+import gzip
+import hashlib
 import json
 import os
+import re
 import webbrowser
+import numpy as np
+import pandas as pd
+from artifact_io import read_table
+
+REPORT_PATH  = "optimization_actions_report.csv"
+SUMMARY_PATH = "milestone_4_summary_report.txt"
+OUT_PATH     = "dashboard.html"
+DATA_DIR     = "dashboard_data"
+MAX_POINTS   = 2_000          # per region chart, roughly one per pixel column
+CHART_COLS   = {"actual": "usage_units", "forecast": "forecasted_usage",
+                "capacity": "recommended_capacity"}
+TABLE_COLS   = ["timestamp", "region", "service_type", "usage_units",
+                "forecasted_usage", "recommended_capacity", "infrastructure_action"]
+REPORT_COLS  = TABLE_COLS + ["provisioned_capacity_allocated"]
 
-# ── Load data ────────────────────────────────────────────────────────────────
-df = pd.read_csv("optimization_actions_report.csv")
-df["timestamp"] = pd.to_datetime(df["timestamp"])
-df = df.sort_values("timestamp")
 
 # KPI values from summary report
-def parse_summary():
+def parse_summary(path: str = SUMMARY_PATH):
     kpis = {"snapshots": "—", "acc_gain": "—", "annual_savings": "—", "sim_savings": "—", "model_mae": "—", "naive_mae": "—"}
     try:
-        with open("milestone_4_summary_report.txt", encoding="utf-8") as f:
+        with open(path, encoding="utf-8") as f:
             for line in f:
                 if "Snapshots" in line:         kpis["snapshots"]      = line.split(":")[1].strip()
                 if "Accuracy Gain" in line:     kpis["acc_gain"]       = line.split(":")[1].strip()
@@ -28,34 +55,151 @@ def parse_summary():
         pass
     return kpis
 
-kpis = parse_summary()
-
-# Action breakdown
-actions = df["infrastructure_action"].value_counts().to_dict()
-upscale   = actions.get("UPSCALE", 0)
-downscale = actions.get("DOWNSCALE", 0)
-maintain  = actions.get("MAINTAIN", 0)
-
-# Chart data: group by region
-regions = df["region"].unique().tolist()
-region_data = {}
-for r in regions:
-    sub = df[df["region"] == r].sort_values("timestamp")
-    region_data[r] = {
-        "timestamps": sub["timestamp"].dt.strftime("%Y-%m-%d %H:%M").tolist(),
-        "actual":     [round(v, 2) for v in sub["usage_units"].tolist()],
-        "forecast":   [round(v, 2) for v in sub["forecasted_usage"].tolist()],
-        "capacity":   [round(v, 2) for v in sub["recommended_capacity"].tolist()],
-    }
-
-# Table data (last 20 rows)
-table_rows = df.tail(20)[["timestamp","region","service_type","usage_units",
-                           "forecasted_usage","recommended_capacity","infrastructure_action"]].copy()
-table_rows["timestamp"] = table_rows["timestamp"].dt.strftime("%Y-%m-%d %H:%M")
-table_json = table_rows.to_dict("records")
-
-# ── HTML ─────────────────────────────────────────────────────────────────────
-html = f"""<!DOCTYPE html>
+
+def minmax_indices(values: np.ndarray, max_points: int) -> np.ndarray:
+    """Row positions to keep so ``values`` (rows × series) fits ``max_points``.
+
+    Rows are split into equal-width buckets; in each bucket the rows holding
+    the minimum and maximum of every series are kept, plus the first and
+    last row, so peaks and troughs survive downsampling.
+    """
+    n = len(values)
+    if n <= max_points:
+        return np.arange(n)
+    n_series = values.shape[1]
+    n_buckets = max(1, (max_points - 2) // (2 * n_series))
+    bucket = np.arange(n) * n_buckets // n
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(bucket)) + 1])
+    ends = np.concatenate([starts[1:] - 1, [n - 1]])
+    keep = [np.array([0, n - 1])]
+    for j in range(n_series):
+        # Sorted by (bucket, value): each bucket's min comes first, max last
+        order = np.lexsort((values[:, j], bucket))
+        keep += [order[starts], order[ends]]
+    return np.unique(np.concatenate(keep))
+
+
+def _slug(region: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_-]+", "_", str(region)) or "region"
+
+
+def _region_hash(sub: pd.DataFrame, max_points: int) -> str:
+    h = hashlib.sha1(str(max_points).encode())
+    h.update(pd.util.hash_pandas_object(sub, index=False).to_numpy().tobytes())
+    return h.hexdigest()[:16]
+
+
+def _shard_payload(sub: pd.DataFrame, max_points: int) -> dict:
+    values = sub[list(CHART_COLS.values())].to_numpy(dtype="float64")
+    keep = minmax_indices(values, max_points)
+    payload = {"timestamps": sub["timestamp"].iloc[keep].dt.strftime("%Y-%m-%d %H:%M").tolist(),
+               "rows": len(sub)}
+    for key, col in CHART_COLS.items():
+        payload[key] = np.round(values[keep, list(CHART_COLS.values()).index(col)], 2).tolist()
+    return payload
+
+
+def write_shards(df: pd.DataFrame, data_dir: str = DATA_DIR, max_points: int = MAX_POINTS):
+    """Write one compressed chart shard per region; unchanged regions are skipped.
+
+    Returns ``({region: shard path}, regions rewritten)``.
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    manifest_path = os.path.join(data_dir, "manifest.json")
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+
+    chart = df[["timestamp", "region"] + list(CHART_COLS.values())]
+    shards, rewritten, new_manifest = {}, [], {}
+    # One grouping pass; positions within each group keep the timestamp order
+    for region, idx in sorted(chart.groupby("region", observed=True).indices.items()):
+        region = str(region)
+        sub = chart.iloc[idx]
+        digest = _region_hash(sub, max_points)
+        name = f"{_slug(region)}-{digest}.js"
+        path = os.path.join(data_dir, name)
+        old = manifest.get(region)
+        if not (old and old["hash"] == digest and os.path.exists(path)):
+            blob = gzip.compress(json.dumps(_shard_payload(sub, max_points),
+                                            separators=(",", ":")).encode(), mtime=0)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(f"window.__dashboardShard({json.dumps(region)}, "
+                        f"\"{base64.b64encode(blob).decode('ascii')}\");\n")
+            rewritten.append(region)
+        if old and old["file"] != name:
+            stale = os.path.join(data_dir, old["file"])
+            if os.path.exists(stale):
+                os.remove(stale)
+        new_manifest[region] = {"hash": digest, "file": name, "rows": len(sub)}
+        shards[region] = f"{os.path.basename(data_dir)}/{name}"
+
+    # Regions that disappeared from the report
+    for region, old in manifest.items():
+        stale = os.path.join(data_dir, old["file"])
+        if region not in new_manifest and os.path.exists(stale):
+            os.remove(stale)
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(new_manifest, f, indent=2)
+    return shards, rewritten
+
+
+def load_report(source) -> pd.DataFrame:
+    """Report rows from a report file or a batch-scoring directory."""
+    if os.path.isdir(source):
+        parts = sorted(glob.glob(os.path.join(source, "**", "part.*"), recursive=True))
+        if not parts:
+            raise FileNotFoundError(f"No scored partitions under {source}")
+        return pd.concat([read_table(p, columns=REPORT_COLS) for p in parts], ignore_index=True)
+    return read_table(source, columns=REPORT_COLS)
+
+
+def build_dashboard(report_path: str = REPORT_PATH, summary_path: str = SUMMARY_PATH,
+                    out_path: str = OUT_PATH, max_points: int = MAX_POINTS) -> dict:
+    """Build ``out_path`` plus its chart shards (next to it, in ``DATA_DIR``).
+
+    ``report_path`` is a report file or a ``batch_scoring`` output directory.
+    """
+    # ── Load data ────────────────────────────────────────────────────────────
+    df = load_report(report_path)
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    df = df.sort_values("timestamp", kind="stable").reset_index(drop=True)
+    df["region"] = df["region"].astype(str)
+
+    kpis = parse_summary(summary_path)
+
+    # Action breakdown
+    actions = df["infrastructure_action"].astype(str).value_counts().to_dict()
+    counts = {a: int(actions.get(a, 0)) for a in ("UPSCALE", "DOWNSCALE", "MAINTAIN")}
+
+    # Chart data: compressed per-region shards
+    data_dir = os.path.join(os.path.dirname(os.path.abspath(out_path)), DATA_DIR)
+    shard_files, rewritten = write_shards(df, data_dir, max_points)
+
+    # Table data (last 20 rows)
+    table_rows = df.tail(20)[TABLE_COLS].copy()
+    table_rows["timestamp"] = table_rows["timestamp"].dt.strftime("%Y-%m-%d %H:%M")
+    table_rows["infrastructure_action"] = table_rows["infrastructure_action"].astype(str)
+    table_json = json.loads(table_rows.to_json(orient="records"))
+
+    # Bar data: latest recommended vs provisioned capacity per region
+    bar_cols = ["region", "recommended_capacity"] + (
+        ["provisioned_capacity_allocated"] if "provisioned_capacity_allocated" in df.columns else [])
+    latest = df.groupby("region", sort=True).tail(1)[bar_cols].sort_values("region")
+    bar_json = json.loads(latest.to_json(orient="records"))
+
+    html = render_html(kpis, counts, table_json, bar_json, shard_files)
+    with open(out_path, "w", encoding="utf-8") as f:
+        f.write(html)
+    return {"rows": len(df), "regions": len(shard_files), "rewritten": rewritten}
+
+
+def render_html(kpis: dict, counts: dict, table_json: list, bar_json: list,
+                shard_files: dict) -> str:
+    upscale, downscale, maintain = counts["UPSCALE"], counts["DOWNSCALE"], counts["MAINTAIN"]
+    # ── HTML ─────────────────────────────────────────────────────────────────
+    return f"""<!DOCTYPE html>
 <html lang="en">
 <head>
   <meta charset="UTF-8"/>
@@ -267,14 +411,40 @@ html = f"""<!DOCTYPE html>
 <footer>Azure Demand Forecasting &amp; Capacity Optimization System · Auto-generated dashboard</footer>
 
 <script>
-const REGION_DATA = {json.dumps(region_data)};
+const SHARDS      = {json.dumps(shard_files)};
 const TABLE_DATA  = {json.dumps(table_json)};
+const BAR_DATA    = {json.dumps(bar_json)};
+
+// ── Lazily loaded, gzip-compressed chart shards ─────────────────────────────
+// Each shard is a script calling __dashboardShard(region, base64-gzip JSON),
+// so it loads from file:// as well as over HTTP.
+const shardCache = {{}};
+const shardWaiters = {{}};
+window.__dashboardShard = async (region, b64) => {{
+  const bytes = Uint8Array.from(atob(b64), c => c.charCodeAt(0));
+  const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('gzip'));
+  shardCache[region] = JSON.parse(await new Response(stream).text());
+  (shardWaiters[region] || []).forEach(resolve => resolve(shardCache[region]));
+  delete shardWaiters[region];
+}};
+function loadRegion(region) {{
+  if (shardCache[region]) return Promise.resolve(shardCache[region]);
+  return new Promise(resolve => {{
+    if (!shardWaiters[region]) {{
+      shardWaiters[region] = [];
+      const s = document.createElement('script');
+      s.src = SHARDS[region];
+      document.head.appendChild(s);
+    }}
+    shardWaiters[region].push(resolve);
+  }});
+}}
 
 // ── Colour palette ──────────────────────────────────────────────────────────
 const PALETTE = ['#4f8ef7','#34d399','#f87171','#a78bfa','#fbbf24','#38bdf8','#fb923c'];
 
 // ── Region tabs + line chart ────────────────────────────────────────────────
-const regions = Object.keys(REGION_DATA);
+const regions = Object.keys(SHARDS);
 let lineChart = null;
 let currentRegion = regions[0];
 
@@ -294,8 +464,8 @@ function buildTabs() {{
   }});
 }}
 
-function buildLineChart(region) {{
-  const d = REGION_DATA[region];
+async function buildLineChart(region) {{
+  const d = await loadRegion(region);
   const ctx = document.getElementById('lineChart').getContext('2d');
   lineChart = new Chart(ctx, {{
     type: 'line',
@@ -319,8 +489,9 @@ function buildLineChart(region) {{
   }});
 }}
 
-function updateLineChart(region) {{
-  const d = REGION_DATA[region];
+async function updateLineChart(region) {{
+  const d = await loadRegion(region);
+  if (region !== currentRegion) return;   // a later tab click won the race
   lineChart.data.labels = d.timestamps;
   lineChart.data.datasets[0].data = d.actual;
   lineChart.data.datasets[1].data = d.forecast;
@@ -345,14 +516,9 @@ function buildDonut() {{
 
 // ── Bar chart: capacity comparison per region ────────────────────────────────
 function buildBar() {{
-  const labels = [], rec = [], prov = [];
-  TABLE_DATA.forEach(r => {{
-    if (!labels.includes(r.region)) {{
-      labels.push(r.region);
-      rec.push(r.recommended_capacity);
-      prov.push(r.provisioned_capacity_allocated);
-    }}
-  }});
+  const labels = BAR_DATA.map(r => r.region);
+  const rec    = BAR_DATA.map(r => r.recommended_capacity);
+  const prov   = BAR_DATA.map(r => r.provisioned_capacity_allocated);
   new Chart(document.getElementById('barChart').getContext('2d'), {{
     type: 'bar',
     data: {{
@@ -396,7 +562,7 @@ function buildTable() {{
 
 // ── Init ─────────────────────────────────────────────────────────────────────
 buildTabs();
-buildLineChart(currentRegion);
+if (currentRegion) buildLineChart(currentRegion);
 buildDonut();
 buildBar();
 buildTable();
@@ -404,9 +570,25 @@ buildTable();
 </body>
 </html>"""
 
-out_path = "dashboard.html"
-with open(out_path, "w", encoding="utf-8") as f:
-    f.write(html)
 
-print(f"Dashboard saved → {out_path}")
-webbrowser.open(os.path.abspath(out_path))
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Build dashboard.html from the pipeline outputs")
+    parser.add_argument("--report", default=REPORT_PATH,
+                        help="actions report (CSV/Parquet/Feather) or batch_scoring.py output directory")
+    parser.add_argument("--summary", default=SUMMARY_PATH)
+    parser.add_argument("--output", default=OUT_PATH)
+    parser.add_argument("--max-points", type=int, default=MAX_POINTS,
+                        help="points per region chart after downsampling")
+    parser.add_argument("--no-open", action="store_true", help="do not open a browser")
+    args = parser.parse_args(argv)
+
+    info = build_dashboard(args.report, args.summary, args.output, args.max_points)
+    print(f"Dashboard saved → {args.output} ({info['rows']:,} rows, {info['regions']} region "
+          f"shards, {len(info['rewritten'])} rewritten)")
+    if not args.no_open:
+        webbrowser.open(os.path.abspath(args.output))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,198 @@
+"""
+horizon_forecast.py — Recursive multi-step forecasts for every series.
+
+The one-step model is rolled forward from its own predictions: step h's
+forecast becomes the ``usage_lag_1`` of step h + 1, and so on. Series
+history and forecasts live in one preallocated ``(series, depth + horizon)``
+array, the feature matrix is a preallocated ``(series, features)`` array,
+and every step is a single batched ``predict`` call across all series.
+
+The rolling means in ``FEATURES`` include the current row's usage, which is
+unknown when forecasting it. It is first estimated by persistence (the
+previous value); with ``refine`` > 0 the step is re-predicted with the
+estimate replaced by the model's own forecast.
+
+Each step advances ``freq`` from the latest history timestamp, which becomes
+the forecast origin for all series.
+
+Usage:
+    python horizon_forecast.py --horizon 90 --output horizon_forecast.csv
+    python horizon_forecast.py --state feature_state.pkl --horizon 30
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+import numpy as np
+import pandas as pd
+from artifact_io import artifact_path, write_table
+from incremental_features import FeatureState, VALUE_COL
+from milestone_2_feature_engineering import GROUP_COLS, SPIKE_WINDOW
+from milestone_3_model_development import FEATURES, MODEL_PATH
+from milestone_4_integration import _load_model
+
+HORIZON_PATH = "horizon_forecast.csv"
+
+
+def _parse_features(features: list) -> tuple:
+    """Lags and rolling windows referenced by ``features``.
+
+    ``usage_spike`` needs lag 1 and the ``SPIKE_WINDOW`` rolling mean, whether
+    or not those are features themselves.
+    """
+    lags = {int(m.group(1)) for f in features if (m := re.fullmatch(r"usage_lag_(\d+)", f))}
+    windows = {int(m.group(1)) for f in features
+               if (m := re.fullmatch(r"usage_rolling_mean_(\d+)", f))}
+    if "usage_spike" in features:
+        lags.add(1)
+        windows.add(SPIKE_WINDOW)
+    lags, windows = sorted(lags), sorted(windows)
+    return tuple(lags) or (1,), tuple(windows) or (1,)
+
+
+def _calendar(ts: pd.Timestamp, holidays: set) -> dict:
+    """Calendar feature values for ``ts``, matching ``add_time_features``."""
+    return {
+        "hour": ts.hour, "day_of_week": ts.dayofweek, "day_of_month": ts.day,
+        "month": ts.month, "quarter": ts.quarter, "is_weekend": int(ts.dayofweek in (5, 6)),
+        "is_holiday": int(ts.normalize() in holidays),
+    }
+
+
+def fill_usage_features(X: np.ndarray, col: dict, values: np.ndarray, cur: int,
+                        lags, windows) -> None:
+    """Write lag / rolling-mean / spike features for column ``cur`` of ``values``.
+
+    ``values`` is a ``(series, time)`` array (NaN = no history) whose column
+    ``cur`` holds the current value or its estimate; ``col`` maps feature
+    names to columns of ``X``. NaNs are zero-filled as in ``add_spike_and_fill``.
+    """
+    for k in lags:
+        name = f"usage_lag_{k}"
+        if name in col:
+            X[:, col[name]] = np.nan_to_num(values[:, cur - k])
+    rolling = {}
+    for w in windows:
+        window = values[:, cur - w + 1:cur + 1]
+        n = np.sum(~np.isnan(window), axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            rolling[w] = np.nansum(window, axis=1) / n     # min_periods=1 mean
+        name = f"usage_rolling_mean_{w}"
+        if name in col:
+            X[:, col[name]] = np.nan_to_num(rolling[w])
+    if "usage_spike" in col:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            spike = values[:, cur - 1] / (rolling[SPIKE_WINDOW] + 1e-6)
+        X[:, col["usage_spike"]] = np.nan_to_num(spike, nan=0.0, posinf=0.0, neginf=0.0)
+
+
+def forecast_horizon(model, history, horizon: int = 30, freq: str = "D",
+                     features: list = None, refine: int = 1, holidays=None) -> pd.DataFrame:
+    """Forecast ``horizon`` steps ahead for every series in ``history``.
+
+    ``history`` is cleaned or featured data (path or DataFrame) or a fitted
+    ``FeatureState``. Returns one row per (series, step) with ``timestamp``,
+    ``step`` (1-based) and ``forecasted_usage``.
+    """
+    features = list(features or getattr(model, "features", None) or FEATURES)
+    lags, windows = _parse_features(features)
+    if isinstance(history, FeatureState):
+        state = history
+        if max(lags) > state.depth or max(windows) - 1 > state.depth:
+            raise ValueError(f"Feature state keeps {state.depth} values; features need more")
+    else:
+        state = FeatureState(lags, windows).fit(history)
+    if state.watermark is None or state.tail.empty:
+        raise ValueError("No history to forecast from")
+    depth = state.depth
+    holidays = {pd.Timestamp(d).normalize() for d in (holidays or [])}
+
+    # --- Preallocated state: history right-aligned in the first `depth` columns ---
+    tail = state.tail
+    grouped = tail.groupby(GROUP_COLS, sort=True, observed=True)
+    codes = grouped.ngroup().to_numpy()
+    keys = pd.DataFrame(list(grouped.groups.keys()), columns=GROUP_COLS)
+    n_series = len(keys)
+    values = np.full((n_series, depth + horizon), np.nan)
+    counts = np.bincount(codes, minlength=n_series)
+    # Position of each tail row within its series, counted from the end
+    from_end = grouped.cumcount(ascending=False).to_numpy()
+    values[codes, depth - 1 - from_end] = tail[VALUE_COL].to_numpy(dtype="float64")
+    if (counts > depth).any():
+        raise ValueError("Feature state holds more rows per series than its depth")
+
+    X = np.zeros((n_series, len(features)), dtype="float32")
+    col = {name: j for j, name in enumerate(features)}
+    group_cols = list(getattr(model, "group_cols", []))
+    frame_keys = keys[group_cols].reset_index(drop=True) if group_cols else None
+
+    def _predict() -> np.ndarray:
+        frame = pd.DataFrame(X, columns=features, copy=False)
+        if frame_keys is not None:
+            frame = pd.concat([frame, frame_keys], axis=1)
+        return np.asarray(model.predict(frame), dtype="float64")
+
+    origin = pd.Timestamp(state.watermark)
+    step_offset = pd.tseries.frequencies.to_offset(freq)
+    stamps = []
+    for h in range(horizon):
+        cur = depth + h
+        ts = origin + (h + 1) * step_offset
+        stamps.append(ts)
+        for name, value in _calendar(ts, holidays).items():
+            if name in col:
+                X[:, col[name]] = value
+        # Current value is unknown: persistence estimate, then refine with the forecast
+        values[:, cur] = values[:, cur - 1]
+        fill_usage_features(X, col, values, cur, lags, windows)
+        preds = _predict()
+        for _ in range(refine):
+            values[:, cur] = preds
+            fill_usage_features(X, col, values, cur, lags, windows)
+            preds = _predict()
+        values[:, cur] = preds
+
+    out = keys.loc[np.repeat(np.arange(n_series), horizon)].reset_index(drop=True)
+    out["timestamp"] = np.tile(np.array(stamps, dtype="datetime64[ns]"), n_series)
+    out["step"] = np.tile(np.arange(1, horizon + 1), n_series)
+    out["forecasted_usage"] = values[:, depth:].ravel()
+    return out
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Recursive multi-step demand forecasts")
+    parser.add_argument("--input", default=artifact_path("milestone_1_cleaned_data"),
+                        help="cleaned or featured history")
+    parser.add_argument("--state", default=None,
+                        help="feature state from incremental_features.py instead of --input")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--horizon", type=int, default=30)
+    parser.add_argument("--freq", default="D", help="step size as a pandas offset alias")
+    parser.add_argument("--refine", type=int, default=1,
+                        help="re-predictions per step with the forecast in the rolling means")
+    parser.add_argument("--output", default=HORIZON_PATH)
+    args = parser.parse_args(argv)
+
+    source = args.state or args.input
+    for path in (source, args.model):
+        if not os.path.exists(path):
+            print(f"Error: '{path}' not found. Please run Milestones 1–3 first.")
+            return 1
+    history = FeatureState.load(args.state) if args.state else args.input
+    model = _load_model(args.model)
+
+    start = time.time()
+    forecast = forecast_horizon(model, history, horizon=args.horizon, freq=args.freq,
+                                refine=args.refine)
+    elapsed = time.time() - start
+    write_table(forecast, args.output)
+    n_series = forecast[GROUP_COLS].drop_duplicates().shape[0]
+    print(f"{args.horizon}-step forecast for {n_series} series in {elapsed:.2f}s "
+          f"→ {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
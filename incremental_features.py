@@ -0,0 +1,185 @@
+"""
+incremental_features.py — Extend Milestone 2 features to newly arrived rows.
+
+A FeatureState keeps, per (region, service_type), the last N ``usage_units``
+values (N = the longest lag / rolling window). New rows are appended behind
+that tail and run through the same one-pass engine as ``engineer_features``,
+so the cost is O(new rows + series × N) instead of a full-history recompute
+and the results match a full recompute.
+
+Usage:
+    python incremental_features.py init   --input milestone_1_cleaned_data.csv
+    python incremental_features.py update --input new_rows.csv --output new_featured.csv
+    python incremental_features.py verify --input milestone_1_cleaned_data.csv --steps 7
+"""
+
+import argparse
+import os
+import sys
+import joblib
+import numpy as np
+import pandas as pd
+from artifact_io import apply_schema, load_frame, write_table
+from milestone_2_feature_engineering import (
+    GROUP_COLS, LAGS, ROLLING_WINDOWS, SORT_KEYS,
+    add_lag_rolling_features, add_spike_and_fill, add_time_features, engineer_features,
+)
+
+STATE_PATH = "feature_state.pkl"
+VALUE_COL = "usage_units"
+
+
+class FeatureState:
+    """Per-series tail of ``usage_units`` plus the timestamp watermark."""
+
+    def __init__(self, lags=LAGS, windows=ROLLING_WINDOWS):
+        self.lags = tuple(lags)
+        self.windows = tuple(windows)
+        # Longest history any feature of the next row can look at
+        self.depth = max(max(self.lags), max(self.windows) - 1)
+        self.tail = pd.DataFrame(columns=GROUP_COLS + [VALUE_COL])
+        self.watermark = None
+
+    @property
+    def lag_and_roll_cols(self) -> list:
+        return ([f"usage_lag_{k}" for k in self.lags]
+                + [f"usage_rolling_mean_{w}" for w in self.windows])
+
+    def _absorb(self, ordered: pd.DataFrame) -> None:
+        """Keep the last ``depth`` values of each series from ``ordered`` rows."""
+        tail = ordered.groupby(GROUP_COLS, sort=False, observed=True).tail(self.depth)
+        self.tail = tail[GROUP_COLS + [VALUE_COL]].reset_index(drop=True)
+        self.watermark = ordered["timestamp"].max()
+
+    def fit(self, cleaned) -> "FeatureState":
+        """Initialise from cleaned history (path or DataFrame)."""
+        df = load_frame(cleaned).copy()
+        df["timestamp"] = pd.to_datetime(df["timestamp"])
+        self._absorb(df.sort_values(SORT_KEYS))
+        return self
+
+    def update(self, new_rows) -> pd.DataFrame:
+        """Return featured ``new_rows`` and advance the state past them.
+
+        Rows must be strictly newer than the current watermark; late data
+        needs a full ``engineer_features`` run instead.
+        """
+        new = load_frame(new_rows).copy()
+        new["timestamp"] = pd.to_datetime(new["timestamp"])
+        new = new.sort_values(SORT_KEYS).reset_index(drop=True)
+        if new.empty:
+            return new
+        if self.watermark is not None and new["timestamp"].min() <= self.watermark:
+            raise ValueError(
+                f"New rows start at {new['timestamp'].min()}, not after the state "
+                f"watermark {self.watermark}; run a full recompute instead."
+            )
+
+        # History for the series present in this batch, placed before the
+        # new rows so the engine's stable group sort keeps time order
+        keys = pd.MultiIndex.from_frame(new[GROUP_COLS].astype(object))
+        tail_keys = pd.MultiIndex.from_frame(self.tail[GROUP_COLS].astype(object))
+        touched = tail_keys.isin(keys)
+        history = self.tail[touched]
+        combined = pd.concat(
+            [history, new[GROUP_COLS + [VALUE_COL]]], ignore_index=True
+        )
+        combined = add_lag_rolling_features(combined, lags=self.lags, windows=self.windows)
+
+        cols = self.lag_and_roll_cols
+        out = add_time_features(new)
+        out[cols] = combined[cols].iloc[len(history):].to_numpy()
+        out = apply_schema(add_spike_and_fill(out, cols))
+
+        untouched = self.tail[~touched]
+        tail = combined[GROUP_COLS + [VALUE_COL]].groupby(
+            GROUP_COLS, sort=False, observed=True
+        ).tail(self.depth)
+        self.tail = pd.concat([untouched, tail], ignore_index=True)
+        self.watermark = new["timestamp"].max()
+        return out
+
+    def save(self, path: str = STATE_PATH) -> None:
+        joblib.dump(
+            {"lags": self.lags, "windows": self.windows,
+             "tail": self.tail, "watermark": self.watermark},
+            path,
+        )
+
+    @classmethod
+    def load(cls, path: str = STATE_PATH) -> "FeatureState":
+        payload = joblib.load(path)
+        state = cls(payload["lags"], payload["windows"])
+        state.tail, state.watermark = payload["tail"], payload["watermark"]
+        return state
+
+
+def verify_incremental(cleaned, steps: int = 7, lags=LAGS, windows=ROLLING_WINDOWS) -> float:
+    """Replay the last ``steps`` timestamps one at a time and compare with a full run.
+
+    Returns the largest absolute difference across all lag/rolling/spike
+    columns and raises AssertionError if any value differs beyond 1e-9
+    (relative); NaN placement must match exactly.
+    """
+    df = load_frame(cleaned).copy()
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    full = engineer_features(df.copy(), lags=lags, windows=windows)
+
+    stamps = np.sort(df["timestamp"].unique())
+    cutoffs = stamps[-steps - 1:]
+    state = FeatureState(lags, windows).fit(df[df["timestamp"] <= cutoffs[0]])
+    parts = []
+    for lo, hi in zip(cutoffs[:-1], cutoffs[1:]):
+        batch = df[(df["timestamp"] > lo) & (df["timestamp"] <= hi)]
+        parts.append(state.update(batch))
+    incremental = pd.concat(parts, ignore_index=True)
+
+    expected = full[full["timestamp"] > cutoffs[0]].reset_index(drop=True)
+    cols = state.lag_and_roll_cols + ["usage_spike"]
+    a = expected[cols].to_numpy(dtype="float64")
+    b = incremental[cols].to_numpy(dtype="float64")
+    assert a.shape == b.shape, f"row count mismatch: full={a.shape[0]} incremental={b.shape[0]}"
+    assert np.array_equal(np.isnan(a), np.isnan(b)), "NaN placement differs"
+    max_diff = float(np.nanmax(np.abs(a - b))) if a.size else 0.0
+    assert np.allclose(a, b, rtol=1e-9, atol=1e-9, equal_nan=True), f"max abs diff {max_diff}"
+    return max_diff
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Incremental feature computation")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_init = sub.add_parser("init", help="build the state store from cleaned history")
+    p_init.add_argument("--input", default="milestone_1_cleaned_data.csv")
+    p_init.add_argument("--state", default=STATE_PATH)
+    p_update = sub.add_parser("update", help="feature newly arrived cleaned rows")
+    p_update.add_argument("--input", required=True)
+    p_update.add_argument("--output", required=True)
+    p_update.add_argument("--state", default=STATE_PATH)
+    p_verify = sub.add_parser("verify", help="check incremental == full recompute")
+    p_verify.add_argument("--input", default="milestone_1_cleaned_data.csv")
+    p_verify.add_argument("--steps", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.input):
+        print(f"Error: '{args.input}' not found.")
+        return 1
+    if args.command == "init":
+        state = FeatureState().fit(args.input)
+        state.save(args.state)
+        print(f"Feature state for {state.tail.groupby(GROUP_COLS, observed=True).ngroups} "
+              f"series saved to {args.state} (watermark {state.watermark})")
+    elif args.command == "update":
+        state = FeatureState.load(args.state)
+        featured = state.update(args.input)
+        write_table(featured, args.output)
+        state.save(args.state)
+        print(f"Featured {len(featured)} new rows → {args.output} (watermark {state.watermark})")
+    else:
+        max_diff = verify_incremental(args.input, steps=args.steps)
+        print(f"OK — incremental matches full recompute over {args.steps} steps "
+              f"(max abs diff {max_diff:.3g})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,281 @@
+"""
+instrumentation.py — Step timers, memory counters and per-stage profiling.
+
+Pipeline code wraps its logical steps in ``span``:
+
+    with span("prepare_data.dedupe", rows=len(df)):
+        df = df.drop_duplicates()
+
+Each span records wall time, thread, resident memory at exit and its change
+over the span, and — while ``tracemalloc`` is tracing — the change in
+Python-allocated memory. Spans are always recorded (a few clock and
+``/proc`` reads per step) and exported on request as a flat JSON list
+(``export_json``) or in Chrome trace format (``export_chrome_trace``, open in
+chrome://tracing or https://ui.perfetto.dev).
+
+``profile_stage`` captures cProfile and tracemalloc output for one stage:
+``<dir>/<stage>.prof`` (load with ``pstats`` or snakeviz),
+``<dir>/<stage>.txt`` (top functions by cumulative time) and
+``<dir>/<stage>.tracemalloc.txt`` (top allocation sites).
+
+Child processes started by run_all.py pick up ``PIPELINE_TRACE_DIR`` and
+dump their spans there on exit; run as ``python instrumentation.py
+--profile-dir DIR script.py`` a milestone script is profiled as one stage.
+"""
+
+import atexit
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+TRACE_DIR_ENV = "PIPELINE_TRACE_DIR"
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+_EPOCH = time.perf_counter()
+
+_spans = []
+_local = threading.local()
+
+
+def rss_mb():
+    """Current resident set size in MB (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm", encoding="ascii") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE / (1024 * 1024)
+    except OSError:
+        if resource is None:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+@contextmanager
+def peak_rss(interval: float = 0.02):
+    """Sample RSS in a background thread while the block runs.
+
+    Yields a dict whose ``"peak_mb"`` holds the highest RSS seen during the
+    block (not the process-lifetime peak that ``ru_maxrss`` reports).
+    """
+    result = {"start_mb": rss_mb(), "peak_mb": None}
+    result["peak_mb"] = result["start_mb"]
+    stop = threading.Event()
+
+    def sample():
+        while True:
+            current = rss_mb()
+            if current is not None:
+                result["peak_mb"] = max(result["peak_mb"] or 0.0, current)
+            if stop.wait(interval):
+                return
+
+    sampler = threading.Thread(target=sample, name="rss-sampler", daemon=True)
+    sampler.start()
+    try:
+        yield result
+    finally:
+        stop.set()
+        sampler.join()
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Record the duration and memory change of the enclosed block as ``name``."""
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    parent = stack[-1] if stack else None
+    stack.append(name)
+    tracing = tracemalloc.is_tracing()
+    py_start = tracemalloc.get_traced_memory()[0] if tracing else None
+    rss_start = rss_mb()
+    start = time.perf_counter()
+    try:
+        yield attrs
+    finally:
+        end = time.perf_counter()
+        stack.pop()
+        rss_end = rss_mb()
+        record = {
+            "name": name, "parent": parent, "start": start - _EPOCH, "seconds": end - start,
+            "pid": os.getpid(), "tid": threading.get_ident(),
+            "rss_mb": rss_end,
+            "rss_delta_mb": None if rss_start is None else rss_end - rss_start,
+        }
+        if tracing and tracemalloc.is_tracing():
+            record["py_alloc_delta_mb"] = (tracemalloc.get_traced_memory()[0] - py_start) / 2 ** 20
+        if attrs:
+            record["attrs"] = attrs
+        _spans.append(record)
+
+
+def spans() -> list:
+    """Spans recorded so far in this process, in completion order."""
+    return list(_spans)
+
+
+def reset() -> None:
+    _spans.clear()
+
+
+def summarize(records: list = None) -> list:
+    """Total seconds, calls and largest RSS growth per span name, slowest first."""
+    totals = {}
+    for r in _spans if records is None else records:
+        t = totals.setdefault(r["name"], {"name": r["name"], "calls": 0, "seconds": 0.0,
+                                          "max_rss_delta_mb": None})
+        t["calls"] += 1
+        t["seconds"] += r["seconds"]
+        if r.get("rss_delta_mb") is not None:
+            t["max_rss_delta_mb"] = max(t["max_rss_delta_mb"] or 0.0, r["rss_delta_mb"])
+    return sorted(totals.values(), key=lambda t: -t["seconds"])
+
+
+def export_json(path: str, records: list = None) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"spans": _spans if records is None else records,
+                   "summary": summarize(records)}, f, indent=2, default=str)
+
+
+def to_chrome_trace(records: list) -> dict:
+    """Spans as Chrome trace "complete" events plus an RSS counter track."""
+    events = []
+    for r in records:
+        ts = r["start"] * 1e6
+        args = {k: r[k] for k in ("rss_mb", "rss_delta_mb", "py_alloc_delta_mb") if k in r}
+        args.update(r.get("attrs", {}))
+        events.append({"name": r["name"], "cat": r["name"].split(".")[0], "ph": "X",
+                       "ts": ts, "dur": r["seconds"] * 1e6,
+                       "pid": r["pid"], "tid": r["tid"], "args": args})
+        if r.get("rss_mb") is not None:
+            events.append({"name": "rss_mb", "ph": "C", "ts": ts + r["seconds"] * 1e6,
+                           "pid": r["pid"], "args": {"rss_mb": r["rss_mb"]}})
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def export_chrome_trace(path: str, records: list = None) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(to_chrome_trace(_spans if records is None else records), f, default=str)
+
+
+def export(path: str, records: list = None, fmt: str = "chrome") -> None:
+    """Write spans as ``fmt`` ("chrome" or "json")."""
+    if fmt == "chrome":
+        export_chrome_trace(path, records)
+    elif fmt == "json":
+        export_json(path, records)
+    else:
+        raise ValueError(f"Unknown trace format '{fmt}'. Choose 'chrome' or 'json'")
+
+
+def load_trace_dir(trace_dir: str) -> list:
+    """Spans dumped by child processes into ``trace_dir``.
+
+    Each process's clock has its own origin, so child spans are shifted by
+    the wall-clock time their process started relative to the earliest one.
+    """
+    dumps = []
+    for name in sorted(os.listdir(trace_dir)):
+        if name.startswith("spans-") and name.endswith(".json"):
+            with open(os.path.join(trace_dir, name), encoding="utf-8") as f:
+                dumps.append(json.load(f))
+    if not dumps:
+        return []
+    origin = min(d["wall_epoch"] for d in dumps)
+    records = []
+    for d in dumps:
+        offset = d["wall_epoch"] - origin
+        records.extend({**r, "start": r["start"] + offset} for r in d["spans"])
+    return records
+
+
+def dump_spans(trace_dir: str) -> None:
+    """Write this process's spans to ``trace_dir`` for ``load_trace_dir``."""
+    if not _spans:
+        return
+    os.makedirs(trace_dir, exist_ok=True)
+    path = os.path.join(trace_dir, f"spans-{os.getpid()}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"wall_epoch": time.time() - (time.perf_counter() - _EPOCH),
+                   "argv": sys.argv, "spans": _spans}, f, default=str)
+
+
+def _dump_to_trace_dir() -> None:
+    trace_dir = os.environ.get(TRACE_DIR_ENV)
+    if trace_dir:
+        dump_spans(trace_dir)
+
+
+atexit.register(_dump_to_trace_dir)
+
+
+@contextmanager
+def profile_stage(name: str, out_dir: str, top: int = 30):
+    """cProfile + tracemalloc the enclosed block into ``out_dir``.
+
+    cProfile only sees the calling thread, so stages should not fan out to
+    worker threads while profiled.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start(10)
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        with span(f"{name}.total"):
+            yield
+    finally:
+        profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        if started_tracing:
+            tracemalloc.stop()
+
+        base = os.path.join(out_dir, name)
+        profiler.dump_stats(base + ".prof")
+        text = io.StringIO()
+        pstats.Stats(profiler, stream=text).sort_stats("cumulative").print_stats(top)
+        with open(base + ".txt", "w", encoding="utf-8") as f:
+            f.write(text.getvalue())
+        with open(base + ".tracemalloc.txt", "w", encoding="utf-8") as f:
+            f.write(f"Python-allocated memory: current {current / 2 ** 20:.1f} MB, "
+                    f"peak {peak / 2 ** 20:.1f} MB\n\n")
+            for stat in snapshot.statistics("lineno")[:top]:
+                f.write(f"{stat}\n")
+
+
+def main(argv=None) -> int:
+    import argparse
+    import runpy
+
+    parser = argparse.ArgumentParser(description="Run a pipeline script under cProfile/tracemalloc")
+    parser.add_argument("--profile-dir", required=True)
+    parser.add_argument("script")
+    parser.add_argument("args", nargs=argparse.REMAINDER)
+    args = parser.parse_args(argv)
+
+    sys.argv = [args.script, *args.args]
+    sys.path.insert(0, os.path.dirname(os.path.abspath(args.script)))
+    # Use the importable module (not this __main__ copy) so the script's own
+    # spans and the stage span land in the same recorder
+    import instrumentation
+
+    stage = os.path.splitext(os.path.basename(args.script))[0]
+    with instrumentation.profile_stage(stage, args.profile_dir):
+        runpy.run_path(args.script, run_name="__main__")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,26 +1,102 @@
 import pandas as pd
 import numpy as np
 import os
+import shutil
+import tempfile
+from artifact_io import (
+    ChunkedTableWriter, apply_schema, artifact_path, frame_mb, load_frame, memory_report,
+    write_table,
+)
+from instrumentation import span
+from sketches import QuantileSketch
 
 REQUIRED_COLUMNS = ['timestamp', 'region', 'service_type', 'usage_units']
+SORT_KEYS = ["timestamp", "region"]
+GROUP_COLS = ["region", "service_type"]
+DEFAULT_CHUNKSIZE = 500_000
 
 
-def _cap_outliers_iqr(df: pd.DataFrame, numeric_cols: list) -> pd.DataFrame:
-    """Winsorize numeric columns using the IQR method."""
-    for col in numeric_cols:
-        Q1, Q3 = df[col].quantile(0.25), df[col].quantile(0.75)
-        IQR = Q3 - Q1
-        lower, upper = Q1 - 1.5 * IQR, Q3 + 1.5 * IQR
-        n_outliers = ((df[col] < lower) | (df[col] > upper)).sum()
-        if n_outliers > 0:
-            print(f"  [{col}] Capping {n_outliers} outliers to [{lower:.2f}, {upper:.2f}]")
-        df[col] = df[col].clip(lower=lower, upper=upper)
-    return df
+def _grouped_quantiles(block: np.ndarray, codes: np.ndarray, n_groups: int, qs) -> np.ndarray:
+    """Per-group, per-column linear-interpolated quantiles, NaNs skipped.
+
+    ``block`` is (rows, cols) and ``codes`` the group of each row in
+    ``[0, n_groups)``. One stable sort by (group, value) per column gives
+    every group's values as a contiguous sorted run, so the cost is
+    O(rows log rows) per column however many groups there are. Returns
+    (n_groups, len(qs), cols); groups without values get NaN.
+    """
+    qs = np.atleast_1d(np.asarray(qs, dtype="float64"))
+    out = np.full((n_groups, len(qs), block.shape[1]), np.nan)
+    sizes = np.bincount(codes, minlength=n_groups)
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    for j in range(block.shape[1]):
+        values = block[:, j]
+        valid = ~np.isnan(values)
+        counts = np.bincount(codes, weights=valid, minlength=n_groups).astype("int64")
+        # NaNs sort to the end of each group's run
+        ordered = values[np.lexsort((values, codes))]
+        has = counts > 0
+        for i, q in enumerate(qs):
+            pos = starts[has] + q * (counts[has] - 1)
+            lo = np.floor(pos).astype("int64")
+            hi = np.minimum(lo + 1, starts[has] + counts[has] - 1)
+            frac = pos - lo
+            out[has, i, j] = ordered[lo] + (ordered[hi] - ordered[lo]) * frac
+    return out
+
+
+def _cap_outliers_iqr(block: np.ndarray, numeric_cols: list, codes: np.ndarray = None,
+                      n_groups: int = 0) -> np.ndarray:
+    """Winsorize the numeric block in place using the IQR method.
+
+    Q1/Q3 of all columns come from one ``np.nanquantile`` over the block
+    (or one grouped pass per column when ``codes`` is given, so each
+    (region, service_type) series gets its own bounds).
+    """
+    if codes is None:
+        if not len(block):
+            return block
+        q1, q3 = np.nanquantile(block, [0.25, 0.75], axis=0)
+        iqr = q3 - q1
+        # All-NaN columns get no bounds, as with Series.clip(NaN)
+        lower = np.nan_to_num(q1 - 1.5 * iqr, nan=-np.inf)
+        upper = np.nan_to_num(q3 + 1.5 * iqr, nan=np.inf)
+        n_outliers = ((block < lower) | (block > upper)).sum(axis=0)
+        np.clip(block, lower, upper, out=block)
+        for col, n, lo, hi in zip(numeric_cols, n_outliers, lower, upper):
+            if n > 0:
+                print(f"  [{col}] Capping {n} outliers to [{lo:.2f}, {hi:.2f}]")
+        return block
 
+    quartiles = _grouped_quantiles(block, codes, n_groups, [0.25, 0.75])
+    iqr = quartiles[:, 1] - quartiles[:, 0]
+    # Groups without values never cap (NaN bounds would poison np.clip)
+    lower = np.nan_to_num(quartiles[:, 0] - 1.5 * iqr, nan=-np.inf)
+    upper = np.nan_to_num(quartiles[:, 1] + 1.5 * iqr, nan=np.inf)
+    row_lower, row_upper = lower[codes], upper[codes]
+    n_outliers = ((block < row_lower) | (block > row_upper)).sum(axis=0)
+    np.clip(block, row_lower, row_upper, out=block)
+    for col, n in zip(numeric_cols, n_outliers):
+        if n > 0:
+            print(f"  [{col}] Capping {n} outliers to per-series bounds ({n_groups} series)")
+    return block
 
-def prepare_data(input_file: str, output_file: str) -> pd.DataFrame:
-    print(f"Loading data from {input_file}...")
-    df = pd.read_csv(input_file)
+
+def prepare_data(input_file, output_file: str = None, group_cols: list = None) -> pd.DataFrame:
+    """Clean raw demand data.
+
+    ``input_file`` may be an artifact path (CSV/Parquet/Feather) or an
+    already-loaded DataFrame; the cleaned frame is only written to disk when
+    ``output_file`` is given. Numeric columns are cleaned as one float64
+    block: medians, quartiles, imputation and capping are vectorised over
+    all columns at once. With ``group_cols`` (e.g. ``GROUP_COLS``) medians
+    and IQR bounds are computed per series instead of fleet-wide.
+    """
+    if not isinstance(input_file, pd.DataFrame):
+        print(f"Loading data from {input_file}...")
+    with span("prepare_data.load"):
+        df = load_frame(input_file, schema=False)
+    raw_mb = frame_mb(df)
     print(f"Initial shape: {df.shape}")
     print("Columns found:", df.columns.tolist())
 
@@ -32,7 +108,8 @@ def prepare_data(input_file: str, output_file: str) -> pd.DataFrame:
 
     # 2. Remove duplicate rows
     before = len(df)
-    df = df.drop_duplicates()
+    with span("prepare_data.dedupe", rows=before):
+        df = df.drop_duplicates()
     print(f"Duplicates removed: {before - len(df)} (kept {len(df)} rows)")
 
     # 3. Handle missing values (safe .loc-based assignment)
@@ -40,43 +117,275 @@ def prepare_data(input_file: str, output_file: str) -> pd.DataFrame:
     print(df.isnull().sum())
 
     numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
-    df.loc[:, numeric_cols] = df[numeric_cols].fillna(df[numeric_cols].median())
-
     categorical_cols = df.select_dtypes(include="object").columns.tolist()
-    for col in categorical_cols:
-        fill_val = df[col].mode()[0] if not df[col].mode().empty else "Unknown"
-        df.loc[:, col] = df[col].fillna(fill_val)
+    with span("prepare_data.fillna_categorical"):
+        for col in categorical_cols:
+            mode = df[col].mode()
+            df[col] = df[col].fillna(mode[0] if not mode.empty else "Unknown")
 
-    # 4. Enforce dtypes on numeric columns
-    for col in numeric_cols:
-        df[col] = pd.to_numeric(df[col], errors="coerce").astype("float64")
+    # 4. Unify formats (before numeric cleaning so series keys are canonical)
+    with span("prepare_data.unify_formats"):
+        df["timestamp"] = pd.to_datetime(df["timestamp"])
+        df["region"] = df["region"].str.lower().str.strip()
+        df["service_type"] = df["service_type"].str.lower().str.strip()
 
-    # 5. Outlier capping (IQR / Winsorization)
-    print("\nCapping outliers (IQR)...")
-    df = _cap_outliers_iqr(df, numeric_cols)
+    # 5. Numeric block: float64, median imputation, IQR capping — one copy
+    codes, n_groups = None, 0
+    if group_cols:
+        codes = df.groupby(group_cols, sort=False, dropna=False).ngroup().to_numpy()
+        n_groups = int(codes.max()) + 1 if len(codes) else 0
+    block = df[numeric_cols].to_numpy(dtype="float64", copy=True)
+    with span("prepare_data.fillna_numeric", rows=len(df), groups=n_groups):
+        if codes is None:
+            medians = np.nanmedian(block, axis=0)
+            row_medians = np.broadcast_to(medians, block.shape)
+        else:
+            grouped = _grouped_quantiles(block, codes, n_groups, [0.5])[:, 0]
+            # Series with no values at all fall back to the fleet median
+            grouped = np.where(np.isnan(grouped), np.nanmedian(block, axis=0), grouped)
+            row_medians = grouped[codes]
+        missing = np.isnan(block)
+        block[missing] = row_medians[missing]
 
-    # 6. Unify formats
-    df["timestamp"] = pd.to_datetime(df["timestamp"])
-    df["region"] = df["region"].str.lower().str.strip()
-    df["service_type"] = df["service_type"].str.lower().str.strip()
+    print("\nCapping outliers (IQR" + (", per series" if codes is not None else "") + ")...")
+    with span("prepare_data.outlier_capping", columns=len(numeric_cols)):
+        block = _cap_outliers_iqr(block, numeric_cols, codes, n_groups)
+    df[numeric_cols] = block
 
     # 7. Sort and reset index
-    df = df.sort_values(by=["timestamp", "region"]).reset_index(drop=True)
+    with span("prepare_data.sort", rows=len(df)):
+        df = df.sort_values(by=["timestamp", "region"]).reset_index(drop=True)
+
+    # 8. Lean dtypes (categorical dimensions, narrow flags, lossless float32)
+    with span("prepare_data.dtypes_policy"):
+        df = apply_schema(df)
+    memory_report(raw_mb, df, "raw → cleaned")
 
     print("\nMissing values after cleaning:")
     print(df.isnull().sum())
     print(f"\nFinal shape: {df.shape}")
 
-    df.to_csv(output_file, index=False)
-    print(f"Cleaned data saved to {output_file}")
+    if output_file:
+        with span("prepare_data.write"):
+            write_table(df, output_file)
+        print(f"Cleaned data saved to {output_file}")
     return df
 
 
+def _row_hashes(chunk: pd.DataFrame, numeric_cols: list) -> np.ndarray:
+    """64-bit row hashes with numerics normalised to float64 across chunks."""
+    norm = chunk.copy()
+    for col in numeric_cols:
+        norm[col] = pd.to_numeric(norm[col], errors="coerce").astype("float64")
+    return pd.util.hash_pandas_object(norm, index=False).to_numpy()
+
+
+def _stream_pass_one(input_file: str, chunksize: int):
+    """Dedupe and collect cleaning statistics without holding the data.
+
+    Returns per-chunk keep masks (bit-packed) plus the numeric sketches,
+    null counts and categorical value counts of the de-duplicated rows.
+    """
+    seen = np.empty(0, dtype="uint64")
+    keep_masks, rows_in = [], 0
+    numeric_cols = categorical_cols = None
+    sketches, null_counts, value_counts = {}, {}, {}
+
+    for chunk in pd.read_csv(input_file, chunksize=chunksize):
+        if numeric_cols is None:
+            missing_cols = [c for c in REQUIRED_COLUMNS if c not in chunk.columns]
+            if missing_cols:
+                raise ValueError(f"Missing required columns: {missing_cols}")
+            print("Columns found:", chunk.columns.tolist())
+            print(f"Schema OK — all required columns present.")
+            numeric_cols = chunk.select_dtypes(include=[np.number]).columns.tolist()
+            categorical_cols = chunk.select_dtypes(include="object").columns.tolist()
+            sketches = {c: QuantileSketch() for c in numeric_cols}
+            null_counts = {c: 0 for c in chunk.columns}
+            value_counts = {c: pd.Series(dtype="int64") for c in categorical_cols}
+        rows_in += len(chunk)
+
+        # Hash-set dedupe: drop repeats inside the chunk, then anything
+        # already seen (sorted uint64 array, 8 bytes per unique row)
+        hashes = _row_hashes(chunk, numeric_cols)
+        keep = ~pd.Series(hashes).duplicated().to_numpy()
+        if seen.size:
+            pos = np.minimum(np.searchsorted(seen, hashes), seen.size - 1)
+            keep &= seen[pos] != hashes
+        seen = np.sort(np.concatenate([seen, hashes[keep]]), kind="stable")
+        keep_masks.append(np.packbits(keep))
+
+        kept = chunk[keep]
+        for col in kept.columns:
+            null_counts[col] += int(kept[col].isnull().sum())
+        for col in numeric_cols:
+            sketches[col].update(pd.to_numeric(kept[col], errors="coerce").to_numpy())
+        for col in categorical_cols:
+            value_counts[col] = value_counts[col].add(kept[col].value_counts(), fill_value=0)
+
+    return {
+        "rows_in": rows_in,
+        "rows_kept": int(seen.size),
+        "keep_masks": keep_masks,
+        "numeric_cols": numeric_cols,
+        "categorical_cols": categorical_cols,
+        "sketches": sketches,
+        "null_counts": null_counts,
+        "value_counts": value_counts,
+    }
+
+
+def _merge_sorted_runs(run_dirs: list, writer: ChunkedTableWriter) -> None:
+    """K-way block merge of sorted run directories into ``writer``.
+
+    Each run is a sequence of sorted block pickles. Every round emits all
+    buffered rows whose key is <= the smallest "last key" across runs, which
+    exhausts at least one buffer, so memory stays at one block per run.
+    """
+    runs = [sorted(os.listdir(d)) for d in run_dirs]
+    buffers = [pd.read_pickle(os.path.join(d, r.pop(0))) for d, r in zip(run_dirs, runs)]
+
+    while buffers:
+        last_keys = [tuple(b[k].iloc[-1] for k in SORT_KEYS) for b in buffers]
+        cut_ts, cut_region = min(last_keys)
+        parts, remaining = [], []
+        for i, buf in enumerate(buffers):
+            ts, region = buf["timestamp"], buf["region"]
+            take = ((ts < cut_ts) | ((ts == cut_ts) & (region <= cut_region))).to_numpy()
+            parts.append(buf[take])
+            remaining.append(buf[~take])
+        merged = pd.concat(parts, ignore_index=True).sort_values(SORT_KEYS, kind="stable")
+        writer.write(merged)
+
+        next_buffers, next_dirs, next_runs = [], [], []
+        for buf, d, r in zip(remaining, run_dirs, runs):
+            if buf.empty and r:
+                buf = pd.read_pickle(os.path.join(d, r.pop(0)))
+            if not buf.empty:
+                next_buffers.append(buf)
+                next_dirs.append(d)
+                next_runs.append(r)
+        buffers, run_dirs, runs = next_buffers, next_dirs, next_runs
+
+
+def prepare_data_streaming(
+    input_file: str,
+    output_file: str,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    tmp_dir: str = None,
+) -> dict:
+    """Two-pass, bounded-memory version of ``prepare_data`` for large CSVs.
+
+    Pass 1 de-duplicates via a row-hash set and builds statistics (quantile
+    sketches for medians/IQR bounds, mode counts). Pass 2 re-reads the input
+    chunk by chunk, cleans each chunk with those global statistics and writes
+    sorted runs that are merged into ``output_file``. Peak memory is set by
+    ``chunksize`` (plus 8 bytes per unique row for the hash set). Medians and
+    quantiles are exact while a column has at most a few thousand distinct
+    values, approximate (~0.02% rank error) beyond that.
+    """
+    print(f"Streaming data from {input_file} (chunksize={chunksize:,})...")
+    stats = _stream_pass_one(input_file, chunksize)
+    numeric_cols, categorical_cols = stats["numeric_cols"], stats["categorical_cols"]
+    print(f"Initial rows: {stats['rows_in']}")
+    print(f"Duplicates removed: {stats['rows_in'] - stats['rows_kept']} "
+          f"(kept {stats['rows_kept']} rows)")
+    print("\nMissing values before cleaning:")
+    print(pd.Series(stats["null_counts"]))
+
+    medians, bounds = {}, {}
+    for col in numeric_cols:
+        sketch = stats["sketches"][col]
+        medians[col] = sketch.quantile(0.5)
+        # IQR is taken after median imputation, as in prepare_data
+        sketch.update([medians[col]], weight=stats["null_counts"][col])
+        q1, q3 = sketch.quantile([0.25, 0.75])
+        iqr = q3 - q1
+        bounds[col] = (q1 - 1.5 * iqr, q3 + 1.5 * iqr)
+    modes = {}
+    for col in categorical_cols:
+        counts = stats["value_counts"][col]
+        # Ties resolve to the smallest value, matching Series.mode()[0]
+        modes[col] = (
+            counts[counts == counts.max()].sort_index().index[0]
+            if not counts.empty else "Unknown"
+        )
+
+    work_dir = tempfile.mkdtemp(prefix="prep_runs_", dir=tmp_dir)
+    try:
+        n_runs = len(stats["keep_masks"])
+        block_rows = max(1, chunksize // max(n_runs, 1))
+        run_dirs, n_outliers = [], {c: 0 for c in numeric_cols}
+
+        print("\nCleaning chunks and writing sorted runs...")
+        reader = pd.read_csv(input_file, chunksize=chunksize)
+        for i, (chunk, packed) in enumerate(zip(reader, stats["keep_masks"])):
+            keep = np.unpackbits(packed, count=len(chunk)).astype(bool)
+            chunk = chunk[keep].copy()
+            for col in numeric_cols:
+                values = pd.to_numeric(chunk[col], errors="coerce").astype("float64")
+                values = values.fillna(medians[col])
+                lower, upper = bounds[col]
+                n_outliers[col] += int(((values < lower) | (values > upper)).sum())
+                chunk[col] = values.clip(lower=lower, upper=upper)
+            for col in categorical_cols:
+                chunk[col] = chunk[col].fillna(modes[col])
+            chunk["timestamp"] = pd.to_datetime(chunk["timestamp"])
+            chunk["region"] = chunk["region"].str.lower().str.strip()
+            chunk["service_type"] = chunk["service_type"].str.lower().str.strip()
+            chunk = chunk.sort_values(SORT_KEYS, kind="stable").reset_index(drop=True)
+
+            run_dir = os.path.join(work_dir, f"run_{i:06d}")
+            os.makedirs(run_dir)
+            for b, start in enumerate(range(0, len(chunk), block_rows)):
+                chunk.iloc[start:start + block_rows].to_pickle(
+                    os.path.join(run_dir, f"block_{b:06d}.pkl")
+                )
+            if len(chunk):
+                run_dirs.append(run_dir)
+
+        print("\nCapping outliers (IQR)...")
+        for col in numeric_cols:
+            if n_outliers[col] > 0:
+                lower, upper = bounds[col]
+                print(f"  [{col}] Capping {n_outliers[col]} outliers to [{lower:.2f}, {upper:.2f}]")
+
+        print(f"\nMerging {len(run_dirs)} sorted runs...")
+        with ChunkedTableWriter(output_file) as writer:
+            _merge_sorted_runs(run_dirs, writer)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"\nFinal rows: {writer.rows}")
+    print(f"Cleaned data saved to {output_file}")
+    return {
+        "rows_in": stats["rows_in"],
+        "rows_out": writer.rows,
+        "duplicates": stats["rows_in"] - stats["rows_kept"],
+        "chunks": n_runs,
+    }
+
+
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Milestone 1: data preparation")
+    parser.add_argument("--stream", action="store_true",
+                        help="two-pass chunked cleaning for inputs larger than RAM")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE,
+                        help="rows per chunk in --stream mode")
+    parser.add_argument("--by-series", action="store_true",
+                        help="impute and cap outliers per region/service_type instead of "
+                             "fleet-wide (in-memory mode)")
+    args = parser.parse_args()
+
     input_csv = "azure_compute_storage_demand_10000_rows.csv"
-    output_csv = "milestone_1_cleaned_data.csv"
+    output_csv = artifact_path("milestone_1_cleaned_data")
 
-    if os.path.exists(input_csv):
-        cleaned_df = prepare_data(input_csv, output_csv)
+    if os.path.exists(input_csv) and args.stream:
+        prepare_data_streaming(input_csv, output_csv, chunksize=args.chunksize)
+    elif os.path.exists(input_csv):
+        cleaned_df = prepare_data(input_csv, output_csv,
+                                  group_cols=GROUP_COLS if args.by_series else None)
     else:
         print(f"Error: '{input_csv}' not found. Place the dataset in the working directory.")
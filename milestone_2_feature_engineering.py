@@ -1,54 +1,162 @@
 import pandas as pd
 import numpy as np
 import os
+from pandas.api.indexers import BaseIndexer
+from artifact_io import (
+    apply_schema, artifact_path, frame_mb, load_frame, memory_report, write_table,
+)
+from instrumentation import span
 
+GROUP_COLS = ["region", "service_type"]
+SORT_KEYS = ["timestamp", "region", "service_type"]
+LAGS = (1, 7)
+ROLLING_WINDOWS = (3, 7)
+SPIKE_WINDOW = 7       # rolling mean usage_spike is measured against
 
-def engineer_features(input_file: str, output_file: str) -> pd.DataFrame:
-    print(f"Loading cleaned data from {input_file}...")
-    df = pd.read_csv(input_file)
-    df["timestamp"] = pd.to_datetime(df["timestamp"])
+
+class _GroupedWindowIndexer(BaseIndexer):
+    """Trailing window of ``window_size`` rows that never crosses a group start.
+
+    Rows must be laid out group by group; ``group_start[i]`` is the position of
+    the first row of row i's group. At each group start the window bounds jump
+    past the previous window, so pandas' rolling kernel resets its running sum
+    exactly as it does when each group is rolled on its own.
+    """
+
+    def get_window_bounds(self, num_values=0, min_periods=None, center=None,
+                          closed=None, step=None):
+        end = np.arange(1, num_values + 1, dtype="int64")
+        start = np.maximum(end - self.window_size, self.group_start)
+        return start, end
+
+
+def add_lag_rolling_features(
+    df: pd.DataFrame,
+    lags=LAGS,
+    windows=ROLLING_WINDOWS,
+    value_col: str = "usage_units",
+    group_cols=GROUP_COLS,
+) -> pd.DataFrame:
+    """Add ``usage_lag_<k>`` and ``usage_rolling_mean_<w>`` columns in one pass.
+
+    Rows are stably sorted by group once; lags are then plain array shifts
+    masked at group boundaries and each rolling mean is a single pandas
+    rolling pass with group-aware bounds. Results are bit-identical to
+    per-group ``shift``/``rolling(min_periods=1).mean()``, in the original
+    row order.
+    """
+    codes = df.groupby(group_cols, sort=False, observed=True).ngroup().to_numpy()
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = codes[order]
+    n = len(df)
+    idx = np.arange(n, dtype="int64")
+
+    new_group = np.ones(n, dtype=bool)
+    new_group[1:] = sorted_codes[1:] != sorted_codes[:-1]
+    group_start = np.maximum.accumulate(np.where(new_group, idx, 0))
+    pos_in_group = idx - group_start
+    values = df[value_col].to_numpy(dtype="float64")[order]
+    # Rows with a missing group key get NaN, as with groupby().transform()
+    no_group = codes < 0
+
+    def _unsort(sorted_values):
+        out = np.empty(n, dtype="float64")
+        out[order] = sorted_values
+        out[no_group] = np.nan
+        return out
+
+    for k in lags:
+        with span(f"engineer_features.usage_lag_{k}"):
+            shifted = np.full(n, np.nan)
+            if k < n:
+                shifted[k:] = values[:n - k]
+            shifted[pos_in_group < k] = np.nan
+            df[f"usage_lag_{k}"] = _unsort(shifted)
+
+    series = pd.Series(values)
+    for w in windows:
+        with span(f"engineer_features.usage_rolling_mean_{w}"):
+            indexer = _GroupedWindowIndexer(window_size=w, group_start=group_start)
+            rolled = series.rolling(indexer, min_periods=1).mean().to_numpy()
+            df[f"usage_rolling_mean_{w}"] = _unsort(rolled)
+    return df
+
+
+def add_time_features(df: pd.DataFrame) -> pd.DataFrame:
+    """Add calendar features derived from ``timestamp``."""
+    ts = df["timestamp"].dt
+    df["hour"] = ts.hour.astype("int8")
+    df["day_of_week"] = ts.dayofweek.astype("int8")
+    df["day_of_month"] = ts.day.astype("int8")
+    df["month"] = ts.month.astype("int8")
+    df["quarter"] = ts.quarter.astype("int8")
+    df["is_weekend"] = df["day_of_week"].isin([5, 6]).astype("int8")
+    return df
+
+
+def add_spike_and_fill(df: pd.DataFrame, lag_and_roll_cols: list) -> pd.DataFrame:
+    """Add ``usage_spike`` and zero-fill the leading lag/rolling NaNs."""
+    # Usage spike relative to 7-step rolling mean (uses lag_1 to avoid data leakage)
+    df["usage_spike"] = df["usage_lag_1"] / (df[f"usage_rolling_mean_{SPIKE_WINDOW}"] + 1e-6)
+
+    # Fill ONLY the lag/rolling NaNs (first rows per group) with 0
+    # Avoid globally filling all columns, which hides real data issues.
+    df[lag_and_roll_cols + ["usage_spike"]] = df[
+        lag_and_roll_cols + ["usage_spike"]
+    ].fillna(0)
+    return df
+
+
+def engineer_features(
+    input_file,
+    output_file: str = None,
+    lags=LAGS,
+    windows=ROLLING_WINDOWS,
+) -> pd.DataFrame:
+    """Add calendar, lag and rolling features to cleaned data.
+
+    ``input_file`` may be an artifact path or the DataFrame returned by
+    ``prepare_data``; output is only written when ``output_file`` is given.
+    ``lags``/``windows`` choose the lag and rolling-mean columns; lag 1 and
+    window 7 are always needed for ``usage_spike``.
+    """
+    if 1 not in lags or SPIKE_WINDOW not in windows:
+        raise ValueError("lags must include 1 and windows must include 7 (used by usage_spike)")
+    if not isinstance(input_file, pd.DataFrame):
+        print(f"Loading cleaned data from {input_file}...")
+    with span("engineer_features.load"):
+        df = load_frame(input_file)
+        # Columnar artifacts already carry datetime64; only CSV needs parsing
+        if not pd.api.types.is_datetime64_any_dtype(df["timestamp"]):
+            df["timestamp"] = pd.to_datetime(df["timestamp"])
 
     # Sort for correct lag ordering within each group
-    df = df.sort_values(by=["timestamp", "region", "service_type"]).reset_index(drop=True)
+    with span("engineer_features.sort", rows=len(df)):
+        df = df.sort_values(by=SORT_KEYS).reset_index(drop=True)
 
     # 1. Time-based features
     print("Engineering time-based features...")
-    df["hour"] = df["timestamp"].dt.hour
-    df["day_of_week"] = df["timestamp"].dt.dayofweek
-    df["day_of_month"] = df["timestamp"].dt.day
-    df["month"] = df["timestamp"].dt.month
-    df["quarter"] = df["timestamp"].dt.quarter
-    df["is_weekend"] = df["day_of_week"].isin([5, 6]).astype(int)
+    with span("engineer_features.time_features"):
+        df = add_time_features(df)
 
     # 2. Lag features and rolling averages (grouped by region + service_type)
     print("Creating lag variables and rolling averages...")
 
-    lag_and_roll_cols = [
-        "usage_lag_1",
-        "usage_lag_7",
-        "usage_rolling_mean_3",
-        "usage_rolling_mean_7",
-    ]
-
-    # Use .transform() so the result aligns correctly with the DataFrame index
-    grp = df.groupby(["region", "service_type"])["usage_units"]
-    df["usage_lag_1"] = grp.transform(lambda x: x.shift(1))
-    df["usage_lag_7"] = grp.transform(lambda x: x.shift(7))
-    df["usage_rolling_mean_3"] = grp.transform(
-        lambda x: x.rolling(window=3, min_periods=1).mean()
-    )
-    df["usage_rolling_mean_7"] = grp.transform(
-        lambda x: x.rolling(window=7, min_periods=1).mean()
+    lag_and_roll_cols = (
+        [f"usage_lag_{k}" for k in lags]
+        + [f"usage_rolling_mean_{w}" for w in windows]
     )
+    df = add_lag_rolling_features(df, lags=lags, windows=windows)
 
-    # Usage spike relative to 7-step rolling mean (uses lag_1 to avoid data leakage)
-    df["usage_spike"] = df["usage_lag_1"] / (df["usage_rolling_mean_7"] + 1e-6)
+    # 3. Spike ratio, then fill only the leading lag/rolling NaNs
+    with span("engineer_features.spike_and_fill"):
+        df = add_spike_and_fill(df, lag_and_roll_cols)
 
-    # 3. Fill ONLY the lag/rolling NaNs (first rows per group) with 0
-    #    Avoid globally filling all columns, which hides real data issues.
-    df[lag_and_roll_cols + ["usage_spike"]] = df[
-        lag_and_roll_cols + ["usage_spike"]
-    ].fillna(0)
+    # 4. Lean dtypes — after usage_spike, which is computed in float64
+    before_mb = frame_mb(df)
+    with span("engineer_features.dtypes_policy"):
+        df = apply_schema(df)
+    memory_report(before_mb, df, "featured")
 
     print("\nFeature engineering complete. New columns added:")
     new_cols = ["hour", "day_of_week", "day_of_month", "month", "quarter",
@@ -56,14 +164,16 @@ def engineer_features(input_file: str, output_file: str) -> pd.DataFrame:
     print(new_cols)
 
     print(f"\nFinal shape: {df.shape}")
-    df.to_csv(output_file, index=False)
-    print(f"Feature-enriched data saved to {output_file}")
+    if output_file:
+        with span("engineer_features.write"):
+            write_table(df, output_file)
+        print(f"Feature-enriched data saved to {output_file}")
     return df
 
 
 if __name__ == "__main__":
-    input_csv = "milestone_1_cleaned_data.csv"
-    output_csv = "milestone_2_featured_data.csv"
+    input_csv = artifact_path("milestone_1_cleaned_data")
+    output_csv = artifact_path("milestone_2_featured_data")
 
     if os.path.exists(input_csv):
         featured_df = engineer_features(input_csv, output_csv)
@@ -1,17 +1,25 @@
 import sys
-import io
 import pandas as pd
 import numpy as np
 import os
+import shutil
+import time
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import mean_absolute_error, mean_squared_error
 import xgboost as xgb
-import joblib
+from artifact_io import artifact_path, load_frame
+from instrumentation import span
+from model_store import save_model
+from quantile_forecast import (
+    QUANTILES, evaluate, fit_quantile_model, quantile_path, save_quantile_model,
+)
 
 # Force UTF-8 stdout so XGBoost's internal Unicode output doesn't crash on Windows
-if hasattr(sys.stdout, "buffer"):
-    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", errors="replace")
+# (reconfigure in place: re-wrapping the buffer breaks when several
+# milestones are imported into the same process)
+if hasattr(sys.stdout, "reconfigure"):
+    sys.stdout.reconfigure(encoding="utf-8", errors="replace")
 
 FEATURES = [
     "hour", "day_of_week", "day_of_month", "month", "quarter", "is_weekend",
@@ -19,6 +27,13 @@ FEATURES = [
     "is_holiday", "usage_spike",
 ]
 TARGET = "usage_units"
+MODEL_PATH = "best_demand_forecast_model"
+RF_PARAMS = {"n_estimators": 100, "random_state": 42}
+XGB_PARAMS = {
+    "n_estimators": 100, "learning_rate": 0.1, "max_depth": 5,
+    "random_state": 42, "verbosity": 0,
+}
+CANDIDATES = ["Random Forest", "XGBoost"]
 
 
 def _rmse(y_true, y_pred) -> float:
@@ -26,9 +41,69 @@ def _rmse(y_true, y_pred) -> float:
     return float(np.sqrt(mean_squared_error(y_true, y_pred)))
 
 
-def train_and_evaluate(input_file: str, model_output_path: str):
-    print(f"Loading featured data from {input_file}...")
-    df = pd.read_csv(input_file)
+def fit_candidate(name: str, X_train, y_train, X_test, y_test, n_jobs: int = -1) -> dict:
+    """Fit one of the fixed configurations (``"Random Forest"`` or ``"XGBoost"``)
+    and score it on the holdout."""
+    if name == "Random Forest":
+        print("\nTraining Random Forest Regressor...")
+        model = RandomForestRegressor(**RF_PARAMS, n_jobs=n_jobs)
+    elif name == "XGBoost":
+        print("\nTraining XGBoost Regressor...")
+        model = xgb.XGBRegressor(**XGB_PARAMS, n_jobs=n_jobs)
+    else:
+        raise ValueError(f"Unknown candidate '{name}'. Choose from {CANDIDATES}")
+    with span(f"train.fit.{name}", rows=len(X_train)):
+        model.fit(X_train, y_train)
+    with span(f"train.predict_holdout.{name}", rows=len(X_test)):
+        preds = model.predict(X_test)
+    mae, rmse = mean_absolute_error(y_test, preds), _rmse(y_test, preds)
+    print(f"  {name} MAE : {mae:.4f}")
+    print(f"  {name} RMSE: {rmse:.4f}")
+    return {"name": name, "model": model, "mae": mae, "rmse": rmse}
+
+
+def select_best(candidates: list):
+    """Pick the lower-MAE candidate (earlier candidates win ties)."""
+    best = min(candidates, key=lambda c: c["mae"])
+    print(f"\n{best['name']} performed better → selected as final model.")
+    summary = [f"{c['name']:<14} — MAE: {c['mae']:.4f}  |  RMSE: {c['rmse']:.4f}"
+               for c in candidates]
+    return best["model"], best["name"], best["mae"], best["rmse"], summary
+
+
+def _train_fixed_models(X_train, y_train, X_test, y_test):
+    """Fit the default RF and XGBoost configurations and pick the lower MAE."""
+    return select_best([fit_candidate(name, X_train, y_train, X_test, y_test)
+                        for name in CANDIDATES])
+
+
+def _search_models(X_train, y_train, X_test, y_test, n_workers):
+    """Run the parallel successive-halving search and save its leaderboard."""
+    from model_search import LEADERBOARD_PATH, run_search
+
+    print("\nRunning parallel model search (successive halving)...")
+    leaderboard, best = run_search(X_train, y_train, X_test, y_test, n_workers=n_workers)
+    leaderboard.to_csv(LEADERBOARD_PATH, index=False)
+    print(f"Leaderboard saved to {LEADERBOARD_PATH}")
+
+    final = leaderboard[leaderboard["status"] == "final"]
+    summary = [
+        f"{r.model:<14} {r.params} — MAE: {r.mae:.4f}  |  RMSE: {r.rmse:.4f}"
+        for r in final.itertuples()
+    ]
+    print(f"\n{best['model']} {best['params']} selected as final model.")
+    return best["fitted"], best["model"], best["mae"], best["rmse"], summary
+
+
+def load_training_split(input_file) -> dict:
+    """Load and validate the featured data and split it chronologically 80/20.
+
+    Returns the frame, ``split_idx`` and the train/test feature/target sets.
+    """
+    if not isinstance(input_file, pd.DataFrame):
+        print(f"Loading featured data from {input_file}...")
+    with span("train.load"):
+        df = load_frame(input_file, columns=FEATURES + [TARGET, "timestamp"])
 
     # Validate that all required feature columns are present
     missing_features = [f for f in FEATURES if f not in df.columns]
@@ -45,65 +120,121 @@ def train_and_evaluate(input_file: str, model_output_path: str):
 
     # Chronological 80/20 split (no shuffle — preserves time order)
     split_idx = int(len(df) * 0.8)
-    X_train, X_test = X.iloc[:split_idx], X.iloc[split_idx:]
-    y_train, y_test = y.iloc[:split_idx], y.iloc[split_idx:]
-
-    print(f"Training set size : {len(X_train)}")
-    print(f"Test set size     : {len(X_test)}")
-
-    # --- Random Forest ---
-    print("\nTraining Random Forest Regressor...")
-    rf_model = RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=-1)
-    rf_model.fit(X_train, y_train)
-    rf_preds = rf_model.predict(X_test)
-    rf_mae = mean_absolute_error(y_test, rf_preds)
-    rf_rmse = _rmse(y_test, rf_preds)
-    print(f"  MAE : {rf_mae:.4f}")
-    print(f"  RMSE: {rf_rmse:.4f}")
-
-    # --- XGBoost ---
-    print("\nTraining XGBoost Regressor...")
-    xgb_model = xgb.XGBRegressor(
-        n_estimators=100, learning_rate=0.1, max_depth=5,
-        random_state=42, verbosity=0
-    )
-    xgb_model.fit(X_train, y_train)
-    xgb_preds = xgb_model.predict(X_test)
-    xgb_mae = mean_absolute_error(y_test, xgb_preds)
-    xgb_rmse = _rmse(y_test, xgb_preds)
-    print(f"  MAE : {xgb_mae:.4f}")
-    print(f"  RMSE: {xgb_rmse:.4f}")
-
-    # --- Select best model (lower MAE wins) ---
-    if xgb_mae < rf_mae:
-        print("\nXGBoost performed better → selected as final model.")
-        best_model, best_name = xgb_model, "XGBoost"
-        best_mae, best_rmse = xgb_mae, xgb_rmse
-    else:
-        print("\nRandom Forest performed better → selected as final model.")
-        best_model, best_name = rf_model, "Random Forest"
-        best_mae, best_rmse = rf_mae, rf_rmse
-
-    joblib.dump(best_model, model_output_path)
+    split = {
+        "df": df, "split_idx": split_idx,
+        "X_train": X.iloc[:split_idx], "X_test": X.iloc[split_idx:],
+        "y_train": y.iloc[:split_idx], "y_test": y.iloc[split_idx:],
+    }
+    print(f"Training set size : {len(split['X_train'])}")
+    print(f"Test set size     : {len(split['X_test'])}")
+    return split
+
+
+def save_selected_model(split: dict, selection, model_output_path: str):
+    """Store the selected model with its metadata and write the evaluation summary.
+
+    ``selection`` is the ``(model, name, mae, rmse, summary)`` tuple returned
+    by ``select_best`` / the search.
+    """
+    best_model, best_name, best_mae, best_rmse, summary = selection
+    df, split_idx = split["df"], split["split_idx"]
+    metadata = {
+        "model_name": best_name,
+        "features": FEATURES,
+        "target": TARGET,
+        "train_rows": len(split["X_train"]),
+        "test_rows": len(split["X_test"]),
+        "metrics": {"mae": float(best_mae), "rmse": float(best_rmse)},
+    }
+    if "timestamp" in df.columns:
+        train_ts = pd.to_datetime(df["timestamp"].iloc[:split_idx])
+        metadata["training_window"] = {"start": str(train_ts.min()), "end": str(train_ts.max())}
+        # Rows after the watermark are what an incremental update trains on (model_update.py);
+        # the split can fall inside a timestamp, so also record how many rows at the
+        # watermark timestamp were trained on
+        metadata["watermark"] = str(train_ts.max())
+        metadata["watermark_rows"] = int((train_ts == train_ts.max()).sum())
+    metadata["full_train_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    metadata["incremental_updates"] = 0
+    with span("train.save_model"):
+        save_model(best_model, model_output_path, metadata)
     print(f"Best model saved to {model_output_path}")
 
     # Persist evaluation results
     with open("model_evaluation_results.txt", "w", encoding="utf-8") as f:
         f.write("=== Model Evaluation Results ===\n\n")
-        f.write(f"Random Forest  — MAE: {rf_mae:.4f}  |  RMSE: {rf_rmse:.4f}\n")
-        f.write(f"XGBoost        — MAE: {xgb_mae:.4f}  |  RMSE: {xgb_rmse:.4f}\n")
+        for line in summary:
+            f.write(line + "\n")
         f.write(f"\nSelected Model : {best_name}\n")
         f.write(f"Best MAE       : {best_mae:.4f}\n")
         f.write(f"Best RMSE      : {best_rmse:.4f}\n")
+    return best_model
+
 
+def train_quantile_model(split: dict, model_output_path: str, quantiles=QUANTILES,
+                         n_jobs: int = -1):
+    """Fit the multi-quantile model on the split, report its calibration and
+    store it next to the point model (see ``quantile_forecast.py``)."""
+    labels = "/".join(f"P{q * 100:g}" for q in quantiles)
+    print(f"\nTraining {labels} quantile model (single multi-quantile booster)...")
+    with span("train.fit.quantiles", rows=len(split["X_train"])):
+        model = fit_quantile_model(split["X_train"], split["y_train"], quantiles, n_jobs=n_jobs)
+    with span("train.predict_holdout.quantiles", rows=len(split["X_test"])):
+        calibration = evaluate(model.predict(split["X_test"]), split["y_test"], quantiles)
+    for col, stats in calibration.items():
+        print(f"  {col:<14} pinball: {stats['pinball']:.4f}  coverage: {stats['coverage']:.1%}")
+    with span("train.save_model.quantiles"):
+        save_quantile_model(model, model_output_path, {"calibration": calibration})
+    return model
+
+
+def train_and_evaluate(input_file, model_output_path: str,
+                       search: bool = False, n_workers: int = None,
+                       quantiles: bool = True):
+    """Train RF and XGBoost, keep the lower-MAE model.
+
+    ``input_file`` may be an artifact path or the featured DataFrame; from
+    disk only ``FEATURES`` + ``TARGET`` (+ ``timestamp``) are loaded. The
+    model is written with ``model_store.save_model`` together with its
+    training window and holdout metrics. With ``search=True`` a
+    parallel hyperparameter search (see ``model_search.py``) replaces the two
+    fixed configurations; selection is still by holdout MAE. Unless
+    ``quantiles`` is False a P50/P90/P99 model is stored alongside it for
+    service-level capacity planning.
+    """
+    split = load_training_split(input_file)
+    sets = (split["X_train"], split["y_train"], split["X_test"], split["y_test"])
+    if search:
+        with span("train.search"):
+            selection = _search_models(*sets, n_workers)
+    else:
+        selection = _train_fixed_models(*sets)
+    best_model = save_selected_model(split, selection, model_output_path)
+    if quantiles:
+        train_quantile_model(split, model_output_path)
+    else:
+        # Don't leave a quantile model from an earlier run next to the new point model
+        shutil.rmtree(quantile_path(model_output_path), ignore_errors=True)
     return best_model
 
 
 if __name__ == "__main__":
-    input_csv = "milestone_2_featured_data.csv"
-    model_path = "best_demand_forecast_model.pkl"
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Milestone 3: model development")
+    parser.add_argument("--search", action="store_true",
+                        help="parallel hyperparameter search instead of the two fixed models")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes for --search (default: min(cores, 4))")
+    parser.add_argument("--no-quantiles", action="store_true",
+                        help="skip the P50/P90/P99 quantile model")
+    args = parser.parse_args()
+
+    input_csv = artifact_path("milestone_2_featured_data")
+    model_path = MODEL_PATH
 
     if os.path.exists(input_csv):
-        train_and_evaluate(input_csv, model_path)
+        train_and_evaluate(input_csv, model_path, search=args.search, n_workers=args.workers,
+                           quantiles=not args.no_quantiles)
     else:
         print(f"Error: '{input_csv}' not found. Please run Milestone 2 first.")
@@ -1,16 +1,19 @@
 import sys
-import io
 import pandas as pd
 import numpy as np
-import joblib
 import os
-import matplotlib
-matplotlib.use("Agg")  # Headless / non-interactive backend
-import matplotlib.pyplot as plt
+from artifact_io import artifact_path, load_frame
+from instrumentation import span
+from model_store import load_model
+from quantile_forecast import (
+    SERVICE_LEVEL, SERVICE_LEVEL_COL, load_quantile_model, quantile_forecasts,
+)
 
 # Force UTF-8 stdout so any library Unicode output doesn't crash on Windows
-if hasattr(sys.stdout, "buffer"):
-    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", errors="replace")
+# (reconfigure in place: re-wrapping the buffer breaks when several
+# milestones are imported into the same process)
+if hasattr(sys.stdout, "reconfigure"):
+    sys.stdout.reconfigure(encoding="utf-8", errors="replace")
 
 FEATURES = [
     "hour", "day_of_week", "day_of_month", "month", "quarter", "is_weekend",
@@ -24,12 +27,17 @@ REPORT_COLS = [
 ]
 CAPACITY_COL = "provisioned_capacity_allocated"
 UNIT_COST = 1_000        # $ per unit of over-provisioned capacity
-BUFFER_PCT = 0.15        # 15% headroom above forecast
+BUFFER_PCT = 0.15        # 15% headroom above forecast when no quantile model is available
 ACTION_MARGIN = 0.10     # 10% band around recommended capacity
+ACTIONS = ["UPSCALE", "DOWNSCALE", "MAINTAIN"]   # category codes 0, 1, 2
+THRESHOLD_KEYS = ["region", "service_type"]
+SUMMARY_PATH = "milestone_4_summary_report.txt"
+DRIFT_STATE = "drift_state.pkl"
 
 
 def _get_action(row: pd.Series) -> str:
-    """Determine infrastructure action for a given row."""
+    """Determine infrastructure action for a given row (row-wise reference
+    for ``compute_capacity_actions``)."""
     if row["recommended_capacity"] > row[CAPACITY_COL] * (1 + ACTION_MARGIN):
         return "UPSCALE"
     elif row["recommended_capacity"] < row[CAPACITY_COL] * (1 - ACTION_MARGIN):
@@ -37,15 +45,101 @@ def _get_action(row: pd.Series) -> str:
     return "MAINTAIN"
 
 
-def run_integration(
-    featured_data_path: str,
-    model_path: str,
-    output_report: str,
-) -> pd.DataFrame:
+def _threshold_arrays(frame: pd.DataFrame, thresholds, buffer_pct: float = BUFFER_PCT) -> tuple:
+    """Per-row ``(buffer_pct, action_margin)`` arrays.
+
+    ``thresholds`` is a DataFrame (or CSV path) keyed by ``THRESHOLD_KEYS``
+    with optional ``buffer_pct`` / ``action_margin`` columns; series missing
+    from it, or left blank, use ``buffer_pct`` and ``ACTION_MARGIN``.
+    """
+    n = len(frame)
+    if thresholds is None:
+        return np.full(n, buffer_pct), np.full(n, ACTION_MARGIN)
+    if not isinstance(thresholds, pd.DataFrame):
+        thresholds = pd.read_csv(thresholds)
+    keys = pd.MultiIndex.from_frame(thresholds[THRESHOLD_KEYS].astype(str))
+    pos = keys.get_indexer(pd.MultiIndex.from_frame(frame[THRESHOLD_KEYS].astype(str)))
+    found = pos >= 0
+    out = []
+    for col, default in (("buffer_pct", buffer_pct), ("action_margin", ACTION_MARGIN)):
+        values = np.full(n, default)
+        if col in thresholds.columns:
+            table = thresholds[col].to_numpy(dtype="float64")
+            picked = table[pos[found]]
+            values[found] = np.where(np.isnan(picked), default, picked)
+        out.append(values)
+    return tuple(out)
+
+
+def compute_capacity_actions(frame: pd.DataFrame, forecast_col: str = "forecasted_usage",
+                             thresholds=None, buffer_pct: float = BUFFER_PCT) -> pd.DataFrame:
+    """Vectorised capacity planning for every row of ``frame``.
+
+    Returns ``recommended_capacity``, ``potential_savings`` and a categorical
+    ``infrastructure_action`` (categories ``ACTIONS``) aligned to ``frame``;
+    with default thresholds the results equal the row-wise ``_get_action``.
+    ``thresholds`` optionally overrides ``buffer_pct`` / ``ACTION_MARGIN``
+    per (region, service_type), see ``_threshold_arrays``.
+    """
+    forecast = frame[forecast_col].to_numpy()
+    if forecast.dtype.kind != "f":
+        forecast = forecast.astype("float64")
+    capacity = frame[CAPACITY_COL].to_numpy(dtype="float64")
+    buffer_pct, margin = _threshold_arrays(frame, thresholds, buffer_pct)
+
+    # Stay in the forecast's precision (float32 for XGBoost), like the scalar path
+    recommended = forecast * (1 + buffer_pct).astype(forecast.dtype)
+    savings = np.clip(capacity - recommended, 0, None) * UNIT_COST
+    codes = np.where(
+        recommended > capacity * (1 + margin), 0,
+        np.where(recommended < capacity * (1 - margin), 1, 2),
+    ).astype("int8")
+    return pd.DataFrame({
+        "recommended_capacity": recommended,
+        "potential_savings": savings,
+        "infrastructure_action": pd.Categorical.from_codes(codes, categories=ACTIONS),
+    }, index=frame.index)
 
-    print("Loading data and model...")
-    df = pd.read_csv(featured_data_path)
-    model = joblib.load(model_path)
+
+def plan_capacity(frame: pd.DataFrame, quantile_model=None, thresholds=None,
+                  service_level: float = SERVICE_LEVEL) -> pd.DataFrame:
+    """``frame`` joined with its capacity actions.
+
+    With a quantile model, capacity is the forecast at ``service_level``
+    (quantile columns from one batched predict are added to the frame) and
+    no flat buffer applies; per-series ``buffer_pct`` thresholds still add
+    headroom on top. Without one, the point forecast plus ``BUFFER_PCT``.
+    """
+    if quantile_model is None:
+        return frame.join(compute_capacity_actions(frame, thresholds=thresholds))
+    frame = frame.join(quantile_forecasts(quantile_model, frame, service_level))
+    return frame.join(compute_capacity_actions(frame, forecast_col=SERVICE_LEVEL_COL,
+                                               thresholds=thresholds, buffer_pct=0.0))
+
+
+def _load_model(model_path):
+    """Load a stored model, legacy pickle or sharded model directory.
+
+    Already-fitted models are passed through unchanged.
+    """
+    if not isinstance(model_path, (str, os.PathLike)):
+        return model_path
+    if os.path.isfile(os.path.join(model_path, "manifest.json")):
+        from sharded_model import ShardedModel
+        return ShardedModel(model_path)
+    return load_model(model_path)
+
+
+def score_snapshot(df: pd.DataFrame, model, thresholds=None, quantile_model=None,
+                   service_level: float = SERVICE_LEVEL):
+    """Forecast the latest 500 rows and derive their capacity actions.
+
+    Capacity comes from ``quantile_model`` at ``service_level`` when given
+    (see ``plan_capacity``). Returns the scored snapshot and a dict of
+    accuracy / savings metrics.
+    """
+    # Sharded models route rows by their group columns as well as features
+    model_cols = FEATURES + list(getattr(model, "group_cols", []))
 
     # --- Validate required columns ---
     required = FEATURES + ["usage_units", CAPACITY_COL]
@@ -55,7 +149,8 @@ def run_integration(
 
     # --- 1. Real-time Forecasting Simulation (latest 500 rows) ---
     latest = df.tail(500).copy().reset_index(drop=True)
-    latest["forecasted_usage"] = model.predict(latest[FEATURES])
+    with span("score.predict", rows=len(latest)):
+        latest["forecasted_usage"] = model.predict(latest[model_cols])
     latest["timestamp"] = pd.to_datetime(latest["timestamp"])
 
     model_mae = np.mean(np.abs(latest["usage_units"] - latest["forecasted_usage"]))
@@ -70,85 +165,167 @@ def run_integration(
     print(f"Accuracy Gain vs Naive: {max(accuracy_gain_pct, 0):.2f}%")
     print(f"Estimated Annual Savings Impact: ${estimated_savings:,.2f}")
 
-    # --- 2. Capacity Planning ---
-    latest["recommended_capacity"] = latest["forecasted_usage"] * (1 + BUFFER_PCT)
-    latest["potential_savings"] = (
-        latest[CAPACITY_COL] - latest["recommended_capacity"]
-    ).clip(lower=0) * UNIT_COST
+    # --- 2./3. Capacity Planning & Infrastructure Actions ---
+    with span("score.capacity_actions", rows=len(latest)):
+        latest = plan_capacity(latest, quantile_model, thresholds, service_level)
+    metrics = {
+        "model_mae": model_mae, "naive_mae": naive_mae,
+        "accuracy_gain_pct": accuracy_gain_pct, "estimated_savings": estimated_savings,
+        "total_sim_savings": latest["potential_savings"].sum(),
+        "service_level": service_level if quantile_model is not None else None,
+    }
+    if quantile_model is not None:
+        # Share of actual demand the service-level forecast would have covered
+        metrics["service_level_coverage"] = float(
+            np.mean(latest["usage_units"] <= latest[SERVICE_LEVEL_COL]))
+        print(f"Capacity at P{service_level * 100:g}: covers "
+              f"{metrics['service_level_coverage']:.1%} of actual demand")
+    return latest, metrics
 
-    # --- 3. Infrastructure Actions ---
-    latest["infrastructure_action"] = latest.apply(_get_action, axis=1)
-    total_sim_savings = latest["potential_savings"].sum()
 
-    # --- 4. Report ---
+def write_actions_report(latest: pd.DataFrame, output_report: str) -> None:
+    """Write the 100 most recent capacity actions."""
     report = (
-        latest[REPORT_COLS]
+        latest[REPORT_COLS + [c for c in latest.columns if c.startswith("forecast_p")]]
         .sort_values("timestamp")
         .tail(100)
     )
     report.to_csv(output_report, index=False)
     print(f"Provisioning actions report saved to {output_report}")
 
-    # --- 5. Visualization ---
-    fig, ax = plt.subplots(figsize=(15, 8))
-    plot_df = latest.tail(200)
-    count = 0
-    for (region, s_type), grp in plot_df.groupby(["region", "service_type"]):
-        if count >= 3:
-            break
-        ax.plot(
-            grp["timestamp"], grp["usage_units"],
-            label=f"Actual ({region}-{s_type})", marker="o", alpha=0.6,
-        )
-        ax.plot(
-            grp["timestamp"], grp["forecasted_usage"],
-            label=f"Forecast ({region}-{s_type})", linestyle="--", alpha=0.8,
-        )
-        count += 1
-
-    ax.set_title("Azure Demand Forecast: Actual vs Predicted (Strategic Sample)")
-    ax.set_xlabel("Time")
-    ax.set_ylabel("Usage Units")
-    ax.tick_params(axis="x", rotation=45)
-    ax.legend(bbox_to_anchor=(1.05, 1), loc="upper left")
-    ax.grid(True, linestyle="--", alpha=0.4)
-    fig.tight_layout()
-    plot_path = "forecast_vs_actual.png"
-    fig.savefig(plot_path)
-    plt.close(fig)   # Prevent memory leak
-    print(f"Visualization saved to {plot_path}")
-
-    # --- 6. Summary Report ---
-    with open("milestone_4_summary_report.txt", "w", encoding="utf-8") as f:
+
+def write_summary_report(latest: pd.DataFrame, metrics: dict, output_report: str,
+                         summary_path: str = SUMMARY_PATH) -> None:
+    """Write the KPI summary read by ``generate_dashboard.py``."""
+    accuracy_gain_pct = metrics["accuracy_gain_pct"]
+    with open(summary_path, "w", encoding="utf-8") as f:
         f.write("Azure Capacity Optimization — Summary Report\n")
         f.write("=" * 46 + "\n\n")
         f.write(f"Snapshots analyzed             : {len(latest)}\n")
-        f.write(f"Model MAE                      : {model_mae:.4f}\n")
-        f.write(f"Naive Baseline MAE             : {naive_mae:.4f}\n")
+        f.write(f"Model MAE                      : {metrics['model_mae']:.4f}\n")
+        f.write(f"Naive Baseline MAE             : {metrics['naive_mae']:.4f}\n")
         f.write(
             f"Accuracy Gain (vs Naive)       : "
             f"{max(accuracy_gain_pct, 0):.2f}%"
             + (" [!] Model underperforms naive baseline" if accuracy_gain_pct < 0 else "") + "\n"
         )
-        f.write(f"Proj. Annual Savings (Accuracy): ${estimated_savings:,.2f}\n")
-        f.write(f"Simulation Savings (Waste Red.): ${total_sim_savings:,.2f}\n")
+        f.write(f"Proj. Annual Savings (Accuracy): ${metrics['estimated_savings']:,.2f}\n")
+        f.write(f"Simulation Savings (Waste Red.): ${metrics['total_sim_savings']:,.2f}\n")
+        if metrics.get("service_level") is not None:
+            f.write(f"Capacity Basis                 : P{metrics['service_level'] * 100:g} forecast "
+                    f"(covers {metrics['service_level_coverage']:.1%} of actual demand)\n")
+        else:
+            f.write(f"Capacity Basis                 : forecast + {BUFFER_PCT:.0%} buffer\n")
         f.write("\nAction Summary:\n")
-        f.write(latest["infrastructure_action"].value_counts().to_string() + "\n")
+        action_counts = latest["infrastructure_action"].value_counts()
+        f.write(action_counts[action_counts > 0].to_string() + "\n")
         f.write(f"\nDetailed actions: see '{output_report}'\n")
-        f.write(
-            "\nRetraining trigger: bias drift > 10% OR latency metric anomaly detected.\n"
-        )
+        drift = metrics.get("drift")
+        if drift is None:
+            f.write(
+                "\nRetraining trigger: bias drift > 10% OR latency metric anomaly detected.\n"
+            )
+        else:
+            flagged = drift["flagged"]
+            f.write(
+                f"\nRetraining trigger: bias drift > 10%, MAE or feature drift — "
+                f"{len(flagged)} of {drift['series']} series flagged "
+                f"({drift['new_events']} new): {', '.join(flagged) or 'none'}\n"
+            )
+
+
+def monitor_drift(latest: pd.DataFrame, metrics: dict, drift_state: str = DRIFT_STATE) -> list:
+    """Feed the scored snapshot to the persisted drift monitor (see
+    ``drift_monitor.py``); its status goes into ``metrics["drift"]`` for the
+    summary report. Events are logged next to the state file. Returns the
+    new retrain events."""
+    from drift_monitor import EVENTS_PATH, monitor_scored
+
+    events_path = os.path.join(os.path.dirname(drift_state), EVENTS_PATH)
+    with span("score.drift", rows=len(latest)):
+        monitor, events = monitor_scored(latest, drift_state, events_path)
+    metrics["drift"] = {"series": len(monitor.keys), "flagged": monitor.flagged(),
+                        "new_events": len(events)}
+    for event in events:
+        print(f"Drift: retrain {event['series']} ({', '.join(event['reasons'])})")
+    return events
+
+
+def run_integration(
+    featured_data_path,
+    model_path,
+    output_report: str,
+    thresholds=None,
+    service_level: float = SERVICE_LEVEL,
+    quantile_model=None,
+    drift_state: str = DRIFT_STATE,
+) -> pd.DataFrame:
+    """Score the latest snapshot and derive capacity actions.
+
+    ``featured_data_path`` may be an artifact path or the featured DataFrame,
+    and ``model_path`` a model store directory (see ``model_store.py``), a
+    legacy pickle, a sharded model directory (see ``sharded_model.py``) or
+    an already-fitted model. ``thresholds`` sets per-series capacity
+    thresholds (see ``compute_capacity_actions``). Capacity is planned at
+    ``service_level`` from ``quantile_model`` or, by default, the quantile
+    model stored with ``model_path``; without one the flat ``BUFFER_PCT``
+    applies. The scored rows are fed to the drift monitor persisted at
+    ``drift_state`` (pass None to skip) and its retrain events are
+    summarised in the report.
+    """
+    print("Loading data and model...")
+    with span("score.load_data"):
+        df = load_frame(featured_data_path)
+    with span("score.load_model"):
+        model = _load_model(model_path)
+        if quantile_model is None:
+            quantile_model = load_quantile_model(model_path)
+    latest, metrics = score_snapshot(df, model, thresholds=thresholds,
+                                     quantile_model=quantile_model, service_level=service_level)
+    if drift_state:
+        monitor_drift(latest, metrics, drift_state)
+
+    # --- 4. Report / 5. Summary Report ---
+    # Charts are rendered from the report by render_charts.py, off the scoring path
+    with span("score.write_report"):
+        write_actions_report(latest, output_report)
+    with span("score.write_summary"):
+        write_summary_report(latest, metrics, output_report)
 
     print("\nIntegration & Optimization complete.")
     return latest
 
 
 if __name__ == "__main__":
-    featured_csv = "milestone_2_featured_data.csv"
-    model_pkl = "best_demand_forecast_model.pkl"
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Milestone 4: forecast integration")
+    parser.add_argument("--model", default="best_demand_forecast_model",
+                        help="stored model, legacy .pkl or sharded model directory")
+    parser.add_argument("--thresholds", default=None,
+                        help="CSV of per region/service_type buffer_pct and action_margin")
+    parser.add_argument("--batch", action="store_true",
+                        help="score every row into a partitioned report (see batch_scoring.py)")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes for --batch")
+    parser.add_argument("--service-level", type=float, default=SERVICE_LEVEL,
+                        help="forecast quantile capacity is planned at (default: 0.9 → P90)")
+    parser.add_argument("--drift-state", default=DRIFT_STATE,
+                        help="drift monitor state fed with the scored snapshot")
+    parser.add_argument("--no-drift", action="store_true", help="skip the drift monitor")
+    args = parser.parse_args()
+
+    featured_csv = artifact_path("milestone_2_featured_data")
+    model_pkl = args.model
     report_csv = "optimization_actions_report.csv"
 
-    if os.path.exists(featured_csv) and os.path.exists(model_pkl):
-        run_integration(featured_csv, model_pkl, report_csv)
+    if os.path.exists(featured_csv) and os.path.exists(model_pkl) and args.batch:
+        from batch_scoring import score_fleet
+        score_fleet(featured_csv, model_pkl, n_workers=args.workers,
+                    thresholds=args.thresholds, service_level=args.service_level,
+                    overwrite=True)
+    elif os.path.exists(featured_csv) and os.path.exists(model_pkl):
+        run_integration(featured_csv, model_pkl, report_csv, thresholds=args.thresholds,
+                        service_level=args.service_level,
+                        drift_state=None if args.no_drift else args.drift_state)
     else:
         print("Required files missing. Please run Milestones 1–3 first.")
@@ -0,0 +1,128 @@
+"""
+model_search.py — Parallel RF / XGBoost hyperparameter search.
+
+Candidate configurations are trained concurrently in a process pool and
+pruned with successive halving: every configuration starts with a small
+number of trees, and only the best 1/ETA (by holdout MAE) move on to the
+next rung with ETA times more trees. Each worker gets an equal share of the
+machine's cores, passed to RF ``n_jobs`` and XGBoost ``n_jobs`` (nthread),
+so concurrent fits never oversubscribe the CPU.
+"""
+
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_absolute_error, mean_squared_error
+import xgboost as xgb
+
+LEADERBOARD_PATH = "model_leaderboard.csv"
+MIN_TREES = 25           # trees per candidate on the first rung
+MAX_TREES = 225          # trees on the final rung
+ETA = 3                  # keep the best 1/ETA of candidates per rung
+
+SEARCH_SPACE = {
+    "Random Forest": [
+        {"max_depth": d, "min_samples_leaf": leaf, "max_features": mf}
+        for d in (None, 12)
+        for leaf in (1, 5)
+        for mf in (1.0, 0.5)
+    ],
+    "XGBoost": [
+        {"max_depth": d, "learning_rate": lr, "subsample": ss}
+        for d in (3, 5, 7)
+        for lr in (0.05, 0.1)
+        for ss in (0.8, 1.0)
+    ],
+}
+
+# Per-worker copy of the train/test arrays, set once by _init_worker
+_DATA = {}
+
+
+def thread_budget(n_workers: int) -> int:
+    """Threads each worker may use so that workers × threads ≤ cores."""
+    return max(1, (os.cpu_count() or 1) // max(1, n_workers))
+
+
+def build_model(name: str, params: dict, n_estimators: int, n_threads: int):
+    if name == "Random Forest":
+        return RandomForestRegressor(
+            n_estimators=n_estimators, random_state=42, n_jobs=n_threads, **params
+        )
+    if name == "XGBoost":
+        return xgb.XGBRegressor(
+            n_estimators=n_estimators, random_state=42, verbosity=0,
+            n_jobs=n_threads, **params
+        )
+    raise ValueError(f"Unknown model family '{name}'")
+
+
+def _init_worker(X_train, y_train, X_test, y_test, n_threads):
+    _DATA.update(X_train=X_train, y_train=y_train, X_test=X_test,
+                 y_test=y_test, n_threads=n_threads)
+
+
+def _fit_candidate(name: str, params: dict, n_estimators: int, keep_model: bool) -> dict:
+    start = time.time()
+    model = build_model(name, params, n_estimators, _DATA["n_threads"])
+    model.fit(_DATA["X_train"], _DATA["y_train"])
+    preds = model.predict(_DATA["X_test"])
+    return {
+        "model": name,
+        "params": params,
+        "n_estimators": n_estimators,
+        "mae": float(mean_absolute_error(_DATA["y_test"], preds)),
+        "rmse": float(np.sqrt(mean_squared_error(_DATA["y_test"], preds))),
+        "fit_seconds": time.time() - start,
+        "fitted": model if keep_model else None,
+    }
+
+
+def run_search(X_train, y_train, X_test, y_test, n_workers: int = None,
+               search_space: dict = None, min_trees: int = MIN_TREES,
+               max_trees: int = MAX_TREES, eta: int = ETA):
+    """Successive-halving search over ``search_space``.
+
+    Returns ``(leaderboard, best)`` where ``leaderboard`` has one row per
+    (candidate, rung) and ``best`` is the final-rung result dict with the
+    lowest MAE, including its fitted estimator under ``"fitted"``.
+    """
+    search_space = search_space or SEARCH_SPACE
+    n_workers = n_workers or min(os.cpu_count() or 1, 4)
+    n_threads = thread_budget(n_workers)
+    # DataFrames are passed as-is so fitted models keep their feature names
+    arrays = (X_train, y_train, X_test, y_test)
+
+    candidates = [(name, p) for name, grid in search_space.items() for p in grid]
+    n_rungs = max(1, int(math.floor(math.log(max_trees / min_trees, eta))) + 1)
+    print(f"Search: {len(candidates)} candidates, {n_rungs} rungs, "
+          f"{n_workers} workers × {n_threads} threads")
+
+    rows, results = [], []
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker,
+                             initargs=(*arrays, n_threads)) as pool:
+        for rung in range(n_rungs):
+            final = rung == n_rungs - 1
+            n_estimators = max_trees if final else min_trees * eta ** rung
+            futures = [pool.submit(_fit_candidate, name, p, n_estimators, final)
+                       for name, p in candidates]
+            results = sorted((f.result() for f in futures), key=lambda r: r["mae"])
+            n_keep = len(results) if final else max(1, math.ceil(len(results) / eta))
+            for i, r in enumerate(results):
+                rows.append({
+                    "rung": rung, "model": r["model"], "params": json.dumps(r["params"]),
+                    "n_estimators": r["n_estimators"], "mae": r["mae"], "rmse": r["rmse"],
+                    "fit_seconds": round(r["fit_seconds"], 3),
+                    "status": "final" if final else ("promoted" if i < n_keep else "stopped"),
+                })
+            print(f"  rung {rung}: {len(results)} fits @ {n_estimators} trees, "
+                  f"best MAE {results[0]['mae']:.4f} ({results[0]['model']})")
+            candidates = [(r["model"], r["params"]) for r in results[:n_keep]]
+
+    leaderboard = pd.DataFrame(rows).sort_values(["rung", "mae"], ascending=[False, True])
+    return leaderboard.reset_index(drop=True), results[0]
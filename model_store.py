@@ -0,0 +1,152 @@
+"""
+model_store.py — Fast model artifacts with a metadata sidecar.
+
+A stored model is a directory:
+
+    <path>/metadata.json      feature list, training window, metrics, format
+    <path>/model.ubj          XGBoost native UBJSON                 (xgboost)
+    <path>/forest/*.npy       flattened RandomForest node arrays    (forest)
+    <path>/model.joblib       uncompressed joblib pickle            (joblib)
+
+XGBoost models load through XGBoost's own (fast) parser. RandomForests are
+flattened into one set of node arrays for all trees; they are opened with
+``np.load(mmap_mode="r")`` so loading is near-instant and every scoring
+process on the machine shares the same page-cached copy instead of each
+unpickling its own. ForestArrays predicts with a vectorised traversal that
+matches ``RandomForestRegressor.predict`` up to float summation order.
+
+Paths ending in ``.pkl`` are read/written with plain joblib for
+compatibility with older artifacts.
+"""
+
+import json
+import os
+import time
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+import xgboost as xgb
+
+METADATA_FILE = "metadata.json"
+FOREST_ARRAYS = ("children_left", "children_right", "feature", "threshold", "value", "roots")
+PREDICT_BLOCK_ROWS = 16_384
+
+
+class ForestArrays:
+    """Read-only RandomForest regressor over flattened (optionally mmapped) node arrays."""
+
+    def __init__(self, arrays: dict, features: list = None):
+        self.children_left = arrays["children_left"]
+        self.children_right = arrays["children_right"]
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.value = arrays["value"]
+        self.roots = arrays["roots"]
+        self.features = features
+
+    @classmethod
+    def from_sklearn(cls, model: RandomForestRegressor, features: list = None) -> "ForestArrays":
+        parts = {name: [] for name in FOREST_ARRAYS}
+        offset = 0
+        for est in model.estimators_:
+            tree = est.tree_
+            left, right = tree.children_left.astype("int64"), tree.children_right.astype("int64")
+            # Re-base child indices onto the concatenated node arrays (-1 stays a leaf)
+            parts["children_left"].append(np.where(left >= 0, left + offset, -1))
+            parts["children_right"].append(np.where(right >= 0, right + offset, -1))
+            parts["feature"].append(tree.feature.astype("int64"))
+            parts["threshold"].append(tree.threshold.astype("float64"))
+            parts["value"].append(tree.value[:, 0, 0].astype("float64"))
+            parts["roots"].append(np.array([offset], dtype="int64"))
+            offset += tree.node_count
+        arrays = {name: np.concatenate(chunks) for name, chunks in parts.items()}
+        if features is None and hasattr(model, "feature_names_in_"):
+            features = list(model.feature_names_in_)
+        return cls(arrays, features)
+
+    def predict(self, X) -> np.ndarray:
+        if isinstance(X, pd.DataFrame):
+            X = X[self.features] if self.features else X
+        # sklearn evaluates splits on float32 inputs against float64 thresholds
+        X = np.asarray(X, dtype="float32")
+        out = np.empty(len(X), dtype="float64")
+        n_trees = len(self.roots)
+        roots = np.asarray(self.roots)
+        for start in range(0, len(X), PREDICT_BLOCK_ROWS):
+            block = X[start:start + PREDICT_BLOCK_ROWS]
+            n_rows = len(block)
+            # One entry per (row, tree) pair; only pairs not yet at a leaf are
+            # gathered and advanced on each level
+            node = np.tile(roots, n_rows)
+            row = np.repeat(np.arange(n_rows), n_trees)
+            active = np.arange(node.size)
+            while active.size:
+                nd = node[active]
+                left = self.children_left[nd]
+                inner = left >= 0
+                active, nd, left = active[inner], nd[inner], left[inner]
+                go_left = block[row[active], self.feature[nd]] <= self.threshold[nd]
+                node[active] = np.where(go_left, left, self.children_right[nd])
+            out[start:start + n_rows] = self.value[node].reshape(n_rows, n_trees).sum(axis=1) / n_trees
+        return out
+
+
+def save_model(model, path: str, metadata: dict = None) -> str:
+    """Write ``model`` to ``path`` (store directory, or legacy ``.pkl``)."""
+    if str(path).endswith(".pkl"):
+        joblib.dump(model, path)
+        return path
+
+    os.makedirs(path, exist_ok=True)
+    meta = dict(metadata or {})
+    meta.setdefault("features", list(getattr(model, "feature_names_in_", [])) or None)
+    meta["model_class"] = type(model).__name__
+    meta["saved_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+
+    if isinstance(model, xgb.XGBModel):
+        meta["format"] = "xgboost"
+        model.save_model(os.path.join(path, "model.ubj"))
+    elif isinstance(model, (RandomForestRegressor, ForestArrays)):
+        meta["format"] = "forest"
+        forest = model if isinstance(model, ForestArrays) else ForestArrays.from_sklearn(model)
+        os.makedirs(os.path.join(path, "forest"), exist_ok=True)
+        for name in FOREST_ARRAYS:
+            np.save(os.path.join(path, "forest", f"{name}.npy"), np.asarray(getattr(forest, name)))
+        meta["n_trees"] = int(len(forest.roots))
+    else:
+        meta["format"] = "joblib"
+        joblib.dump(model, os.path.join(path, "model.joblib"))
+
+    with open(os.path.join(path, METADATA_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2, default=str)
+    return path
+
+
+def read_metadata(path: str) -> dict:
+    """Sidecar metadata of a stored model ({} for legacy pickles)."""
+    meta_path = os.path.join(path, METADATA_FILE)
+    if not os.path.isfile(meta_path):
+        return {}
+    with open(meta_path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_model(path: str, mmap: bool = True):
+    """Load a model written by ``save_model`` (or a legacy joblib pickle)."""
+    if not os.path.isdir(path):
+        return joblib.load(path)
+    meta = read_metadata(path)
+    fmt = meta.get("format")
+    if fmt == "xgboost":
+        model = xgb.XGBRegressor()
+        model.load_model(os.path.join(path, "model.ubj"))
+        return model
+    if fmt == "forest":
+        mode = "r" if mmap else None
+        arrays = {name: np.load(os.path.join(path, "forest", f"{name}.npy"), mmap_mode=mode)
+                  for name in FOREST_ARRAYS}
+        return ForestArrays(arrays, meta.get("features"))
+    if fmt == "joblib":
+        return joblib.load(os.path.join(path, "model.joblib"), mmap_mode="r" if mmap else None)
+    raise ValueError(f"{path} is not a model store directory (format={fmt!r})")
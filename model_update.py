@@ -0,0 +1,248 @@
+"""
+model_update.py — Incremental model refresh via XGBoost continued training.
+
+A full ``train_and_evaluate`` refits RF and XGBoost on the whole history.
+An update here loads the stored XGBoost model and adds ``--trees`` boosting
+rounds fitted only on rows newer than the model's training watermark
+(``metadata["watermark"]``, written by Milestone 3). When the training split
+fell inside a timestamp, ``metadata["watermark_rows"]`` says how many rows at
+the watermark timestamp were trained on; the rest of them count as new:
+
+    new rows (after watermark) ─┬─ earlier (1 − holdout_frac) → continue boosting
+                                └─ latest holdout_frac         → validate
+
+The candidate is promoted, and the watermark advanced, only if its holdout
+MAE does not exceed the current model's on the same rows. The quantile model
+(see ``quantile_forecast.py``) is continued the same way and gated on
+pinball loss.
+
+A full rebuild runs instead when the stored model is not XGBoost, the last
+full training is older than ``rebuild_days``, ``max_updates`` updates have
+been stacked since then, or the drift monitor (``drift_monitor.py``) has
+flagged at least ``drift_rebuild_frac`` of the series. Drift flags are
+acknowledged after a promotion or rebuild.
+
+Usage:
+    python model_update.py [--trees 20] [--holdout-frac 0.2] [--full]
+"""
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.metrics import mean_absolute_error
+from artifact_io import artifact_path, load_frame
+from instrumentation import span
+from milestone_3_model_development import (
+    FEATURES, MODEL_PATH, TARGET, XGB_PARAMS, train_and_evaluate,
+)
+from model_store import load_model, read_metadata, save_model
+from quantile_forecast import (
+    QUANTILE_PARAMS, QuantileModel, evaluate, load_quantile_model, save_quantile_model,
+)
+
+UPDATE_TREES = 20
+HOLDOUT_FRAC = 0.2
+MIN_NEW_ROWS = 50
+REBUILD_DAYS = 30
+MAX_UPDATES = 30
+DRIFT_REBUILD_FRAC = 0.25
+HISTORY_LEN = 20
+
+
+def plan_refresh(meta: dict, drift_fraction: float = 0.0, now: float = None,
+                 rebuild_days: int = REBUILD_DAYS, max_updates: int = MAX_UPDATES,
+                 drift_rebuild_frac: float = DRIFT_REBUILD_FRAC) -> tuple:
+    """``("update" | "rebuild", reason)`` for a stored model's metadata."""
+    if meta.get("format") != "xgboost":
+        return "rebuild", f"stored model is {meta.get('model_class') or 'unknown'}, not XGBoost"
+    if not meta.get("watermark"):
+        return "rebuild", "no training watermark recorded"
+    if drift_fraction >= drift_rebuild_frac:
+        return "rebuild", f"drift flagged on {drift_fraction:.0%} of series"
+    if meta.get("incremental_updates", 0) >= max_updates:
+        return "rebuild", f"{meta['incremental_updates']} updates since the last full training"
+    full_at = meta.get("full_train_at")
+    now = time.time() if now is None else now
+    age = now - time.mktime(time.strptime(full_at, "%Y-%m-%dT%H:%M:%S")) if full_at else 0.0
+    if age > rebuild_days * 86400:
+        return "rebuild", f"last full training {full_at} is older than {rebuild_days} days"
+    return "update", "incremental"
+
+
+def _timestamp_boundary(timestamps, idx: int) -> int:
+    """First position at or after ``idx`` where a new timestamp starts.
+
+    Falls back to the boundary before ``idx`` when the rows from ``idx`` on
+    all share one timestamp.
+    """
+    ts = np.asarray(timestamps)
+    if idx <= 0 or idx >= len(ts):
+        return idx
+    later = np.flatnonzero(ts[idx:] != ts[idx - 1])
+    if len(later):
+        return idx + int(later[0])
+    earlier = np.flatnonzero(ts[:idx] != ts[idx - 1])
+    return int(earlier[-1]) + 1 if len(earlier) else idx
+
+
+def _after_watermark(ts: pd.Series, meta: dict) -> np.ndarray:
+    """Mask of rows the stored model has not been trained on."""
+    watermark = pd.Timestamp(meta["watermark"])
+    new = (ts > watermark).to_numpy()
+    trained_at_watermark = meta.get("watermark_rows")
+    if trained_at_watermark is not None:
+        # Rows at the watermark timestamp past those trained on, in file order
+        at = (ts == watermark).to_numpy()
+        new |= at & (np.cumsum(at) > trained_at_watermark)
+    return new
+
+
+def _drift_monitor(drift_state: str):
+    if not drift_state or not os.path.exists(drift_state):
+        return None
+    from drift_monitor import DriftMonitor
+    return DriftMonitor.load(drift_state)
+
+
+def _continue(model, X, y, trees: int, params: dict, **extra):
+    """A copy of ``model`` with ``trees`` more boosting rounds fitted on ``X``/``y``."""
+    candidate = xgb.XGBRegressor(**{**params, "n_estimators": trees}, **extra)
+    candidate.fit(X, y, xgb_model=model.get_booster())
+    return candidate
+
+
+def _update_quantiles(model_path: str, X_fit, y_fit, X_hold, y_hold, trees: int) -> bool:
+    """Continue the stored quantile model; saved only if mean pinball loss does not regress."""
+    current = load_quantile_model(model_path)
+    if current is None:
+        return False
+    with span("update.fit.quantiles", rows=len(X_fit)):
+        booster = _continue(current.model, X_fit, y_fit, trees, QUANTILE_PARAMS,
+                            objective="reg:quantileerror",
+                            quantile_alpha=np.asarray(current.quantiles))
+    candidate = QuantileModel(booster, current.quantiles, current.features)
+
+    def loss(m):
+        stats = evaluate(m.predict(X_hold), y_hold, m.quantiles)
+        return np.mean([s["pinball"] for s in stats.values()]), stats
+
+    (cur_loss, _), (new_loss, calibration) = loss(current), loss(candidate)
+    print(f"  Quantile model pinball: {cur_loss:.4f} → {new_loss:.4f}")
+    if new_loss > cur_loss:
+        return False
+    save_quantile_model(candidate, model_path, {"calibration": calibration})
+    return True
+
+
+def update_model(featured, model_path: str = MODEL_PATH, trees: int = UPDATE_TREES,
+                 holdout_frac: float = HOLDOUT_FRAC, full: bool = False,
+                 drift_state: str = "drift_state.pkl", **plan_kwargs) -> dict:
+    """Refresh the model at ``model_path``, incrementally when possible.
+
+    Returns a dict with ``action`` ("updated", "rejected", "rebuilt" or
+    "skipped"), the reason and, for updates, current and candidate MAE.
+    """
+    start = time.time()
+    meta = read_metadata(model_path) if os.path.isdir(model_path) else {}
+    monitor = _drift_monitor(drift_state)
+    drift_fraction = len(monitor.flagged()) / len(monitor.keys) if monitor and monitor.keys else 0.0
+    mode, reason = ("rebuild", "--full requested") if full else plan_refresh(
+        meta, drift_fraction, **plan_kwargs)
+
+    if mode == "rebuild":
+        print(f"Full rebuild: {reason}")
+        with span("update.full_rebuild"):
+            train_and_evaluate(featured, model_path)
+        if monitor is not None:
+            monitor.acknowledge()
+            monitor.save(drift_state)
+        return {"action": "rebuilt", "reason": reason, "seconds": round(time.time() - start, 3)}
+
+    with span("update.load"):
+        df = load_frame(featured, columns=FEATURES + [TARGET, "timestamp"])
+        ts = pd.to_datetime(df["timestamp"])
+        new = df[_after_watermark(ts, meta)].assign(timestamp=ts)
+        new = new.sort_values("timestamp", kind="stable").reset_index(drop=True)
+    if len(new) < MIN_NEW_ROWS:
+        print(f"Only {len(new)} rows after watermark {meta['watermark']}; nothing to update.")
+        return {"action": "skipped", "reason": f"{len(new)} new rows",
+                "seconds": round(time.time() - start, 3)}
+
+    # Holdout starts on a timestamp boundary, so every row at the advanced
+    # watermark timestamp has been trained on
+    split_idx = _timestamp_boundary(new["timestamp"], int(len(new) * (1 - holdout_frac)))
+    fit, hold = new.iloc[:split_idx], new.iloc[split_idx:]
+    X_fit, y_fit, X_hold, y_hold = fit[FEATURES], fit[TARGET], hold[FEATURES], hold[TARGET]
+    print(f"Continuing training on {len(fit):,} new rows (+{trees} trees), "
+          f"validating on {len(hold):,}...")
+
+    current = load_model(model_path)
+    with span("update.fit", rows=len(fit)):
+        candidate = _continue(current, X_fit, y_fit, trees, XGB_PARAMS)
+    cur_mae = mean_absolute_error(y_hold, current.predict(X_hold))
+    new_mae = mean_absolute_error(y_hold, candidate.predict(X_hold))
+    print(f"  Holdout MAE: current {cur_mae:.4f} → candidate {new_mae:.4f}")
+    result = {"current_mae": float(cur_mae), "candidate_mae": float(new_mae),
+              "new_rows": len(new)}
+
+    if new_mae > cur_mae:
+        print("  Candidate regresses; keeping the current model.")
+        return {**result, "action": "rejected", "reason": "holdout MAE regressed",
+                "seconds": round(time.time() - start, 3)}
+
+    watermark = str(fit["timestamp"].max())
+    history = meta.get("update_history", [])[-(HISTORY_LEN - 1):] + [{
+        "at": time.strftime("%Y-%m-%dT%H:%M:%S"), "rows": len(fit), "trees": trees,
+        "watermark": watermark, "holdout_mae": float(new_mae),
+    }]
+    keep = {k: v for k, v in meta.items() if k not in ("format", "model_class", "saved_at")}
+    updated_meta = {
+        **keep, "watermark": watermark,
+        "watermark_rows": int((ts == pd.Timestamp(watermark)).sum()),
+        "incremental_updates": meta.get("incremental_updates", 0) + 1,
+        "n_trees": int(candidate.get_booster().num_boosted_rounds()),
+        "metrics": {**meta.get("metrics", {}), "update_holdout_mae": float(new_mae)},
+        "update_history": history,
+    }
+    with span("update.save_model"):
+        save_model(candidate, model_path, updated_meta)
+    quantiles = _update_quantiles(model_path, X_fit, y_fit, X_hold, y_hold, trees)
+    if monitor is not None:
+        monitor.acknowledge()
+        monitor.save(drift_state)
+    seconds = time.time() - start
+    print(f"Promoted updated model (watermark {watermark}) in {seconds:.2f}s")
+    return {**result, "action": "updated", "reason": reason, "watermark": watermark,
+            "quantiles_updated": quantiles, "seconds": round(seconds, 3)}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Incremental model refresh")
+    parser.add_argument("--input", default=artifact_path("milestone_2_featured_data"))
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--trees", type=int, default=UPDATE_TREES,
+                        help="boosting rounds added per update")
+    parser.add_argument("--holdout-frac", type=float, default=HOLDOUT_FRAC)
+    parser.add_argument("--full", action="store_true", help="force a full rebuild")
+    parser.add_argument("--rebuild-days", type=int, default=REBUILD_DAYS)
+    parser.add_argument("--max-updates", type=int, default=MAX_UPDATES)
+    parser.add_argument("--drift-state", default="drift_state.pkl")
+    parser.add_argument("--drift-rebuild-frac", type=float, default=DRIFT_REBUILD_FRAC)
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.input):
+        print(f"Error: '{args.input}' not found. Please run Milestone 2 first.")
+        return 1
+    update_model(args.input, args.model, trees=args.trees, holdout_frac=args.holdout_frac,
+                 full=args.full or not os.path.exists(args.model), drift_state=args.drift_state,
+                 rebuild_days=args.rebuild_days, max_updates=args.max_updates,
+                 drift_rebuild_frac=args.drift_rebuild_frac)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
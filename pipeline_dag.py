@@ -0,0 +1,236 @@
+"""
+pipeline_dag.py — Small task-DAG scheduler for the pipeline runner.
+
+A ``Task`` names the tasks it depends on and is called with their results,
+in ``deps`` order, as soon as they are all available. Thread tasks run in a
+shared ``ThreadPoolExecutor`` (pandas / NumPy / scikit-learn / XGBoost
+release the GIL in their heavy loops); ``kind="process"`` tasks run in a
+spawn-based ``ProcessPoolExecutor`` and must be picklable module-level
+functions with picklable arguments.
+
+Progress is checkpointed to a JSON state file after every task. With
+``resume=True`` tasks that completed in an earlier run of the same DAG are
+skipped when they can be restored (``restore`` rebuilds their result, e.g.
+from an artifact on disk); completed tasks without ``restore`` are re-run
+only if a task that still has to run needs their result. The run then
+continues from the failed node.
+
+``critical_path`` returns the longest chain of dependent task durations,
+i.e. the lower bound on wall time no amount of extra workers can beat.
+"""
+
+import json
+import os
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from multiprocessing import get_context
+from typing import Callable, Optional
+
+STATE_PATH = ".pipeline_dag_state.json"
+
+
+def no_result():
+    """``restore`` for side-effect-only tasks: nothing to rebuild."""
+    return None
+
+
+@dataclass
+class Task:
+    name: str
+    fn: Callable
+    deps: tuple = ()
+    kind: str = "thread"                 # "thread" or "process"
+    restore: Optional[Callable] = None   # rebuilds the result of a completed task on resume
+
+
+@dataclass
+class DagResult:
+    ok: bool
+    results: dict
+    timings: dict = field(default_factory=dict)    # name -> (start, end) offsets in seconds
+    skipped: list = field(default_factory=list)
+    failed: Optional[str] = None
+    error: Optional[str] = None
+    wall: float = 0.0
+
+
+def _validate(tasks: list) -> dict:
+    by_name = {}
+    for task in tasks:
+        if task.name in by_name:
+            raise ValueError(f"Duplicate task '{task.name}'")
+        if task.kind not in ("thread", "process"):
+            raise ValueError(f"Task '{task.name}': unknown kind '{task.kind}'")
+        by_name[task.name] = task
+    for task in tasks:
+        for dep in task.deps:
+            if dep not in by_name:
+                raise ValueError(f"Task '{task.name}' depends on unknown task '{dep}'")
+    # Kahn's algorithm: anything left over sits on a cycle
+    indegree = {t.name: len(t.deps) for t in tasks}
+    ready = [n for n, d in indegree.items() if d == 0]
+    seen = 0
+    while ready:
+        name = ready.pop()
+        seen += 1
+        for t in tasks:
+            if name in t.deps:
+                indegree[t.name] -= 1
+                if indegree[t.name] == 0:
+                    ready.append(t.name)
+    if seen != len(tasks):
+        raise ValueError("Task graph has a cycle")
+    return by_name
+
+
+def _signature(tasks: list) -> str:
+    return json.dumps(sorted((t.name, list(t.deps)) for t in tasks))
+
+
+def plan_resume(tasks: list, completed: set) -> set:
+    """Names of the tasks that have to run when ``completed`` already succeeded."""
+    by_name = {t.name: t for t in tasks}
+    dependents = {t.name: [u.name for u in tasks if t.name in u.deps] for t in tasks}
+    to_run = set()
+    pending = [t.name for t in tasks if t.name not in completed]
+    # Everything downstream of an unfinished task runs again
+    while pending:
+        name = pending.pop()
+        if name not in to_run:
+            to_run.add(name)
+            pending.extend(dependents[name])
+    # Completed dependencies whose result cannot be restored are recomputed
+    pending = list(to_run)
+    while pending:
+        for dep in by_name[pending.pop()].deps:
+            if dep not in to_run and by_name[dep].restore is None:
+                to_run.add(dep)
+                pending.append(dep)
+    return to_run
+
+
+def critical_path(tasks: list, timings: dict) -> tuple:
+    """Longest chain of dependent task durations: ``(names, seconds)``.
+
+    Tasks without timings (skipped on resume) count as zero.
+    """
+    by_name = {t.name: t for t in tasks}
+    finish, parent = {}, {}
+
+    def longest(name):
+        if name not in finish:
+            start, end = timings.get(name, (0.0, 0.0))
+            best_dep = max(by_name[name].deps, key=longest, default=None)
+            parent[name] = best_dep
+            finish[name] = (end - start) + (longest(best_dep) if best_dep else 0.0)
+        return finish[name]
+
+    if not tasks:
+        return [], 0.0
+    tail = max((t.name for t in tasks), key=longest)
+    path = []
+    while tail is not None:
+        path.append(tail)
+        tail = parent[tail]
+    return path[::-1], finish[path[0]]
+
+
+def _save_state(path: str, signature: str, completed: set, failed=None) -> None:
+    if path is None:
+        return
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"signature": signature, "completed": sorted(completed), "failed": failed,
+                   "updated": time.strftime("%Y-%m-%dT%H:%M:%S")}, f, indent=2)
+    os.replace(tmp, path)
+
+
+def run_dag(tasks: list, max_workers: int = None, state_path: str = STATE_PATH,
+            resume: bool = False, on_event: Callable = None) -> DagResult:
+    """Run ``tasks`` as their dependencies complete.
+
+    ``on_event(kind, name, info)`` is called from the scheduler thread with
+    kind ``"start"``, ``"done"``, ``"skip"`` or ``"fail"``. After the first
+    failure no new tasks are started; running ones are allowed to finish.
+    """
+    by_name = _validate(tasks)
+    signature = _signature(tasks)
+    on_event = on_event or (lambda *args: None)
+
+    completed = set()
+    if resume and state_path and os.path.exists(state_path):
+        with open(state_path, encoding="utf-8") as f:
+            state = json.load(f)
+        if state.get("signature") == signature:
+            completed = set(state.get("completed", []))
+    to_run = plan_resume(tasks, completed)
+
+    results, timings = {}, {}
+    skipped = [t.name for t in tasks if t.name not in to_run]
+    done = set(skipped)
+    origin = time.perf_counter()
+    for name in skipped:
+        on_event("skip", name, None)
+    # Restore results of skipped tasks that a task about to run reads
+    needed = {dep for name in to_run for dep in by_name[name].deps}
+    for name in skipped:
+        if name in needed:
+            results[name] = by_name[name].restore()
+
+    workers = max_workers or min(8, os.cpu_count() or 1)
+    threads = ThreadPoolExecutor(max_workers=workers)
+    processes = None
+    running = {}
+    failed, error = None, None
+    try:
+        while True:
+            if failed is None:
+                for name in [n for n in to_run if n not in done and n not in running.values()]:
+                    task = by_name[name]
+                    if not all(d in done for d in task.deps):
+                        continue
+                    args = [results[d] for d in task.deps]
+                    if task.kind == "process":
+                        if processes is None:
+                            processes = ProcessPoolExecutor(max_workers=workers,
+                                                            mp_context=get_context("spawn"))
+                        future = processes.submit(task.fn, *args)
+                    else:
+                        future = threads.submit(task.fn, *args)
+                    timings[name] = (time.perf_counter() - origin, None)
+                    running[future] = name
+                    on_event("start", name, None)
+            if not running:
+                break
+            finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                end = time.perf_counter() - origin
+                timings[name] = (timings[name][0], end)
+                exc = future.exception()
+                if exc is not None:
+                    if failed is None:
+                        failed = name
+                        error = "".join(traceback.format_exception(type(exc), exc,
+                                                                   exc.__traceback__))
+                    on_event("fail", name, exc)
+                    continue
+                results[name] = future.result()
+                done.add(name)
+                completed.add(name)
+                _save_state(state_path, signature, completed)
+                on_event("done", name, end - timings[name][0])
+    finally:
+        threads.shutdown(wait=True)
+        if processes is not None:
+            processes.shutdown(wait=True)
+
+    # Tasks that never started (downstream of a failure) have no timing
+    timings = {n: t for n, t in timings.items() if t[1] is not None}
+    if failed is not None:
+        completed.discard(failed)
+        _save_state(state_path, signature, completed, failed=failed)
+    return DagResult(ok=failed is None, results=results, timings=timings, skipped=skipped,
+                     failed=failed, error=error, wall=time.perf_counter() - origin)
@@ -0,0 +1,126 @@
+"""
+quantile_forecast.py — P50/P90/P99 demand forecasts from one model.
+
+A single XGBoost booster is trained with ``objective="reg:quantileerror"``
+and one ``quantile_alpha`` per quantile (XGBoost >= 2.0), so every quantile
+comes out of one ``predict`` call as an ``(n_rows, n_quantiles)`` array; there
+is no separate model per quantile. Predictions are sorted along the quantile
+axis so that P50 <= P90 <= P99 always holds.
+
+Capacity planning sizes each series from a service-level quantile instead
+of a flat buffer: with ``service_level=0.9`` the recommended capacity is the
+P90 forecast, so volatile series get more headroom and stable series less.
+A service level between two trained quantiles is linearly interpolated.
+
+The quantile model is stored with ``model_store`` in a ``quantiles/``
+subdirectory of the point-forecast model directory (``<stem>_quantiles/``
+next to a legacy ``.pkl`` model), and its quantiles and holdout calibration
+are recorded in its metadata.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from model_store import load_model, read_metadata, save_model
+
+QUANTILES = (0.5, 0.9, 0.99)
+SERVICE_LEVEL = 0.9
+SERVICE_LEVEL_COL = "forecast_service_level"
+QUANTILE_DIR = "quantiles"
+QUANTILE_PARAMS = {
+    "n_estimators": 100, "learning_rate": 0.1, "max_depth": 5,
+    "random_state": 42, "verbosity": 0,
+}
+
+
+def quantile_col(q: float) -> str:
+    """Report column of quantile ``q`` (0.9 → ``forecast_p90``)."""
+    return f"forecast_p{q * 100:g}"
+
+
+def quantile_path(model_path: str) -> str:
+    """Store directory of the quantile model belonging to ``model_path``.
+
+    Inside a model store directory; next to a legacy ``.pkl`` file
+    (``<stem>_quantiles/``).
+    """
+    if str(model_path).endswith(".pkl"):
+        return f"{os.path.splitext(str(model_path))[0]}_{QUANTILE_DIR}"
+    return os.path.join(model_path, QUANTILE_DIR)
+
+
+class QuantileModel:
+    """Multi-quantile regressor: ``predict`` returns one column per quantile."""
+
+    def __init__(self, model, quantiles, features: list = None):
+        self.model = model
+        self.quantiles = tuple(float(q) for q in quantiles)
+        self.features = features
+
+    def predict(self, X) -> np.ndarray:
+        if isinstance(X, pd.DataFrame) and self.features:
+            X = X[self.features]
+        preds = np.asarray(self.model.predict(X)).reshape(len(X), len(self.quantiles))
+        # Independent quantile heads can cross; sorting restores monotonicity
+        return np.sort(preds, axis=1)
+
+
+def fit_quantile_model(X_train, y_train, quantiles=QUANTILES, n_jobs: int = -1) -> QuantileModel:
+    """Train one XGBoost booster for all ``quantiles``."""
+    model = xgb.XGBRegressor(**QUANTILE_PARAMS, objective="reg:quantileerror",
+                             quantile_alpha=np.asarray(quantiles, dtype="float64"),
+                             n_jobs=n_jobs)
+    model.fit(X_train, y_train)
+    return QuantileModel(model, quantiles, list(X_train.columns))
+
+
+def evaluate(preds: np.ndarray, y, quantiles) -> dict:
+    """Pinball loss and empirical coverage (share of actuals <= forecast) per quantile."""
+    y = np.asarray(y, dtype="float64")[:, None]
+    diff = y - preds
+    pinball = np.mean(np.maximum(np.asarray(quantiles) * diff, (np.asarray(quantiles) - 1) * diff),
+                      axis=0)
+    coverage = np.mean(diff <= 0, axis=0)
+    return {quantile_col(q): {"pinball": float(p), "coverage": float(c)}
+            for q, p, c in zip(quantiles, pinball, coverage)}
+
+
+def quantile_at(preds: np.ndarray, quantiles, level: float) -> np.ndarray:
+    """Forecast at ``level``, interpolated between the trained quantiles."""
+    quantiles = np.asarray(quantiles, dtype="float64")
+    if not quantiles[0] <= level <= quantiles[-1]:
+        raise ValueError(f"service level {level} outside the trained quantiles "
+                         f"{quantiles.tolist()}")
+    hi = min(int(np.searchsorted(quantiles, level)), len(quantiles) - 1)
+    if quantiles[hi] == level:
+        return preds[:, hi]
+    lo = hi - 1
+    w = (level - quantiles[lo]) / (quantiles[hi] - quantiles[lo])
+    return preds[:, lo] + (preds[:, hi] - preds[:, lo]) * np.asarray(w, dtype=preds.dtype)
+
+
+def quantile_forecasts(model: QuantileModel, X, service_level: float = SERVICE_LEVEL,
+                       index=None) -> pd.DataFrame:
+    """All quantile columns plus ``SERVICE_LEVEL_COL`` from one batched predict."""
+    preds = model.predict(X)
+    out = pd.DataFrame(preds, columns=[quantile_col(q) for q in model.quantiles],
+                       index=X.index if index is None else index)
+    out[SERVICE_LEVEL_COL] = quantile_at(preds, model.quantiles, service_level)
+    return out
+
+
+def save_quantile_model(model: QuantileModel, model_path: str, metadata: dict = None) -> str:
+    meta = {**(metadata or {}), "quantiles": list(model.quantiles), "features": model.features}
+    return save_model(model.model, quantile_path(model_path), meta)
+
+
+def load_quantile_model(model_path):
+    """Quantile model stored next to the model at ``model_path`` (None if absent)."""
+    if not isinstance(model_path, (str, os.PathLike)):
+        return None
+    path = quantile_path(model_path)
+    if not os.path.isdir(path):
+        return None
+    meta = read_metadata(path)
+    return QuantileModel(load_model(path), meta["quantiles"], meta.get("features"))
@@ -0,0 +1,237 @@
+"""
+render_charts.py — Per-series forecast-vs-actual charts, rendered in parallel.
+
+Runs as its own stage after scoring: it reads the scored output (the
+actions report, a batch-scoring directory from ``batch_scoring.py`` or a
+DataFrame) and writes one chart per (region, service_type) to
+
+    <out>/<region>__<service_type>.<png|svg>
+
+Series are sent to a process pool in batches. Each worker builds one
+Figure, its axes and its two line artists once, and then only swaps the
+line data, title and limits for each series, so figure creation and layout
+are not paid per chart. Long series are min/max-downsampled so spikes still
+show (see ``generate_dashboard.minmax_indices``). ``<out>/manifest.json``
+records a content hash per series. A series whose rows have not changed
+since the last render is skipped, and charts for series that no longer
+appear are removed.
+
+Usage:
+    python render_charts.py [--input optimization_actions_report.csv] [--out charts]
+                            [--format png|svg] [--workers 4] [--force]
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use("Agg")  # Headless / non-interactive backend
+from matplotlib.dates import date2num
+from matplotlib.figure import Figure
+from artifact_io import read_table
+from generate_dashboard import minmax_indices
+from instrumentation import span
+
+REPORT_PATH = "optimization_actions_report.csv"
+CHART_DIR = "charts"
+MANIFEST = "manifest.json"
+FORMATS = ("png", "svg")
+SERIES_COLS = ["region", "service_type"]
+PLOT_COLS = ["timestamp", "usage_units", "forecasted_usage"]
+MAX_POINTS = 2_000
+MARKER_MAX_POINTS = 200   # draw point markers only on short series
+BATCH_SIZE = 32
+RENDER_VERSION = 1        # bump when the chart layout changes to re-render everything
+
+# Per-worker figure and artists, built once by _init_worker
+_WORKER = {}
+
+
+def _slug(value) -> str:
+    return re.sub(r"[^A-Za-z0-9_-]+", "_", str(value)) or "series"
+
+
+def _init_worker(fmt: str) -> None:
+    fig = Figure(figsize=(12, 5), dpi=100)
+    ax = fig.subplots()
+    actual, = ax.plot([], [], label="Actual", alpha=0.6)
+    forecast, = ax.plot([], [], label="Forecast", linestyle="--", alpha=0.8)
+    ax.xaxis_date()
+    ax.set_xlabel("Time")
+    ax.set_ylabel("Usage Units")
+    ax.tick_params(axis="x", rotation=45)
+    ax.legend(loc="upper left")
+    ax.grid(True, linestyle="--", alpha=0.4)
+    # Fixed margins instead of tight_layout(): the layout is the same for every chart
+    fig.subplots_adjust(left=0.07, right=0.98, top=0.92, bottom=0.2)
+    _WORKER.update(fig=fig, ax=ax, actual=actual, forecast=forecast, fmt=fmt)
+
+
+def _render_batch(batch: list) -> list:
+    """Draw each ``(key, path, title, x, actual, forecast)`` on the worker's figure."""
+    fig, ax = _WORKER["fig"], _WORKER["ax"]
+    done = []
+    for key, path, title, x, actual, forecast in batch:
+        marker = "o" if len(x) <= MARKER_MAX_POINTS else ""
+        for line, y in ((_WORKER["actual"], actual), (_WORKER["forecast"], forecast)):
+            line.set_data(x, y)
+        _WORKER["actual"].set_marker(marker)
+        ax.set_title(title)
+        ax.relim()
+        ax.autoscale_view()
+        fig.savefig(path, format=_WORKER["fmt"])
+        done.append(key)
+    return done
+
+
+def load_scored(source) -> pd.DataFrame:
+    """Scored rows from a DataFrame, a report file or a batch-scoring directory."""
+    columns = SERIES_COLS + PLOT_COLS
+    if isinstance(source, pd.DataFrame):
+        return source[columns]
+    if os.path.isdir(source):
+        parts = sorted(glob.glob(os.path.join(source, "**", "part.*"), recursive=True))
+        if not parts:
+            raise FileNotFoundError(f"No scored partitions under {source}")
+        return pd.concat([read_table(p, columns=columns) for p in parts], ignore_index=True)
+    return read_table(source, columns=columns)
+
+
+def _series_hash(sub: pd.DataFrame, fmt: str, max_points: int) -> str:
+    h = hashlib.sha1(f"{RENDER_VERSION}\0{fmt}\0{max_points}".encode())
+    h.update(pd.util.hash_pandas_object(sub, index=False).to_numpy().tobytes())
+    return h.hexdigest()[:16]
+
+
+def _payload(key: str, path: str, region, s_type, sub: pd.DataFrame, max_points: int) -> tuple:
+    values = sub[["usage_units", "forecasted_usage"]].to_numpy(dtype="float64")
+    keep = minmax_indices(values, max_points)
+    x = date2num(sub["timestamp"].to_numpy()[keep])
+    return (key, path, f"Actual vs Forecast: {region} / {s_type}",
+            x, values[keep, 0], values[keep, 1])
+
+
+def render_charts(scored=REPORT_PATH, out_dir: str = CHART_DIR, fmt: str = "png",
+                  n_workers: int = None, batch_size: int = BATCH_SIZE,
+                  max_points: int = MAX_POINTS, force: bool = False) -> dict:
+    """Render one chart per series of ``scored`` into ``out_dir``.
+
+    Returns a summary dict (series, rendered, skipped, removed, seconds).
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {list(FORMATS)}")
+    start = time.time()
+    with span("charts.load"):
+        df = load_scored(scored).copy()
+        df["timestamp"] = pd.to_datetime(df["timestamp"])
+        df = df.sort_values("timestamp", kind="stable").reset_index(drop=True)
+
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, MANIFEST)
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+
+    # One grouping pass; decide per series whether its chart is stale
+    with span("charts.plan"):
+        wanted, todo = {}, []
+        for (region, s_type), idx in df.groupby(SERIES_COLS, observed=True).indices.items():
+            key = f"{region}/{s_type}"
+            sub = df.iloc[idx][PLOT_COLS]
+            name = f"{_slug(region)}__{_slug(s_type)}.{fmt}"
+            wanted[key] = {"hash": _series_hash(sub, fmt, max_points), "file": name,
+                           "rows": len(sub)}
+            old = manifest.get(key)
+            if (force or not old or old != wanted[key]
+                    or not os.path.exists(os.path.join(out_dir, name))):
+                todo.append((key, region, s_type, idx))
+
+    removed = 0
+    for key, old in manifest.items():
+        if wanted.get(key, {}).get("file") != old["file"]:
+            stale = os.path.join(out_dir, old["file"])
+            if os.path.exists(stale):
+                os.remove(stale)
+                removed += 1
+
+    def batches():
+        # Payloads are built lazily so only the batches in flight are held
+        for i in range(0, len(todo), batch_size):
+            yield [_payload(key, os.path.join(out_dir, wanted[key]["file"]), region, s_type,
+                            df.iloc[idx][PLOT_COLS], max_points)
+                   for key, region, s_type, idx in todo[i:i + batch_size]]
+
+    n_workers = n_workers or min(4, os.cpu_count() or 1)
+    n_workers = max(1, min(n_workers, -(-len(todo) // batch_size)))
+    # Unchanged series keep their manifest entry; rendered ones are added as they finish
+    current = {k: v for k, v in manifest.items() if k in wanted and v == wanted[k]}
+    rendered = 0
+    try:
+        with span("charts.render", series=len(todo), workers=n_workers):
+            if n_workers <= 1:
+                _init_worker(fmt)
+                for batch in batches():
+                    for key in _render_batch(batch):
+                        current[key] = wanted[key]
+                        rendered += 1
+            else:
+                with ProcessPoolExecutor(max_workers=n_workers, mp_context=get_context("spawn"),
+                                         initializer=_init_worker, initargs=(fmt,)) as pool:
+                    # At most 2 batches per worker in flight
+                    pending = deque()
+                    for batch in batches():
+                        pending.append(pool.submit(_render_batch, batch))
+                        while len(pending) >= 2 * n_workers or (pending and pending[0].done()):
+                            for key in pending.popleft().result():
+                                current[key] = wanted[key]
+                                rendered += 1
+                    while pending:
+                        for key in pending.popleft().result():
+                            current[key] = wanted[key]
+                            rendered += 1
+    finally:
+        with open(manifest_path, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2, sort_keys=True)
+
+    seconds = time.time() - start
+    summary = {"series": len(wanted), "rendered": rendered,
+               "skipped": len(wanted) - len(todo), "removed": removed,
+               "workers": n_workers, "seconds": round(seconds, 3)}
+    print(f"Charts: {rendered} rendered, {summary['skipped']} unchanged, {removed} removed "
+          f"({len(wanted)} series) in {seconds:.2f}s → {out_dir}/")
+    return summary
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Render per-series forecast vs actual charts")
+    parser.add_argument("--input", default=REPORT_PATH,
+                        help="scored report file or batch-scoring output directory")
+    parser.add_argument("--out", default=CHART_DIR)
+    parser.add_argument("--format", choices=FORMATS, default="png")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--max-points", type=int, default=MAX_POINTS)
+    parser.add_argument("--force", action="store_true", help="re-render unchanged series too")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.input):
+        print(f"Error: '{args.input}' not found. Please run Milestone 4 first.")
+        return 1
+    render_charts(args.input, out_dir=args.out, fmt=args.format, n_workers=args.workers,
+                  batch_size=args.batch_size, max_points=args.max_points, force=args.force)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
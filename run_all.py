@@ -1,21 +1,46 @@
 """
 run_all.py — Azure Demand Forecasting Pipeline Runner
 Executes all 4 milestones in sequence with timing and status reporting.
-Usage:  python run_all.py
+Usage:  python run_all.py [--no-cache] [--cache-max-mb N]
+        python run_all.py --in-process [--write-intermediates]
+        python run_all.py --dag [--workers N] [--resume]
+        python run_all.py [--profile DIR] [--trace trace.json [--trace-format json]]
+
+In the default (subprocess) mode up-to-date milestones are skipped and their
+outputs restored from the stage cache (see ``stage_cache.py``).
 """
 
+import argparse
 import subprocess
 import sys
 import time
 import os
+import shutil
+import tempfile
+from contextlib import nullcontext
+import instrumentation
+from instrumentation import TRACE_DIR_ENV, span
+from bench_utils import peak_rss_mb
+from stage_cache import CACHE_DIR, DEFAULT_MAX_BYTES, StageCache, local_sources
 
 MILESTONES = [
     ("Milestone 1", "Data Preparation",          "milestone_1_data_prep.py"),
     ("Milestone 2", "Feature Engineering",        "milestone_2_feature_engineering.py"),
     ("Milestone 3", "Model Development",          "milestone_3_model_development.py"),
     ("Milestone 4", "Forecast Integration",       "milestone_4_integration.py"),
+    ("Charts",      "Per-series Chart Rendering", "render_charts.py"),
 ]
 
+RAW_DATA      = "azure_compute_storage_demand_10000_rows.csv"
+CLEANED_STEM  = "milestone_1_cleaned_data"
+FEATURED_STEM = "milestone_2_featured_data"
+MODEL_PATH    = "best_demand_forecast_model"
+REPORT_PATH   = "optimization_actions_report.csv"
+DRIFT_STATE   = "drift_state.pkl"
+DRIFT_EVENTS  = "drift_events.jsonl"
+CHART_DIR     = "charts"
+CACHED_PACKAGES = ["pandas", "numpy", "scikit-learn", "xgboost", "matplotlib", "pyarrow"]
+
 GREEN  = "\033[92m"
 RED    = "\033[91m"
 YELLOW = "\033[93m"
@@ -29,16 +54,20 @@ def banner():
     print(f"  Pipeline Runner — {time.strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"{'='*60}{RESET}\n")
 
-def run_milestone(label: str, description: str, script: str) -> bool:
+def run_milestone(label: str, description: str, script: str,
+                  profile_dir: str = None, trace_dir: str = None) -> bool:
     print(f"{BOLD}{YELLOW}▶  {label}: {description}{RESET}")
     print(f"   Running {script} ...")
     start = time.time()
 
-    result = subprocess.run(
-        [sys.executable, "-u", script],
-        capture_output=True, text=True,
-        env={**os.environ, "PYTHONIOENCODING": "utf-8"},
-    )
+    cmd = [sys.executable, "-u", script]
+    if profile_dir:
+        cmd[2:2] = ["instrumentation.py", "--profile-dir", profile_dir]
+    env = {**os.environ, "PYTHONIOENCODING": "utf-8"}
+    if trace_dir:
+        env[TRACE_DIR_ENV] = trace_dir
+    with span(f"run_all.{os.path.splitext(script)[0]}"):
+        result = subprocess.run(cmd, capture_output=True, text=True, env=env)
 
     elapsed = time.time() - start
 
@@ -57,22 +86,387 @@ def run_milestone(label: str, description: str, script: str) -> bool:
     return result.returncode == 0
 
 
+# Outputs a stage writes only sometimes (retrain events only when a series drifts)
+OPTIONAL_OUTPUTS = {DRIFT_EVENTS}
+
+
+def stage_io(script: str, fmt: str):
+    """Input and output artifacts of a milestone script run by ``main``.
+
+    Milestone 4 reads and updates the drift monitor state, so the state and
+    its event log are inputs as well as outputs: a run that fed the monitor
+    changes its own key, and a cache hit restores the state it produced.
+    """
+    from artifact_io import artifact_path
+
+    cleaned, featured = artifact_path(CLEANED_STEM, fmt), artifact_path(FEATURED_STEM, fmt)
+    return {
+        "milestone_1_data_prep.py":           ([RAW_DATA], [cleaned]),
+        "milestone_2_feature_engineering.py": ([cleaned], [featured]),
+        "milestone_3_model_development.py":   ([featured],
+                                               [MODEL_PATH, "model_evaluation_results.txt"]),
+        "milestone_4_integration.py":         ([featured, MODEL_PATH, DRIFT_STATE, DRIFT_EVENTS],
+                                               [REPORT_PATH, "milestone_4_summary_report.txt",
+                                                DRIFT_STATE, DRIFT_EVENTS]),
+        "render_charts.py":                   ([REPORT_PATH], [CHART_DIR]),
+    }[script]
+
+
+def _package_versions() -> dict:
+    from importlib import metadata
+
+    versions = {}
+    for name in CACHED_PACKAGES:
+        try:
+            versions[name] = metadata.version(name)
+        except metadata.PackageNotFoundError:
+            versions[name] = None
+    return versions
+
+
+def run_cached(cache, label: str, description: str, script: str, params: dict, **run_kwargs):
+    """Run a milestone unless the cache holds its outputs; returns (ok, key)."""
+    inputs, outputs = stage_io(script, params["format"])
+    key = cache.stage_key(script, local_sources(script), inputs, params)
+    entry = cache.lookup(key)
+    if entry is not None:
+        print(f"{BOLD}{YELLOW}▶  {label}: {description}{RESET}")
+        restored = cache.restore(entry)
+        note = f"restored {len(restored)} output(s)" if restored else "outputs already in place"
+        print(f"{GREEN}   ✔  Up to date [{key[:12]}] — {note}{RESET}\n")
+        return True, key
+    ok = run_milestone(label, description, script, **run_kwargs)
+    outputs = [p for p in outputs if p not in OPTIONAL_OUTPUTS or os.path.exists(p)]
+    missing = [p for p in outputs if not os.path.exists(p)]
+    if ok and missing:
+        # Scripts print a message and exit 0 when their inputs are absent
+        print(f"{RED}   ✘  {script} did not produce {missing}{RESET}\n")
+        return False, key
+    if ok:
+        cache.store(key, script, outputs)
+    return ok, key
+
+
+def _fmt_mb(value) -> str:
+    return "n/a" if value is None else f"{value:,.0f} MB"
+
+
+def export_trace(path: str, fmt: str, records: list = None) -> None:
+    """Write spans (default: this process's) to ``path`` and print the slowest steps."""
+    records = instrumentation.spans() if records is None else records
+    instrumentation.export(path, records, fmt=fmt)
+    print(f"{BOLD}Slowest steps{RESET}")
+    for step in instrumentation.summarize(records)[:10]:
+        grew = step["max_rss_delta_mb"]
+        print(f"  {step['name']:<44} {step['seconds']:>8.2f}s"
+              + (f"  (+{grew:,.0f} MB RSS)" if grew else ""))
+    print(f"Trace ({fmt}) saved to {path}\n")
+
+
+def run_in_process(write_intermediates: bool = False, fmt: str = "csv",
+                   profile_dir: str = None, trace: str = None,
+                   trace_format: str = "chrome") -> int:
+    """Run all milestones in this interpreter, handing DataFrames between stages.
+
+    Avoids one interpreter start-up (and pandas/sklearn/xgboost import) per
+    milestone and the CSV write → read → timestamp re-parse between stages.
+    The trained model and the actions report are always written; the cleaned
+    and featured artifacts (in ``fmt``) only when ``write_intermediates`` is set.
+    """
+    banner()
+    print(f"{BOLD}In-process mode{RESET} — intermediates "
+          f"{'written' if write_intermediates else 'kept in memory'}\n")
+
+    from artifact_io import artifact_path
+    from milestone_1_data_prep import prepare_data
+    from milestone_2_feature_engineering import engineer_features
+    from milestone_3_model_development import train_and_evaluate
+    from milestone_4_integration import run_integration
+    from quantile_forecast import load_quantile_model
+    from render_charts import render_charts
+
+    cleaned_out = artifact_path(CLEANED_STEM, fmt) if write_intermediates else None
+    featured_out = artifact_path(FEATURED_STEM, fmt) if write_intermediates else None
+    state = {}
+
+    def _prep():
+        state["cleaned"] = prepare_data(RAW_DATA, cleaned_out)
+
+    def _features():
+        # Drop the cleaned frame once it has been consumed
+        state["featured"] = engineer_features(state.pop("cleaned"), featured_out)
+
+    def _train():
+        state["model"] = train_and_evaluate(state["featured"], MODEL_PATH)
+
+    def _integrate():
+        state["latest"] = run_integration(state["featured"], state["model"], REPORT_PATH,
+                                          quantile_model=load_quantile_model(MODEL_PATH))
+
+    def _charts():
+        render_charts(state.pop("latest"), CHART_DIR)
+
+    stages = [
+        ("Milestone 1", "Data Preparation",     _prep),
+        ("Milestone 2", "Feature Engineering",  _features),
+        ("Milestone 3", "Model Development",    _train),
+        ("Milestone 4", "Forecast Integration", _integrate),
+        ("Charts",      "Per-series Charts",    _charts),
+    ]
+
+    if not os.path.exists(RAW_DATA):
+        print(f"{RED}   ✘  {RAW_DATA} not found.{RESET}\n")
+        return 1
+
+    total_start = time.time()
+    results = []
+    for label, desc, stage in stages:
+        print(f"{BOLD}{YELLOW}▶  {label}: {desc}{RESET}")
+        start = time.time()
+        profiler = (instrumentation.profile_stage(label.lower().replace(" ", "_"), profile_dir)
+                    if profile_dir else nullcontext())
+        # Sampled during the stage: ru_maxrss is a process-lifetime peak and
+        # would repeat the largest earlier stage for every later one
+        sampled = {"peak_mb": None}
+        try:
+            with profiler, instrumentation.peak_rss() as sampled:
+                stage()
+        except Exception as exc:
+            elapsed = time.time() - start
+            print(f"{RED}   ✘  FAILED after {elapsed:.1f}s: {exc!r}{RESET}\n")
+            results.append((label, False, elapsed, sampled["peak_mb"]))
+            print(f"{RED}Pipeline stopped: {label} failed.{RESET}")
+            break
+        elapsed = time.time() - start
+        rss = sampled["peak_mb"]
+        print(f"{GREEN}   ✔  Completed in {elapsed:.1f}s  (stage peak RSS {_fmt_mb(rss)}){RESET}\n")
+        results.append((label, True, elapsed, rss))
+
+    total = time.time() - total_start
+    print(f"{BOLD}{CYAN}{'='*60}")
+    print(f"  Pipeline Summary  ({total:.1f}s total, in-process)")
+    print(f"{'='*60}{RESET}")
+    print(f"  {'Stage':<14} {'Status':<8} {'Wall':>8}  {'Stage peak':>10}")
+    for label, ok, elapsed, rss in results:
+        status = f"{GREEN}✔  PASS{RESET}" if ok else f"{RED}✘  FAIL{RESET}"
+        print(f"  {label:<14} {status}  {elapsed:>7.1f}s  {_fmt_mb(rss):>10}")
+    print()
+
+    if trace:
+        export_trace(trace, trace_format)
+    if profile_dir:
+        print(f"cProfile / tracemalloc output saved to {profile_dir}/\n")
+
+    all_ok = len(results) == len(stages) and all(ok for _, ok, _, _ in results)
+    return 0 if all_ok else 1
+
+
+def _build_dashboard(*_deps):
+    """Build dashboard.html (runs in a worker process; no browser is opened).
+
+    The report / summary task results are passed in by ``run_dag`` but the
+    dashboard reads the files they wrote.
+    """
+    from generate_dashboard import build_dashboard
+
+    build_dashboard(REPORT_PATH)
+
+
+def pipeline_tasks(fmt: str = "csv", n_jobs: int = -1) -> list:
+    """The pipeline as a task DAG for ``pipeline_dag.run_dag``.
+
+    Cleaned / featured data and the model are checkpointed to disk so a
+    resumed run can reload them instead of recomputing; RF, XGBoost and the
+    quantile model are fitted concurrently (each with ``n_jobs`` threads),
+    and the actions report, the summary and the per-series charts (rendered
+    in their own process pool) are written concurrently.
+    """
+    from artifact_io import artifact_path, read_table
+    from milestone_1_data_prep import prepare_data
+    from milestone_2_feature_engineering import engineer_features
+    import milestone_3_model_development as m3
+    import milestone_4_integration as m4
+    from model_store import load_model
+    from pipeline_dag import Task, no_result
+    from quantile_forecast import load_quantile_model
+    from render_charts import render_charts
+
+    cleaned_out = artifact_path(CLEANED_STEM, fmt)
+    featured_out = artifact_path(FEATURED_STEM, fmt)
+
+    def fit(name):
+        return lambda split: m3.fit_candidate(name, split["X_train"], split["y_train"],
+                                              split["X_test"], split["y_test"], n_jobs=n_jobs)
+
+    def select(split, *candidates):
+        return m3.save_selected_model(split, m3.select_best(list(candidates)), MODEL_PATH)
+
+    def score(featured, model, quantiles):
+        latest, metrics = m4.score_snapshot(featured, model, quantile_model=quantiles)
+        m4.monitor_drift(latest, metrics, m4.DRIFT_STATE)
+        return latest, metrics
+
+    fit_tasks = [(f"fit_{name.split()[0].lower()}", name) for name in m3.CANDIDATES]
+    return [
+        Task("prep", lambda: prepare_data(RAW_DATA, cleaned_out),
+             restore=lambda: read_table(cleaned_out)),
+        Task("features", lambda cleaned: engineer_features(cleaned, featured_out), ("prep",),
+             restore=lambda: read_table(featured_out)),
+        Task("split", m3.load_training_split, ("features",)),
+        *[Task(task, fit(name), ("split",)) for task, name in fit_tasks],
+        Task("select_model", select, ("split", *[task for task, _ in fit_tasks]),
+             restore=lambda: load_model(MODEL_PATH)),
+        Task("fit_quantiles", lambda split: m3.train_quantile_model(split, MODEL_PATH, n_jobs=n_jobs),
+             ("split",), restore=lambda: load_quantile_model(MODEL_PATH)),
+        Task("score", score, ("features", "select_model", "fit_quantiles")),
+        Task("report", lambda scored: m4.write_actions_report(scored[0], REPORT_PATH),
+             ("score",), restore=no_result),
+        Task("charts", lambda scored: render_charts(scored[0], CHART_DIR),
+             ("score",), restore=no_result),
+        Task("summary", lambda scored: m4.write_summary_report(*scored, REPORT_PATH),
+             ("score",), restore=no_result),
+        Task("dashboard", _build_dashboard, ("report", "summary"), kind="process",
+             restore=no_result),
+    ]
+
+
+def run_dag_mode(fmt: str = "csv", workers: int = None, resume: bool = False,
+                 trace: str = None, trace_format: str = "chrome") -> int:
+    """Run the pipeline as a task DAG and print a critical-path breakdown."""
+    from pipeline_dag import critical_path, run_dag
+
+    banner()
+    workers = workers or min(8, os.cpu_count() or 1)
+    print(f"{BOLD}DAG mode{RESET} — {workers} workers"
+          f"{', resuming from last failure' if resume else ''}\n")
+    if not os.path.exists(RAW_DATA):
+        print(f"{RED}   ✘  {RAW_DATA} not found.{RESET}\n")
+        return 1
+
+    # Split the cores between the three concurrent model fits
+    tasks = pipeline_tasks(fmt, n_jobs=max(1, (os.cpu_count() or 3) // 3))
+
+    def on_event(kind, name, info):
+        if kind == "start":
+            print(f"{YELLOW}   ▶  {name}{RESET}")
+        elif kind == "done":
+            print(f"{GREEN}   ✔  {name} ({info:.1f}s){RESET}")
+        elif kind == "skip":
+            print(f"   ↷  {name} (completed in an earlier run)")
+        else:
+            print(f"{RED}   ✘  {name}: {info!r}{RESET}")
+
+    result = run_dag(tasks, max_workers=workers, resume=resume, on_event=on_event)
+
+    path, path_seconds = critical_path(tasks, result.timings)
+    busy = sum(end - start for start, end in result.timings.values())
+    print(f"\n{BOLD}{CYAN}{'='*60}")
+    print(f"  DAG Summary  ({result.wall:.1f}s wall, {busy:.1f}s task time, "
+          f"peak RSS {_fmt_mb(peak_rss_mb())})")
+    print(f"{'='*60}{RESET}")
+    print(f"  {'Task':<14} {'Start':>7} {'End':>7} {'Dur':>7}  Critical")
+    for task in tasks:
+        if task.name not in result.timings:
+            continue
+        start, end = result.timings[task.name]
+        mark = "  ◆" if task.name in path else ""
+        print(f"  {task.name:<14} {start:>6.1f}s {end:>6.1f}s {end - start:>6.1f}s{mark}")
+    print(f"\n  Critical path ({path_seconds:.1f}s): {' → '.join(path)}")
+    if result.wall > 0:
+        print(f"  Parallelism: {busy / result.wall:.2f}x")
+    print()
+    if trace:
+        export_trace(trace, trace_format)
+    if not result.ok:
+        print(f"{RED}Pipeline stopped: {result.failed} failed.{RESET}")
+        print(f"{RED}{'─'*56}\n{result.error}{'─'*56}{RESET}")
+        print("Fix the error and re-run with --dag --resume to continue from that task.\n")
+        return 1
+    print(f"{GREEN}{BOLD}  All tasks passed! Dashboard: open dashboard.html{RESET}\n")
+    return 0
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Run the demand forecasting pipeline.")
+    parser.add_argument("--in-process", action="store_true",
+                        help="run all milestones in one interpreter, passing DataFrames in memory")
+    parser.add_argument("--write-intermediates", action="store_true",
+                        help="with --in-process, also write the cleaned/featured artifacts")
+    parser.add_argument("--format", choices=["csv", "parquet", "feather"], default="csv",
+                        help="storage format for intermediate artifacts (default: csv)")
+    parser.add_argument("--dag", action="store_true",
+                        help="run the pipeline as a task DAG with independent tasks in parallel")
+    parser.add_argument("--workers", type=int, default=None, help="worker pool size for --dag")
+    parser.add_argument("--resume", action="store_true",
+                        help="with --dag, skip tasks completed by the previous run")
+    parser.add_argument("--profile", metavar="DIR", default=None,
+                        help="write cProfile / tracemalloc output per stage to DIR "
+                             "(not with --dag: cProfile cannot follow worker threads)")
+    parser.add_argument("--trace", metavar="PATH", default=None,
+                        help="export per-step timings and memory counters to PATH")
+    parser.add_argument("--trace-format", choices=["chrome", "json"], default="chrome",
+                        help="--trace output: Chrome trace events or a JSON span list")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="always run every milestone (subprocess mode)")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="stage cache location")
+    parser.add_argument("--cache-max-mb", type=float, default=DEFAULT_MAX_BYTES / 1024 ** 2,
+                        help="evict least recently used cache entries beyond this size")
+    args = parser.parse_args()
+    if args.dag:
+        if args.profile:
+            parser.error("--profile is not supported with --dag; use --trace")
+        return run_dag_mode(fmt=args.format, workers=args.workers, resume=args.resume,
+                            trace=args.trace, trace_format=args.trace_format)
+    if args.in_process:
+        return run_in_process(write_intermediates=args.write_intermediates, fmt=args.format,
+                              profile_dir=args.profile, trace=args.trace,
+                              trace_format=args.trace_format)
+    # Milestone scripts pick their artifact format up from the environment
+    os.environ["PIPELINE_ARTIFACT_FORMAT"] = args.format
+
     banner()
     total_start = time.time()
     results = []
+    run_kwargs = {"profile_dir": args.profile}
+    if args.trace:
+        run_kwargs["trace_dir"] = tempfile.mkdtemp(prefix="pipeline_trace_")
+    cache = None
+    # A stage restored from the cache has nothing to profile
+    if not args.no_cache and not args.profile:
+        cache = StageCache(args.cache_dir, max_bytes=int(args.cache_max_mb * 1024 ** 2))
+        params = {"format": args.format, "python": sys.version.split()[0],
+                  "packages": _package_versions()}
+    used_keys = set()
 
     for label, desc, script in MILESTONES:
         if not os.path.exists(script):
             print(f"{RED}   ✘  {script} not found — skipping.{RESET}\n")
             results.append((label, False))
             continue
-        ok = run_milestone(label, desc, script)
+        if cache is None:
+            ok = run_milestone(label, desc, script, **run_kwargs)
+        else:
+            ok, key = run_cached(cache, label, desc, script, params, **run_kwargs)
+            used_keys.add(key)
         results.append((label, ok))
         if not ok:
             print(f"{RED}Pipeline stopped: {label} failed.{RESET}")
             break
 
+    if cache is not None:
+        evicted = cache.evict(keep=used_keys)
+        if evicted:
+            print(f"   Stage cache: evicted {len(evicted)} least recently used entr"
+                  f"{'y' if len(evicted) == 1 else 'ies'}")
+        cache.save()
+    if args.trace:
+        trace_dir = run_kwargs["trace_dir"]
+        instrumentation.dump_spans(trace_dir)
+        export_trace(args.trace, args.trace_format, instrumentation.load_trace_dir(trace_dir))
+        shutil.rmtree(trace_dir, ignore_errors=True)
+    if args.profile:
+        print(f"cProfile / tracemalloc output saved to {args.profile}/\n")
+
     total = time.time() - total_start
     print(f"{BOLD}{CYAN}{'='*60}")
     print(f"  Pipeline Summary  ({total:.1f}s total)")
@@ -0,0 +1,207 @@
+"""
+sharded_model.py — One model per (region, service_type) shard, global fallback.
+
+Shards are trained in parallel and stored as one ``model_store`` directory
+each, next to a ``manifest.json`` that records the grouping columns, feature
+list, and each shard's location and training size. Series with fewer than
+``min_rows`` rows get no shard and are served by the global model. ShardedModel loads shards
+lazily on first use, so scoring one region only reads that region's models,
+and ``train_shards(..., only=[...])`` retrains selected shards without
+touching the rest.
+
+Every model is first fitted on Milestone 3's chronological train split and
+scored on its holdout rows; the holdout MAE is recorded in the shard
+metadata and the manifest, and the model is then refitted on all rows. The
+stored models have therefore seen every row, so compare shards with the
+single model on ``holdout_mae``, not on Milestone 4's in-sample MAE.
+
+Usage:
+    python sharded_model.py --out model_shards --group-cols region service_type
+    python sharded_model.py --out model_shards --only westus/compute
+    python milestone_4_integration.py --model model_shards
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from artifact_io import artifact_path, load_frame
+from sklearn.metrics import mean_absolute_error
+from milestone_3_model_development import FEATURES, TARGET, XGB_PARAMS, load_training_split
+from model_search import thread_budget
+from model_store import load_model, save_model
+
+SHARD_DIR = "model_shards"
+MANIFEST = "manifest.json"
+GROUP_COLS = ["region", "service_type"]
+MIN_SHARD_ROWS = 200
+GLOBAL_KEY = "__global__"
+
+
+def shard_key(values) -> str:
+    return "/".join(str(v) for v in values)
+
+
+def _shard_filename(key: str) -> str:
+    return "shard_" + re.sub(r"[^A-Za-z0-9_.-]+", "_", key)
+
+
+def _fit_shard(key: str, X: np.ndarray, y: np.ndarray, n_train: int, n_threads: int,
+               out_path: str) -> dict:
+    """Fit on the first ``n_train`` rows, score the rest, then refit on all rows."""
+    start = time.time()
+    holdout_mae = None
+    if 0 < n_train < len(y):
+        model = xgb.XGBRegressor(**XGB_PARAMS, n_jobs=n_threads)
+        model.fit(X[:n_train], y[:n_train])
+        holdout_mae = float(mean_absolute_error(y[n_train:], model.predict(X[n_train:])))
+    model = xgb.XGBRegressor(**XGB_PARAMS, n_jobs=n_threads)
+    model.fit(X, y)
+    metrics = {"holdout_mae": holdout_mae, "holdout_rows": int(len(y) - n_train)}
+    save_model(model, out_path, {"shard": key, "features": FEATURES, "train_rows": int(len(y)),
+                                 "metrics": metrics})
+    return {"key": key, "file": os.path.basename(out_path), "rows": int(len(y)), **metrics,
+            "fit_seconds": round(time.time() - start, 3),
+            "trained_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def _read_manifest(out_dir: str) -> dict:
+    path = os.path.join(out_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def train_shards(featured, out_dir: str = SHARD_DIR, group_cols=GROUP_COLS,
+                 min_rows: int = MIN_SHARD_ROWS, n_workers: int = None,
+                 only: list = None) -> dict:
+    """Train one XGBoost model per group plus a global fallback.
+
+    ``only`` restricts training to the listed shard keys (``"region/service"``)
+    and keeps every other manifest entry, including the global model, as is.
+    Returns the written manifest.
+    """
+    group_cols = list(group_cols)
+    df = load_frame(featured, columns=group_cols + FEATURES + [TARGET, "timestamp"])
+    if not pd.to_datetime(df["timestamp"]).is_monotonic_increasing:
+        df = df.sort_values("timestamp", kind="stable").reset_index(drop=True)
+    # Same chronological holdout as Milestone 3, shared by every shard
+    split_idx = load_training_split(df)["split_idx"]
+    os.makedirs(out_dir, exist_ok=True)
+
+    manifest = _read_manifest(out_dir)
+    if only and manifest.get("group_cols", group_cols) != group_cols:
+        raise ValueError(f"Existing shards are grouped by {manifest['group_cols']}, not {group_cols}")
+    shards = dict(manifest.get("shards", {})) if only else {}
+
+    X = df[FEATURES].to_numpy(dtype="float32")
+    y = df[TARGET].to_numpy(dtype="float64")
+    tasks = []
+    for values, idx in df.groupby(group_cols, sort=True, observed=True).indices.items():
+        key = shard_key(values if isinstance(values, tuple) else (values,))
+        if only and key not in only:
+            continue
+        if len(idx) < min_rows:
+            print(f"  [{key}] {len(idx)} rows < {min_rows} — served by the global model")
+            shards.pop(key, None)
+            continue
+        tasks.append((key, idx))
+    if not only:
+        tasks.append((GLOBAL_KEY, np.arange(len(df))))
+
+    n_workers = n_workers or min(os.cpu_count() or 1, 4)
+    n_threads = thread_budget(n_workers)
+    print(f"Training {len(tasks)} shard models with {n_workers} workers × {n_threads} threads...")
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        futures = [
+            pool.submit(_fit_shard, key, X[idx], y[idx], int(np.searchsorted(idx, split_idx)),
+                        n_threads, os.path.join(out_dir, _shard_filename(key)))
+            for key, idx in tasks
+        ]
+        results = [f.result() for f in futures]
+
+    global_entry = manifest.get("global") if only else None
+    for r in results:
+        if r["key"] == GLOBAL_KEY:
+            global_entry = r
+        else:
+            shards[r["key"]] = r
+    manifest = {"group_cols": group_cols, "features": FEATURES,
+                "global": global_entry, "shards": shards}
+    with open(os.path.join(out_dir, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    for r in sorted(results, key=lambda r: r["key"]):
+        mae = "n/a" if r["holdout_mae"] is None else f"{r['holdout_mae']:.4f}"
+        print(f"  [{r['key']}] holdout MAE {mae} on {r['holdout_rows']:,} rows")
+    print(f"{len(shards)} shards + global model recorded in {os.path.join(out_dir, MANIFEST)}")
+    return manifest
+
+
+class ShardedModel:
+    """Routes rows to their shard's model; unknown or sparse series use the global model."""
+
+    def __init__(self, shard_dir: str = SHARD_DIR):
+        self.shard_dir = shard_dir
+        self.manifest = _read_manifest(shard_dir)
+        if not self.manifest:
+            raise FileNotFoundError(f"No {MANIFEST} found in {shard_dir}")
+        self.group_cols = list(self.manifest["group_cols"])
+        self.features = list(self.manifest["features"])
+        self._models = {}
+
+    def _model(self, key: str):
+        """Load (once) the model serving ``key``."""
+        entry = self.manifest["shards"].get(key) or self.manifest["global"]
+        if entry is None:
+            raise KeyError(f"No shard for '{key}' and no global model in {self.shard_dir}")
+        name = entry["file"]
+        if name not in self._models:
+            self._models[name] = load_model(os.path.join(self.shard_dir, name))
+        return self._models[name]
+
+    def predict(self, frame: pd.DataFrame) -> np.ndarray:
+        """Predict ``frame`` (needs ``group_cols`` + features), one batch per shard.
+
+        Rows with a missing group value belong to no shard and use the global model.
+        """
+        X = frame[self.features].to_numpy(dtype="float32")
+        preds = np.full(len(frame), np.nan)
+        routed = np.zeros(len(frame), dtype=bool)
+        groups = frame.groupby(self.group_cols, sort=False, observed=True).indices
+        for values, idx in groups.items():
+            key = shard_key(values if isinstance(values, tuple) else (values,))
+            preds[idx] = self._model(key).predict(X[idx])
+            routed[idx] = True
+        if not routed.all():
+            preds[~routed] = self._model(GLOBAL_KEY).predict(X[~routed])
+        return preds
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Train per-series model shards")
+    parser.add_argument("--input", default=artifact_path("milestone_2_featured_data"))
+    parser.add_argument("--out", default=SHARD_DIR)
+    parser.add_argument("--group-cols", nargs="+", default=GROUP_COLS)
+    parser.add_argument("--min-rows", type=int, default=MIN_SHARD_ROWS)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--only", nargs="+", default=None,
+                        help="retrain only these shard keys, e.g. westus/compute")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.input):
+        print(f"Error: '{args.input}' not found. Please run Milestone 2 first.")
+        return 1
+    train_shards(args.input, out_dir=args.out, group_cols=args.group_cols,
+                 min_rows=args.min_rows, n_workers=args.workers, only=args.only)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""
+sketches.py — Small mergeable summaries for streaming statistics.
+
+QuantileSketch is a bounded-size, weighted centroid summary in the spirit of
+a t-digest with a uniform scale function. While the number of distinct
+values stays under ``max_centroids`` it is exact (and reproduces
+``np.quantile``'s linear interpolation); beyond that, neighbouring values are
+merged into equal-weight centroids and quantiles are interpolated between
+centroid centres, with rank error of roughly ``1 / max_centroids``.
+"""
+
+import numpy as np
+
+
+class QuantileSketch:
+    def __init__(self, max_centroids: int = 4096):
+        self.max_centroids = max_centroids
+        self._means = np.empty(0, dtype="float64")
+        self._weights = np.empty(0, dtype="float64")
+        self._pending = []
+        self._pending_n = 0
+        self._exact = True
+
+    @property
+    def count(self) -> float:
+        self._compress()
+        return float(self._weights.sum())
+
+    def update(self, values, weight: float = 1.0) -> None:
+        """Add ``values`` (NaNs are ignored), each with the given weight."""
+        values = np.asarray(values, dtype="float64").ravel()
+        values = values[~np.isnan(values)]
+        if values.size == 0 or weight <= 0:
+            return
+        self._pending.append((values, np.full(values.size, float(weight))))
+        self._pending_n += values.size
+        if self._pending_n > 8 * self.max_centroids:
+            self._compress()
+
+    def merge(self, other: "QuantileSketch") -> None:
+        other._compress()
+        self._pending.append((other._means, other._weights))
+        self._pending_n += other._means.size
+        self._exact &= other._exact
+        self._compress()
+
+    def _compress(self) -> None:
+        if not self._pending:
+            return
+        means = np.concatenate([self._means] + [m for m, _ in self._pending])
+        weights = np.concatenate([self._weights] + [w for _, w in self._pending])
+        self._pending, self._pending_n = [], 0
+
+        # Collapse identical values first — keeps low-cardinality data exact
+        uniq, inverse = np.unique(means, return_inverse=True)
+        weights = np.bincount(inverse, weights=weights)
+        means = uniq
+        if means.size > self.max_centroids:
+            # Merge neighbours into ~max_centroids equal-weight buckets
+            cum = np.cumsum(weights)
+            mid = cum - weights / 2
+            bucket = np.minimum(
+                (mid / cum[-1] * self.max_centroids).astype("int64"),
+                self.max_centroids - 1,
+            )
+            w = np.bincount(bucket, weights=weights)
+            m = np.bincount(bucket, weights=means * weights)
+            keep = w > 0
+            means, weights = m[keep] / w[keep], w[keep]
+            self._exact = False
+        self._means, self._weights = means, weights
+
+    def quantile(self, q):
+        """Return the ``q`` quantile(s) of everything added so far."""
+        self._compress()
+        q = np.asarray(q, dtype="float64")
+        if self._means.size == 0:
+            return np.full(q.shape, np.nan) if q.ndim else float("nan")
+        cum = np.cumsum(self._weights)
+        total = cum[-1]
+        if self._exact:
+            # Linear interpolation between order statistics, as np.quantile
+            rank = q * (total - 1)
+            lo, hi = np.floor(rank), np.ceil(rank)
+            idx_lo = np.minimum(np.searchsorted(cum, lo, side="right"), cum.size - 1)
+            idx_hi = np.minimum(np.searchsorted(cum, hi, side="right"), cum.size - 1)
+            v_lo, v_hi = self._means[idx_lo], self._means[idx_hi]
+            result = v_lo + (rank - lo) * (v_hi - v_lo)
+        else:
+            centres = cum - self._weights / 2
+            result = np.interp(q * total, centres, self._means)
+        return result if q.ndim else float(result)
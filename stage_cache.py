@@ -0,0 +1,225 @@
+"""
+stage_cache.py — Content-addressed cache of pipeline stage outputs.
+
+A stage's key is a SHA-256 over
+
+    * the stage's source code: its script plus every repository module it
+      imports, found transitively (``local_sources``),
+    * the contents of its input files / directories,
+    * its parameters (artifact format, library versions, CLI options).
+
+Outputs of a completed stage are copied into ``<root>/objects/<key>/``
+together with an ``entry.json`` that records their content hashes. On a hit
+the outputs are copied back (files that already match are left alone) and
+their hashes are remembered, so a downstream stage's key is computed without
+re-reading them. Because inputs are keyed by content, a re-run upstream
+stage that produces identical output does not invalidate the stages after it.
+
+File hashes are memoised on (path, size, mtime) in ``<root>/hashes.json``.
+When the store grows past ``max_bytes`` the least recently used entries are
+evicted.
+"""
+
+import ast
+import hashlib
+import json
+import os
+import shutil
+import time
+
+CACHE_DIR = ".stage_cache"
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+ENTRY_FILE = "entry.json"
+HASH_BLOCK = 1 << 20
+
+
+def local_sources(script: str, root: str = None) -> list:
+    """``script`` plus the repository modules it imports, transitively.
+
+    Only top-level modules that exist as ``<root>/<name>.py`` are followed;
+    imports inside functions count too, so a lazily imported helper still
+    invalidates the stage.
+    """
+    root = root or os.path.dirname(os.path.abspath(script))
+    seen, pending = [], [os.path.abspath(script)]
+    while pending:
+        path = pending.pop()
+        if path in seen or not os.path.isfile(path):
+            continue
+        seen.append(path)
+        with open(path, encoding="utf-8") as f:
+            tree = ast.parse(f.read(), filename=path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                candidate = os.path.join(root, name.split(".")[0] + ".py")
+                if os.path.isfile(candidate):
+                    pending.append(os.path.abspath(candidate))
+    return sorted(seen)
+
+
+def _dir_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)
+
+
+class StageCache:
+    """Local artifact store for stage outputs, keyed by content hash."""
+
+    def __init__(self, root: str = CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.objects = os.path.join(root, "objects")
+        self._memo_path = os.path.join(root, "hashes.json")
+        self._memo = {}
+        if os.path.exists(self._memo_path):
+            try:
+                with open(self._memo_path, encoding="utf-8") as f:
+                    self._memo = json.load(f)
+            except (OSError, ValueError):
+                self._memo = {}
+
+    # --- hashing ---
+    def _file_hash(self, path: str) -> str:
+        st = os.stat(path)
+        memo_key = os.path.abspath(path)
+        cached = self._memo.get(memo_key)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            return cached[2]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(HASH_BLOCK), b""):
+                h.update(block)
+        digest = h.hexdigest()
+        self._memo[memo_key] = [st.st_size, st.st_mtime_ns, digest]
+        return digest
+
+    def path_hash(self, path: str) -> str:
+        """Content hash of a file or directory tree ("missing" if absent)."""
+        if os.path.isfile(path):
+            return self._file_hash(path)
+        if not os.path.isdir(path):
+            return "missing"
+        h = hashlib.sha256()
+        for dirpath, dirnames, files in os.walk(path):
+            dirnames.sort()
+            for name in sorted(files):
+                full = os.path.join(dirpath, name)
+                rel = os.path.relpath(full, path).replace(os.sep, "/")
+                h.update(f"{rel}\0{self._file_hash(full)}\n".encode())
+        return h.hexdigest()
+
+    def stage_key(self, name: str, sources: list, inputs: list, params: dict = None) -> str:
+        """Key for running stage ``name`` on ``inputs`` with ``sources`` and ``params``."""
+        h = hashlib.sha256(f"stage\0{name}\n".encode())
+        for path in sorted(sources):
+            h.update(f"src\0{os.path.basename(path)}\0{self._file_hash(path)}\n".encode())
+        for path in inputs:
+            h.update(f"in\0{path}\0{self.path_hash(path)}\n".encode())
+        h.update(json.dumps(params or {}, sort_keys=True, default=str).encode())
+        return h.hexdigest()
+
+    # --- store ---
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.objects, key)
+
+    def lookup(self, key: str):
+        """The stored entry for ``key`` (None on a miss)."""
+        entry_path = os.path.join(self._entry_dir(key), ENTRY_FILE)
+        if not os.path.exists(entry_path):
+            return None
+        with open(entry_path, encoding="utf-8") as f:
+            entry = json.load(f)
+        # Touch for LRU eviction
+        entry["last_used"] = time.time()
+        with open(entry_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, indent=2)
+        return entry
+
+    def restore(self, entry: dict) -> list:
+        """Copy an entry's outputs back into place; returns the paths rewritten."""
+        src_dir = self._entry_dir(entry["key"])
+        rewritten = []
+        for i, out in enumerate(entry["outputs"]):
+            path, digest = out["path"], out["hash"]
+            if self.path_hash(path) == digest:
+                continue
+            stored = os.path.join(src_dir, str(i))
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            elif os.path.exists(path):
+                os.remove(path)
+            if out["is_dir"]:
+                shutil.copytree(stored, path)
+            else:
+                shutil.copy2(stored, path)
+            rewritten.append(path)
+            # Re-hash (cheap for files just read back from the page cache) so
+            # the memo is keyed on the restored mtimes
+            self.path_hash(path)
+        return rewritten
+
+    def store(self, key: str, name: str, outputs: list) -> dict:
+        """Copy ``outputs`` of stage ``name`` into the store under ``key``."""
+        final = self._entry_dir(key)
+        tmp = f"{final}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        recorded = []
+        for i, path in enumerate(outputs):
+            is_dir = os.path.isdir(path)
+            dest = os.path.join(tmp, str(i))
+            if is_dir:
+                shutil.copytree(path, dest)
+            else:
+                shutil.copy2(path, dest)
+            recorded.append({"path": path, "is_dir": is_dir, "hash": self.path_hash(path)})
+        now = time.time()
+        entry = {"key": key, "stage": name, "outputs": recorded, "created": now,
+                 "last_used": now, "size_bytes": _dir_size(tmp)}
+        with open(os.path.join(tmp, ENTRY_FILE), "w", encoding="utf-8") as f:
+            json.dump(entry, f, indent=2)
+        shutil.rmtree(final, ignore_errors=True)
+        os.replace(tmp, final)
+        return entry
+
+    def entries(self) -> list:
+        if not os.path.isdir(self.objects):
+            return []
+        out = []
+        for key in os.listdir(self.objects):
+            entry_path = os.path.join(self.objects, key, ENTRY_FILE)
+            if os.path.exists(entry_path):
+                with open(entry_path, encoding="utf-8") as f:
+                    out.append(json.load(f))
+        return out
+
+    def evict(self, keep=()) -> list:
+        """Drop least recently used entries until the store fits ``max_bytes``.
+
+        Keys in ``keep`` (those used by the current run) are never evicted.
+        Returns the evicted keys.
+        """
+        entries = sorted(self.entries(), key=lambda e: e["last_used"])
+        total = sum(e["size_bytes"] for e in entries)
+        evicted = []
+        for entry in entries:
+            if total <= self.max_bytes:
+                break
+            if entry["key"] in keep:
+                continue
+            shutil.rmtree(self._entry_dir(entry["key"]), ignore_errors=True)
+            total -= entry["size_bytes"]
+            evicted.append(entry["key"])
+        return evicted
+
+    def save(self) -> None:
+        """Persist the file-hash memo (dropping entries for vanished files)."""
+        os.makedirs(self.root, exist_ok=True)
+        self._memo = {p: v for p, v in self._memo.items() if os.path.exists(p)}
+        with open(self._memo_path, "w", encoding="utf-8") as f:
+            json.dump(self._memo, f)
@@ -0,0 +1,80 @@
+import pandas as pd
+from artifact_io import read_table, write_table
+
+
+def _sample():
+    return pd.DataFrame({
+        "timestamp": pd.to_datetime(["2022-01-01", "2022-01-02"]),
+        "region": ["westus", "eastus"],
+        "service_type": ["compute", "storage"],
+        "usage_units": [100.0, 200.0],
+        "hour": [0, 0],
+        "usage_lag_1": [0.0, 100.0],
+    })
+
+
+def test_parquet_roundtrip_keeps_typed_schema(tmp_path):
+    path = tmp_path / "featured.parquet"
+    write_table(_sample(), path)
+    df = read_table(path)
+    assert pd.api.types.is_datetime64_any_dtype(df["timestamp"])
+    assert isinstance(df["region"].dtype, pd.CategoricalDtype)
+    assert df["hour"].dtype == "int8"
+    assert df["usage_lag_1"].dtype == "float32"
+    assert df["usage_units"].tolist() == [100.0, 200.0]
+
+
+def test_column_projection_skips_missing(tmp_path):
+    path = tmp_path / "featured.feather"
+    write_table(_sample(), path)
+    df = read_table(path, columns=["usage_units", "hour", "not_a_column"])
+    assert df.columns.tolist() == ["usage_units", "hour"]
+
+
+def test_dtype_policy_narrows_without_losing_values():
+    import numpy as np
+    from artifact_io import apply_schema
+
+    df = pd.DataFrame({
+        "region": ["westus", "eastus", "westus"],
+        "day_of_month": [1, 15, 31],
+        "is_holiday": [0.0, 1.0, 0.0],
+        "usage_units": [100.25, 200.0, 150.0],
+        "provisioned_capacity_allocated": [120.0, 250.0, 180.0],
+        "availability_pct": [99.95, 99.9, 99.99],
+        "usage_rolling_mean_30": [1.0, 2.0, 3.0],
+    })
+    lean = apply_schema(df)
+    assert isinstance(lean["region"].dtype, pd.CategoricalDtype)
+    assert lean["day_of_month"].dtype == "int8" and lean["is_holiday"].dtype == "int8"
+    assert lean["usage_rolling_mean_30"].dtype == "float32"
+    # Exact in float32 → narrowed; 99.95 is not → kept; the target is never narrowed
+    assert lean["provisioned_capacity_allocated"].dtype == "float32"
+    assert lean["availability_pct"].dtype == "float64"
+    assert lean["usage_units"].dtype == "float64"
+    assert np.array_equal(lean["provisioned_capacity_allocated"], df["provisioned_capacity_allocated"])
+    assert lean.memory_usage(deep=True).sum() < df.memory_usage(deep=True).sum()
+
+
+def test_dtype_policy_leaves_model_metrics_unchanged():
+    import numpy as np
+    from artifact_io import apply_schema
+    from milestone_3_model_development import FEATURES, TARGET, fit_candidate
+
+    rng = np.random.default_rng(0)
+    n = 600
+    df = pd.DataFrame({c: rng.integers(0, 7, n).astype("int64") for c in FEATURES})
+    for c in ["usage_lag_1", "usage_lag_7", "usage_rolling_mean_3", "usage_rolling_mean_7",
+              "usage_spike"]:
+        df[c] = rng.random(n) * 1000 / 3
+    df[TARGET] = df["usage_lag_1"] * 0.8 + rng.normal(scale=10, size=n)
+    lean = apply_schema(df)
+    assert lean["usage_lag_1"].dtype == "float32" and lean["hour"].dtype == "int8"
+
+    for name in ("Random Forest", "XGBoost"):
+        metrics = []
+        for frame in (df, lean):
+            X, y = frame[FEATURES], frame[TARGET]
+            fit = fit_candidate(name, X[:480], y[:480], X[480:], y[480:], n_jobs=1)
+            metrics.append((fit["mae"], fit["rmse"]))
+        assert metrics[0] == metrics[1], name
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+from backtest import rolling_origin_folds, run_backtest
+from milestone_3_model_development import FEATURES, TARGET
+
+
+def test_expanding_folds_are_contiguous_and_time_aligned():
+    ts = pd.Series(pd.date_range("2024-01-01", periods=100, freq="D").repeat(3))
+    folds = rolling_origin_folds(ts, n_folds=4, test_days=10)
+    assert len(folds) == 4
+    assert all(start == 0 for start, _, _ in folds)
+    for (_, _, prev_end), (_, train_end, _) in zip(folds, folds[1:]):
+        assert train_end == prev_end
+    assert folds[-1][2] == len(ts)
+    # Test windows start on a timestamp boundary
+    assert all(ts[train_end] != ts[train_end - 1] for _, train_end, _ in folds)
+
+
+def test_sliding_folds_bound_the_training_window():
+    ts = pd.Series(pd.date_range("2024-01-01", periods=100, freq="D"))
+    folds = rolling_origin_folds(ts, n_folds=3, test_days=10, mode="sliding", train_days=20)
+    assert all(train_end - start == 20 for start, train_end, _ in folds)
+    with pytest.raises(ValueError):
+        rolling_origin_folds(ts, n_folds=3, test_days=10, mode="sliding")
+
+
+def test_run_backtest_scores_every_test_row_once():
+    rng = np.random.default_rng(0)
+    stamps = pd.date_range("2024-01-01", periods=60, freq="D")
+    df = pd.DataFrame({"timestamp": stamps.repeat(2), "region": ["eastus", "westus"] * 60,
+                       "service_type": "compute"})
+    df[FEATURES] = rng.uniform(0, 10, (len(df), len(FEATURES)))
+    df[TARGET] = df["usage_lag_1"] * 10 + rng.normal(size=len(df))
+
+    fold_metrics, series_metrics = run_backtest(df, n_folds=3, test_days=5, n_workers=2)
+    folds = rolling_origin_folds(df["timestamp"], n_folds=3, test_days=5)
+    assert len(fold_metrics) == 2 * 3
+    for model, group in fold_metrics.groupby("model"):
+        assert group["train_rows"].tolist() == [end - start for start, end, _ in folds]
+        assert group["test_rows"].tolist() == [end - train_end for _, train_end, end in folds]
+        per_series = series_metrics[series_metrics["model"] == model]
+        assert per_series["test_rows"].tolist() == [3 * 5, 3 * 5]
+        assert per_series["test_rows"].sum() == group["test_rows"].sum()
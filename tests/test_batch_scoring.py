@@ -0,0 +1,57 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+import xgboost as xgb
+from batch_scoring import score_fleet
+from milestone_4_integration import CAPACITY_COL, FEATURES
+from model_store import save_model
+
+
+def test_score_fleet_writes_every_row_once(tmp_path):
+    rng = np.random.default_rng(0)
+    n = 600
+    df = pd.DataFrame(rng.uniform(0, 10, (n, len(FEATURES))), columns=FEATURES)
+    df["timestamp"] = np.repeat(pd.date_range("2024-01-01", periods=n // 3, freq="D"), 3)
+    df["region"] = rng.choice(["eastus", "westus"], n)
+    df["service_type"] = "compute"
+    df["usage_units"] = df["usage_lag_1"] * 10
+    df[CAPACITY_COL] = rng.uniform(50, 150, n)
+    featured = tmp_path / "featured.csv"
+    df.to_csv(featured, index=False)
+    model = xgb.XGBRegressor(n_estimators=5, verbosity=0).fit(df[FEATURES], df["usage_units"])
+    model_dir = save_model(model, str(tmp_path / "model"))
+
+    out = tmp_path / "scored"
+    summary = score_fleet(str(featured), model_dir, out_dir=str(out), chunksize=128)
+    parts = sorted(out.glob("region=*/period=*/part.csv"))
+    scored = pd.concat(pd.read_csv(p) for p in parts)
+    assert summary["rows"] == len(scored) == n
+    assert summary["partitions"] == len(parts) == 2 * 7   # 2 regions × Jan–Jul 2024
+    assert sum(summary["actions"].values()) == n
+    assert json.loads((out / "_summary.json").read_text())["rows"] == n
+    with pytest.raises(FileExistsError):
+        score_fleet(str(featured), model_dir, out_dir=str(out))
+
+
+def test_score_fleet_caps_open_partition_writers(tmp_path):
+    rng = np.random.default_rng(1)
+    n = 300
+    df = pd.DataFrame(rng.uniform(0, 10, (n, len(FEATURES))), columns=FEATURES)
+    # Unsorted timestamps revisit partitions after their writer was closed
+    df["timestamp"] = rng.choice(pd.date_range("2024-01-01", periods=90, freq="D"), n)
+    df["region"] = rng.choice(["eastus", "westus"], n)
+    df["service_type"] = "compute"
+    df["usage_units"] = df["usage_lag_1"] * 10
+    df[CAPACITY_COL] = rng.uniform(50, 150, n)
+    featured = tmp_path / "featured.csv"
+    df.to_csv(featured, index=False)
+    model = xgb.XGBRegressor(n_estimators=5, verbosity=0).fit(df[FEATURES], df["usage_units"])
+    model_dir = save_model(model, str(tmp_path / "model"))
+
+    out = tmp_path / "scored"
+    summary = score_fleet(str(featured), model_dir, out_dir=str(out), chunksize=50,
+                          max_open_writers=2)
+    parts = sorted(out.glob("region=*/period=*/part.*"))
+    assert summary["partitions"] == 2 * 3 and summary["part_files"] == len(parts) > 6
+    assert sum(len(pd.read_csv(p)) for p in parts) == n
@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+from bench_pipeline import generate_synthetic, scaling, write_synthetic
+
+
+def test_synthetic_data_matches_sample_schema():
+    df = generate_synthetic(5_000, seed=1, duplicate_frac=0.01)
+    assert list(df.columns) == ["timestamp", "region", "service_type", "usage_units",
+                                "provisioned_capacity_allocated", "cost_usd",
+                                "availability_pct", "is_holiday"]
+    assert len(df) == 5_000
+    assert df["timestamp"].is_monotonic_increasing
+    assert df.duplicated().sum() >= 1
+    assert set(df["service_type"]) == {"Compute", "Storage"}
+    assert df.equals(generate_synthetic(5_000, seed=1, duplicate_frac=0.01))
+
+
+def test_chunked_generation_stays_sorted_and_streams_to_disk(tmp_path):
+    df = generate_synthetic(5_000, seed=2, chunk_rows=700)
+    assert len(df) == 5_000 and df["timestamp"].is_monotonic_increasing
+    assert isinstance(df["region"].dtype, pd.CategoricalDtype)
+    assert df.index.equals(pd.RangeIndex(5_000))
+
+    path = tmp_path / "raw.csv"
+    write_synthetic(str(path), 5_000, seed=2, chunk_rows=700)
+    written = pd.read_csv(path, parse_dates=["timestamp"])
+    assert len(written) == 5_000
+    assert (written["region"] == df["region"].astype(str)).all()
+
+
+def test_scaling_reports_first_superlinear_step():
+    sizes = [10_000, 100_000, 1_000_000]
+    results = [{"rows": n, "stage": "prep", "status": "ok", "seconds": n / 1e4} for n in sizes]
+    results += [{"rows": n, "stage": "train", "status": "ok", "seconds": s}
+                for n, s in zip(sizes, [1.0, 10.0, 1000.0])]
+    out = scaling(results)
+    assert np.isclose(out["prep"]["exponent"], 1.0)
+    assert out["prep"]["superlinear_from"] is None
+    assert out["train"]["superlinear_from"] == 1_000_000
@@ -0,0 +1,26 @@
+import pandas as pd
+from bench_replay import compare, map_request
+
+
+def test_records_without_series_fields_map_deterministically():
+    series = [("eastus", "compute"), ("westus", "storage")]
+    last = {s: 100.0 for s in series}
+    origin = pd.Timestamp("2024-12-31")
+    record = {"request_id": "user-001", "title": "Speed things up", "body": "..."}
+    first = map_request(record, series, last, origin)
+    assert first == map_request(dict(record), series, last, origin)
+    assert (first["region"], first["service_type"]) in series
+    assert pd.Timestamp(first["timestamp"]) > origin
+    assert 80.0 <= first["provisioned_capacity"] <= 130.0
+
+    explicit = {"region": "eastus", "service_type": "compute", "timestamp": "2025-01-05",
+                "provisioned_capacity": 42.0}
+    assert map_request(explicit, series, last, origin) == explicit
+
+
+def test_compare_flags_throughput_and_tail_latency_regressions():
+    base = {"throughput_rps": 1000.0, "latency_ms": {"p50": 2.0, "p95": 4.0, "p99": 8.0}}
+    same = {"throughput_rps": 980.0, "latency_ms": {"p50": 2.1, "p95": 4.0, "p99": 8.5}}
+    worse = {"throughput_rps": 700.0, "latency_ms": {"p50": 2.0, "p95": 4.0, "p99": 12.0}}
+    assert compare(same, base) == []
+    assert [r.split()[0] for r in compare(worse, base)] == ["throughput", "p99"]
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+from milestone_4_integration import ACTIONS, CAPACITY_COL, _get_action, compute_capacity_actions
+
+
+def _frame(n=300):
+    rng = np.random.default_rng(1)
+    return pd.DataFrame({
+        "region": rng.choice(["eastus", "westus"], n),
+        "service_type": rng.choice(["compute", "storage"], n),
+        "forecasted_usage": rng.uniform(50, 150, n).astype("float32"),
+        CAPACITY_COL: rng.uniform(50, 200, n).round(),
+    })
+
+
+def test_matches_row_wise_rules():
+    df = _frame()
+    out = compute_capacity_actions(df)
+    assert list(out["infrastructure_action"].cat.categories) == ACTIONS
+    expected = df.assign(recommended_capacity=out["recommended_capacity"]).apply(_get_action, axis=1)
+    assert (out["infrastructure_action"].astype(str) == expected).all()
+    assert (out["potential_savings"] >= 0).all()
+
+
+def test_per_series_thresholds_override_defaults():
+    df = _frame()
+    thresholds = pd.DataFrame({"region": ["eastus"], "service_type": ["compute"],
+                               "buffer_pct": [0.5], "action_margin": [np.nan]})
+    out = compute_capacity_actions(df, thresholds=thresholds)
+    base = compute_capacity_actions(df)
+    hit = (df["region"] == "eastus") & (df["service_type"] == "compute")
+    np.testing.assert_allclose(out.loc[hit, "recommended_capacity"],
+                               df.loc[hit, "forecasted_usage"] * 1.5, rtol=1e-6)
+    pd.testing.assert_frame_equal(out[~hit], base[~hit])
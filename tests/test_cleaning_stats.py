@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+from milestone_1_data_prep import _cap_outliers_iqr, _grouped_quantiles, prepare_data
+
+
+def _reference_cap(df, cols):
+    """The original column-by-column pandas implementation."""
+    df = df.copy()
+    for col in cols:
+        q1, q3 = df[col].quantile(0.25), df[col].quantile(0.75)
+        iqr = q3 - q1
+        df[col] = df[col].clip(lower=q1 - 1.5 * iqr, upper=q3 + 1.5 * iqr)
+    return df
+
+
+def test_block_capping_matches_per_column_pandas():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(rng.standard_t(2, size=(5_000, 4)), columns=list("abcd"))
+    block = df.to_numpy(copy=True)
+    _cap_outliers_iqr(block, list(df.columns))
+    np.testing.assert_allclose(block, _reference_cap(df, df.columns).to_numpy())
+
+
+def test_grouped_quantiles_match_pandas_groupby():
+    rng = np.random.default_rng(1)
+    n, n_groups = 20_000, 3_000
+    codes = rng.integers(0, n_groups, n)
+    block = rng.normal(size=(n, 2))
+    block[rng.random((n, 2)) < 0.1] = np.nan
+    got = _grouped_quantiles(block, codes, n_groups, [0.25, 0.5, 0.75])
+
+    frame = pd.DataFrame(block, columns=["x", "y"]).assign(g=codes)
+    expected = frame.groupby("g")[["x", "y"]].quantile([0.25, 0.5, 0.75])
+    for i, q in enumerate([0.25, 0.5, 0.75]):
+        want = expected.xs(q, level=1).reindex(range(n_groups)).to_numpy()
+        np.testing.assert_allclose(got[:, i], want, rtol=1e-12, atol=1e-12)
+
+
+def test_per_series_cleaning_uses_each_series_bounds():
+    rng = np.random.default_rng(2)
+    big = pd.DataFrame({"region": "eastus", "usage_units": rng.normal(10_000, 500, 500)})
+    small = pd.DataFrame({"region": "westus", "usage_units": rng.normal(100, 5, 50)})
+    df = pd.concat([big, small], ignore_index=True).assign(
+        timestamp="2024-01-01", service_type="compute")
+    df["usage_units"] += np.arange(len(df)) * 1e-6   # keep rows distinct
+
+    fleet = prepare_data(df)
+    per_series = prepare_data(df, group_cols=["region", "service_type"])
+    small_fleet = fleet.loc[fleet["region"] == "westus", "usage_units"]
+    small_series = per_series.loc[per_series["region"] == "westus", "usage_units"]
+    # Fleet-wide bounds are dominated by the big region and flatten the small one
+    assert small_fleet.nunique() < small_series.nunique()
+    assert small_series.min() > 50
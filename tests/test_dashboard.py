@@ -0,0 +1,97 @@
+import base64
+import gzip
+import json
+import os
+import numpy as np
+import pandas as pd
+from generate_dashboard import build_dashboard, minmax_indices
+
+
+def _report(path, n=5000, regions=("eastus", "westus")):
+    rng = np.random.default_rng(0)
+    frames = []
+    for region in regions:
+        usage = rng.uniform(50, 150, n)
+        usage[1234] = 999.0       # spike the downsampling must keep
+        frames.append(pd.DataFrame({
+            "timestamp": pd.date_range("2023-01-01", periods=n, freq="h"),
+            "region": region, "service_type": "compute",
+            "usage_units": usage, "forecasted_usage": usage * 0.98,
+            "recommended_capacity": usage * 1.15, "provisioned_capacity_allocated": 160.0,
+            "infrastructure_action": rng.choice(["UPSCALE", "DOWNSCALE", "MAINTAIN"], n),
+        }))
+    pd.concat(frames).sample(frac=1, random_state=0).to_csv(path, index=False)
+
+
+def _shard(data_dir, region):
+    with open(os.path.join(data_dir, "manifest.json"), encoding="utf-8") as f:
+        name = json.load(f)[region]["file"]
+    with open(os.path.join(data_dir, name), encoding="utf-8") as f:
+        b64 = f.read().split('"')[-2]
+    return json.loads(gzip.decompress(base64.b64decode(b64)))
+
+
+def test_minmax_indices_keeps_extremes_within_budget():
+    values = np.random.default_rng(1).normal(size=(100_000, 3))
+    keep = minmax_indices(values, 2000)
+    assert len(keep) <= 2000
+    assert keep[0] == 0 and keep[-1] == len(values) - 1
+    for j in range(3):
+        assert values[:, j].argmax() in keep and values[:, j].argmin() in keep
+    assert len(minmax_indices(values[:50], 2000)) == 50
+
+
+def test_shards_are_downsampled_sorted_and_lazy(tmp_path):
+    report = tmp_path / "report.csv"
+    _report(report)
+    out = tmp_path / "dashboard.html"
+    info = build_dashboard(str(report), str(tmp_path / "missing.txt"), str(out), max_points=500)
+    assert info["regions"] == 2 and sorted(info["rewritten"]) == ["eastus", "westus"]
+
+    shard = _shard(tmp_path / "dashboard_data", "eastus")
+    assert shard["rows"] == 5000 and len(shard["timestamps"]) <= 500
+    assert shard["timestamps"] == sorted(shard["timestamps"])
+    assert max(shard["actual"]) == 999.0
+    html = out.read_text(encoding="utf-8")
+    assert "dashboard_data/eastus-" in html and "999.0" not in html
+
+
+def test_unchanged_regions_are_not_rewritten(tmp_path):
+    report = tmp_path / "report.csv"
+    _report(report)
+    out = str(tmp_path / "dashboard.html")
+    build_dashboard(str(report), "missing.txt", out)
+
+    df = pd.read_csv(report)
+    df.loc[df["region"] == "westus", "forecasted_usage"] += 1.0
+    df.to_csv(report, index=False)
+    info = build_dashboard(str(report), "missing.txt", out)
+    assert info["rewritten"] == ["westus"]
+    shards = [f for f in os.listdir(tmp_path / "dashboard_data") if f.endswith(".js")]
+    assert len(shards) == 2      # the stale westus shard was removed
+
+
+def test_dashboard_reads_a_batch_scoring_directory(tmp_path):
+    import xgboost as xgb
+    from batch_scoring import score_fleet
+    from milestone_4_integration import CAPACITY_COL, FEATURES
+    from model_store import save_model
+
+    rng = np.random.default_rng(0)
+    n = 400
+    df = pd.DataFrame(rng.uniform(0, 10, (n, len(FEATURES))), columns=FEATURES)
+    df["timestamp"] = pd.date_range("2023-11-01", periods=n, freq="D")
+    df["region"] = rng.choice(["eastus", "westus"], n)
+    df["service_type"] = "compute"
+    df["usage_units"] = df["usage_lag_1"] * 10
+    df[CAPACITY_COL] = rng.uniform(50, 150, n)
+    df.to_csv(tmp_path / "featured.csv", index=False)
+    model = xgb.XGBRegressor(n_estimators=5, verbosity=0).fit(df[FEATURES], df["usage_units"])
+    model_dir = save_model(model, str(tmp_path / "model"))
+    scored = tmp_path / "scored"
+    score_fleet(str(tmp_path / "featured.csv"), model_dir, out_dir=str(scored), chunksize=100)
+
+    info = build_dashboard(str(scored), str(tmp_path / "missing.txt"),
+                           str(tmp_path / "dashboard.html"))
+    assert info["rows"] == n and info["regions"] == 2
+    assert sum(_shard(tmp_path / "dashboard_data", r)["rows"] for r in ("eastus", "westus")) == n
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+from drift_monitor import DriftMonitor, ew_accumulate
+
+
+def _scored(start, n, bias=None):
+    """Hourly scored rows for two series; ``bias`` adds forecast error to westus."""
+    rng = np.random.default_rng(start)
+    frames = []
+    for region in ("eastus", "westus"):
+        actual = 100 + rng.normal(scale=5, size=n)
+        forecast = actual + rng.normal(scale=2, size=n)
+        if bias is not None and region == "westus":
+            forecast = forecast + bias * actual
+        frames.append(pd.DataFrame({
+            "timestamp": pd.date_range("2024-01-01", periods=n, freq="h") + pd.Timedelta(hours=start),
+            "region": region, "service_type": "compute",
+            "usage_units": actual, "forecasted_usage": forecast,
+            "provisioned_capacity_allocated": 150.0,
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def test_batched_update_matches_sequential_ewma():
+    rng = np.random.default_rng(0)
+    codes = rng.integers(0, 3, 200)
+    values = rng.normal(size=200)
+    values[::17] = np.nan
+    decay = 0.9
+    S, W = np.zeros(3), np.zeros(3)
+    ew_accumulate(S, W, codes[:120], values[:120], decay)
+    ew_accumulate(S, W, codes[120:], values[120:], decay)
+    for c in range(3):
+        x = pd.Series(values[codes == c]).dropna()
+        expected = x.ewm(alpha=1 - decay, adjust=True).mean().iloc[-1]
+        assert np.isclose(S[c] / W[c], expected)
+
+
+def test_emits_one_event_for_the_drifting_series_only(tmp_path):
+    monitor = DriftMonitor()
+    assert monitor.update(_scored(0, 200)) == []
+    # Overlapping snapshot: rows before the watermark are ignored
+    n_before = monitor.arrays["n"].copy()
+    monitor.update(_scored(100, 100))
+    np.testing.assert_array_equal(monitor.arrays["n"], n_before)
+
+    events = monitor.update(_scored(200, 100, bias=0.3))
+    assert [e["series"] for e in events] == ["westus/compute"]
+    assert "bias" in events[0]["reasons"]
+    assert monitor.update(_scored(300, 50, bias=0.3)) == []      # still flagged, no repeat
+    assert monitor.retrain_targets(["region"]) == ["westus"]
+
+    path = str(tmp_path / "drift.pkl")
+    monitor.save(path)
+    loaded = DriftMonitor.load(path)
+    assert loaded.flagged() == ["westus/compute"]
+    assert loaded.acknowledge() == ["westus/compute"]
+    assert loaded.flagged() == []
@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+from milestone_2_feature_engineering import add_lag_rolling_features
+
+
+def _reference(df, lags, windows):
+    """The original per-group lambda implementation."""
+    grp = df.groupby(["region", "service_type"])["usage_units"]
+    out = {}
+    for k in lags:
+        out[f"usage_lag_{k}"] = grp.transform(lambda x: x.shift(k))
+    for w in windows:
+        out[f"usage_rolling_mean_{w}"] = grp.transform(
+            lambda x: x.rolling(window=w, min_periods=1).mean()
+        )
+    return pd.DataFrame(out)
+
+
+def test_engine_is_bit_identical_to_per_group_lambdas():
+    rng = np.random.default_rng(0)
+    n = 2_000
+    df = pd.DataFrame({
+        "region": rng.choice(["westus", "eastus", "northeurope"], n),
+        "service_type": rng.choice(["compute", "storage"], n),
+        "usage_units": rng.random(n) * 1e4,
+    })
+    df.loc[rng.random(n) < 0.05, "usage_units"] = np.nan
+    lags, windows = [1, 2, 7, 24], [3, 7, 24, 168]
+
+    expected = _reference(df, lags, windows)
+    got = add_lag_rolling_features(df.copy(), lags=lags, windows=windows)
+    for col in expected.columns:
+        a, b = expected[col].to_numpy(), got[col].to_numpy()
+        assert np.array_equal(np.isnan(a), np.isnan(b)), col
+        assert np.array_equal(a[~np.isnan(a)].view("u8"), b[~np.isnan(b)].view("u8")), col
@@ -0,0 +1,112 @@
+import asyncio
+import json
+import numpy as np
+import pandas as pd
+from forecast_service import ForecastService
+from incremental_features import FeatureState
+
+
+class _Persistence:
+    def predict(self, X):
+        return X["usage_lag_1"].to_numpy()
+
+
+def _state():
+    stamps = pd.date_range("2024-01-01", periods=10, freq="D")
+    history = pd.concat([
+        pd.DataFrame({"timestamp": stamps, "region": region, "service_type": "compute",
+                      "usage_units": np.arange(10, dtype=float) + offset})
+        for region, offset in (("eastus", 0.0), ("westus", 100.0))
+    ], ignore_index=True)
+    return FeatureState().fit(history)
+
+
+async def _request(port, method, path, payload=None):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = json.dumps(payload).encode() if payload is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\n"
+                 f"Connection: close\r\n\r\n".encode() + body)
+    await writer.drain()
+    raw = await reader.read()
+    writer.close()
+    head, _, data = raw.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(data)
+
+
+def test_service_batches_concurrent_requests_and_tracks_state():
+    async def scenario():
+        service = ForecastService(_Persistence(), _state(), max_wait_ms=20)
+        server = await service.start("127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            req = {"region": "westus", "service_type": "compute", "timestamp": "2024-01-11"}
+            responses = await asyncio.gather(*(_request(port, "POST", "/forecast", req) for _ in range(20)))
+            assert all(status == 200 and body["forecasted_usage"] == 109.0 for status, body in responses)
+            assert service.stats["batches"] < 20
+
+            status, body = await _request(port, "POST", "/recommend",
+                                          dict(req, provisioned_capacity=200.0))
+            assert body["infrastructure_action"] == "DOWNSCALE"
+
+            await _request(port, "POST", "/observe", {"region": "westus", "service_type": "compute",
+                                                      "usage_units": 150.0})
+            status, body = await _request(port, "POST", "/forecast", req)
+            assert body["forecasted_usage"] == 150.0
+
+            status, _ = await _request(port, "POST", "/forecast", dict(req, region="nowhere"))
+            assert status == 404
+            status, metrics = await _request(port, "GET", "/metrics")
+            assert metrics["latency_ms"]["p99"] is not None and metrics["cache_hits"] > 0
+        finally:
+            await service.stop(server)
+
+    asyncio.run(scenario())
+
+
+def test_recommend_plans_capacity_at_the_service_level():
+    class _Quantiles:
+        quantiles = (0.5, 0.9)
+        features = None
+
+        def predict(self, X):
+            lag = X["usage_lag_1"].to_numpy()
+            return np.column_stack([lag, lag * 1.5])
+
+    async def scenario():
+        service = ForecastService(_Persistence(), _state(), quantile_model=_Quantiles(),
+                                  service_level=0.9)
+        service.start_batching()
+        try:
+            return await service.submit({"region": "westus", "service_type": "compute",
+                                         "timestamp": "2024-01-11", "provisioned_capacity": 200.0})
+        finally:
+            await service.stop()
+
+    result = asyncio.run(scenario())
+    assert result["forecast_service_level"] == 109.0 * 1.5
+    assert result["recommended_capacity"] == 109.0 * 1.5      # no flat 15% on top
+
+
+def test_requests_past_the_next_step_are_rejected():
+    async def scenario():
+        service = ForecastService(_Persistence(), _state(), max_wait_ms=1)
+        server = await service.start("127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            # History ends 2024-01-10: only 2024-01-11 is one step ahead
+            req = {"region": "eastus", "service_type": "compute", "timestamp": "2024-01-13"}
+            status, body = await _request(port, "POST", "/forecast", req)
+            assert status == 400 and "horizon_forecast.py" in body["error"]
+            for usage in (10.0, 11.0):
+                await _request(port, "POST", "/observe", {"region": "eastus",
+                                                          "service_type": "compute",
+                                                          "usage_units": usage})
+            status, body = await _request(port, "POST", "/forecast", req)
+            assert status == 200 and body["forecasted_usage"] == 11.0
+            # Other series have not advanced
+            status, _ = await _request(port, "POST", "/forecast", dict(req, region="westus"))
+            assert status == 400
+        finally:
+            await service.stop(server)
+
+    asyncio.run(scenario())
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+from horizon_forecast import forecast_horizon
+
+
+class _EchoFeature:
+    """Predicts one input feature unchanged."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def predict(self, X):
+        return X[self.name].to_numpy()
+
+
+def _history(n_days=20):
+    stamps = pd.date_range("2024-01-01", periods=n_days, freq="D")
+    return pd.concat([
+        pd.DataFrame({"timestamp": stamps, "region": region, "service_type": "compute",
+                      "usage_units": np.arange(n_days, dtype=float) + offset})
+        for region, offset in (("eastus", 0.0), ("westus", 100.0))
+    ], ignore_index=True)
+
+
+def test_persistence_model_repeats_last_value():
+    out = forecast_horizon(_EchoFeature("usage_lag_1"), _history(), horizon=5)
+    assert len(out) == 10
+    assert out["timestamp"].min() == pd.Timestamp("2024-01-21")
+    last = out.groupby("region")["forecasted_usage"].agg(["min", "max"])
+    assert (last["min"] == last["max"]).all()
+    assert last.loc["westus", "max"] == 119.0
+
+
+def test_lag_7_model_cycles_last_week_from_its_own_forecasts():
+    out = forecast_horizon(_EchoFeature("usage_lag_7"), _history(), horizon=14, refine=0)
+    east = out[out["region"] == "eastus"]["forecasted_usage"].to_numpy()
+    np.testing.assert_array_equal(east, np.tile(np.arange(13, 20, dtype=float), 2))
+
+
+def test_spike_uses_the_milestone_2_window_whatever_the_rolling_features():
+    features = ["usage_rolling_mean_3", "usage_rolling_mean_14", "usage_spike"]
+    out = forecast_horizon(_EchoFeature("usage_spike"), _history(), horizon=1,
+                           features=features, refine=0)
+    # Current value is estimated by persistence, as in forecast_horizon
+    usage = pd.Series(np.append(np.arange(20, dtype=float), 19.0))
+    expected = usage.iloc[-2] / (usage.rolling(7).mean().iloc[-1] + 1e-6)
+    east = out[out["region"] == "eastus"]["forecasted_usage"].iloc[0]
+    assert np.isclose(east, expected, rtol=1e-6)
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+from incremental_features import FeatureState, verify_incremental
+
+
+def _cleaned(n_days=60, seed=0):
+    rng = np.random.default_rng(seed)
+    stamps = pd.date_range("2024-01-01", periods=n_days, freq="D")
+    rows = [
+        (ts, region, svc)
+        for ts in stamps
+        for region in ["westus", "eastus"]
+        for svc in ["compute", "storage"]
+        if rng.random() > 0.2
+    ]
+    df = pd.DataFrame(rows, columns=["timestamp", "region", "service_type"])
+    df["usage_units"] = rng.random(len(df)) * 1000
+    df["is_holiday"] = 0.0
+    return df
+
+
+def test_incremental_matches_full_recompute():
+    assert verify_incremental(_cleaned(), steps=10, lags=[1, 7, 14], windows=[3, 7, 14]) < 1e-9
+
+
+def test_update_rejects_rows_before_watermark():
+    df = _cleaned()
+    state = FeatureState().fit(df)
+    try:
+        state.update(df.tail(3))
+    except ValueError as exc:
+        assert "watermark" in str(exc)
+    else:
+        raise AssertionError("expected ValueError for stale rows")
@@ -0,0 +1,62 @@
+import json
+import os
+import time
+import pytest
+import instrumentation
+from instrumentation import profile_stage, span
+
+
+def test_spans_nest_and_export_as_chrome_trace(tmp_path):
+    instrumentation.reset()
+    with span("prepare_data.total"):
+        with span("prepare_data.dedupe", rows=10):
+            sum(range(1000))
+    records = instrumentation.spans()
+    assert [r["name"] for r in records] == ["prepare_data.dedupe", "prepare_data.total"]
+    assert records[0]["parent"] == "prepare_data.total"
+    assert records[0]["attrs"] == {"rows": 10}
+    assert records[1]["seconds"] >= records[0]["seconds"]
+
+    path = tmp_path / "trace.json"
+    instrumentation.export(str(path))
+    events = json.loads(path.read_text())["traceEvents"]
+    complete = [e for e in events if e["ph"] == "X"]
+    assert {e["name"] for e in complete} == {"prepare_data.dedupe", "prepare_data.total"}
+    assert all(e["cat"] == "prepare_data" for e in complete)
+
+    instrumentation.export(str(path), fmt="json")
+    summary = json.loads(path.read_text())["summary"]
+    assert summary[0]["name"] == "prepare_data.total" and summary[0]["calls"] == 1
+
+
+def test_profile_stage_writes_cprofile_and_tracemalloc_output(tmp_path):
+    instrumentation.reset()
+    with profile_stage("milestone_1", str(tmp_path)):
+        data = [list(range(100)) for _ in range(100)]
+    assert data
+    for suffix in (".prof", ".txt", ".tracemalloc.txt"):
+        assert os.path.getsize(tmp_path / f"milestone_1{suffix}") > 0
+    assert instrumentation.spans()[-1]["name"] == "milestone_1.total"
+    assert "py_alloc_delta_mb" in instrumentation.spans()[-1]
+
+
+def test_trace_dir_merges_processes_on_a_common_clock(tmp_path):
+    for pid, epoch in ((1, 100.0), (2, 102.5)):
+        with open(tmp_path / f"spans-{pid}.json", "w", encoding="utf-8") as f:
+            json.dump({"wall_epoch": epoch, "spans": [
+                {"name": f"stage{pid}", "start": 1.0, "seconds": 0.5, "pid": pid, "tid": 0}]}, f)
+    starts = {r["name"]: r["start"] for r in instrumentation.load_trace_dir(str(tmp_path))}
+    assert starts == {"stage1": 1.0, "stage2": 3.5}
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/statm"), reason="needs current RSS from /proc")
+def test_peak_rss_is_sampled_per_block():
+    with instrumentation.peak_rss(interval=0.005) as big:
+        blob = bytearray(64 * 1024 * 1024)
+        blob[::4096] = b"x" * len(blob[::4096])   # touch every page
+        time.sleep(0.05)
+    del blob
+    with instrumentation.peak_rss(interval=0.005) as small:
+        time.sleep(0.05)
+    assert big["peak_mb"] - big["start_mb"] > 32
+    assert small["peak_mb"] < big["peak_mb"] - 32
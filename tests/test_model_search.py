@@ -0,0 +1,43 @@
+import json
+import numpy as np
+import pandas as pd
+import model_search
+from model_search import run_search, thread_budget
+
+
+def test_successive_halving_keeps_the_top_fraction_per_rung():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.uniform(0, 10, (300, 3)), columns=["a", "b", "c"])
+    y = X["a"] * 3 + X["b"] + rng.normal(size=300)
+    space = {"XGBoost": [{"max_depth": d, "learning_rate": 0.3} for d in (1, 2, 3, 4, 5)],
+             "Random Forest": [{"max_depth": 4}]}
+    leaderboard, best = run_search(X[:240], y[:240], X[240:], y[240:], n_workers=2,
+                                   search_space=space, min_trees=2, max_trees=18, eta=3)
+
+    # 6 candidates → ceil(6/3) = 2 → 1 over rungs of 2, 6 and 18 trees
+    rungs = {r: g for r, g in leaderboard.groupby("rung")}
+    assert [len(rungs[r]) for r in (0, 1, 2)] == [6, 2, 1]
+    assert rungs[2]["n_estimators"].tolist() == [18]
+    for r in (0, 1):
+        promoted = rungs[r][rungs[r]["status"] == "promoted"]
+        assert set(zip(promoted["model"], promoted["params"])) == \
+            set(zip(rungs[r + 1]["model"], rungs[r + 1]["params"]))
+        # Promoted candidates are the ones with the lowest MAE on the rung
+        assert promoted["mae"].max() <= rungs[r][rungs[r]["status"] == "stopped"]["mae"].min()
+
+    assert leaderboard["rung"].tolist() == sorted(leaderboard["rung"], reverse=True)
+    for _, group in leaderboard.groupby("rung"):
+        assert group["mae"].is_monotonic_increasing
+    assert leaderboard.iloc[0]["status"] == "final"
+    assert best["mae"] == leaderboard.iloc[0]["mae"] and best["fitted"] is not None
+    assert json.dumps(best["params"]) == leaderboard.iloc[0]["params"]
+
+
+def test_thread_budget_splits_cores_between_workers(monkeypatch):
+    monkeypatch.setattr(model_search.os, "cpu_count", lambda: 8)
+    assert thread_budget(1) == 8
+    assert thread_budget(4) == 2
+    assert thread_budget(3) == 2            # 3 × 2 ≤ 8, never oversubscribed
+    assert thread_budget(16) == 1           # at least one thread each
+    monkeypatch.setattr(model_search.os, "cpu_count", lambda: None)
+    assert thread_budget(4) == 1
@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+import xgboost as xgb
+from model_store import ForestArrays, load_model, read_metadata, save_model
+
+
+def _data(n=400):
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(size=(n, 4)), columns=["a", "b", "c", "d"])
+    y = X["a"] * 3 + X["b"] ** 2 + rng.normal(scale=0.1, size=n)
+    return X, y
+
+
+def test_forest_round_trip_matches_sklearn(tmp_path):
+    X, y = _data()
+    model = RandomForestRegressor(n_estimators=10, random_state=0).fit(X, y)
+    path = save_model(model, str(tmp_path / "rf"), {"metrics": {"mae": 1.0}})
+    loaded = load_model(path)
+    assert isinstance(loaded, ForestArrays)
+    np.testing.assert_allclose(loaded.predict(X), model.predict(X), rtol=1e-12)
+    meta = read_metadata(path)
+    assert meta["format"] == "forest" and meta["features"] == ["a", "b", "c", "d"]
+    assert meta["metrics"]["mae"] == 1.0
+
+
+def test_xgboost_round_trip(tmp_path):
+    X, y = _data()
+    model = xgb.XGBRegressor(n_estimators=20, max_depth=3, verbosity=0).fit(X, y)
+    loaded = load_model(save_model(model, str(tmp_path / "xgb")))
+    np.testing.assert_array_equal(loaded.predict(X), model.predict(X))
@@ -0,0 +1,68 @@
+import time
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from milestone_3_model_development import FEATURES, TARGET, load_training_split, save_selected_model
+from model_store import read_metadata, save_model
+from model_update import plan_refresh, update_model
+
+
+def _featured(n=1200, series=1):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(rng.uniform(0, 10, (n, len(FEATURES))), columns=FEATURES)
+    df["timestamp"] = pd.date_range("2024-01-01", periods=-(-n // series), freq="h").repeat(series)[:n]
+    df[TARGET] = df["usage_lag_1"] * 10 + df["hour"] + rng.normal(scale=0.5, size=n)
+    return df
+
+
+def _stored_model(df, path, rows=600):
+    train = df.iloc[:rows]
+    model = xgb.XGBRegressor(n_estimators=10, max_depth=3, verbosity=0)
+    model.fit(train[FEATURES], train[TARGET])
+    save_model(model, path, {"watermark": str(train["timestamp"].max()),
+                             "full_train_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                             "incremental_updates": 0})
+
+
+def test_update_continues_boosting_on_new_rows_only(tmp_path):
+    df = _featured()
+    path = str(tmp_path / "model")
+    _stored_model(df, path)
+    result = update_model(df, path, trees=15, drift_state=None)
+    assert result["action"] == "updated" and result["new_rows"] == 600
+    assert result["candidate_mae"] <= result["current_mae"]
+    meta = read_metadata(path)
+    assert meta["n_trees"] == 25 and meta["incremental_updates"] == 1
+    assert pd.Timestamp(meta["watermark"]) == df["timestamp"].iloc[600 + 480 - 1]
+
+    # Holdout rows stay after the watermark; too few of them to update on
+    again = update_model(df.iloc[:1100], path, drift_state=None)
+    assert again["action"] == "skipped"
+
+
+def test_rows_sharing_the_watermark_timestamp_are_not_dropped(tmp_path, monkeypatch):
+    # 3 series per timestamp; Milestone 3's 80% split (row 800) cuts timestamp 266 in two
+    monkeypatch.chdir(tmp_path)
+    df = _featured(1000, series=3)
+    split = load_training_split(df)
+    assert split["split_idx"] == 800
+    model = xgb.XGBRegressor(n_estimators=10, max_depth=3, verbosity=0)
+    model.fit(split["X_train"], split["y_train"])
+    path = str(tmp_path / "model")
+    save_selected_model(split, (model, "XGBoost", 0.0, 0.0, []), path)
+    assert read_metadata(path)["watermark_rows"] == 2
+
+    result = update_model(df, path, trees=5, drift_state=None)
+    assert result["new_rows"] == len(df) - split["split_idx"]
+
+
+def test_plan_refresh_falls_back_to_full_rebuild():
+    now = time.time()
+    fresh = {"format": "xgboost", "watermark": "2024-01-01",
+             "full_train_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(now)),
+             "incremental_updates": 3}
+    assert plan_refresh(fresh, now=now)[0] == "update"
+    assert plan_refresh({**fresh, "format": "forest"}, now=now)[0] == "rebuild"
+    assert plan_refresh(fresh, drift_fraction=0.5, now=now)[0] == "rebuild"
+    assert plan_refresh({**fresh, "incremental_updates": 30}, now=now)[0] == "rebuild"
+    assert plan_refresh(fresh, now=now + 31 * 86400)[0] == "rebuild"
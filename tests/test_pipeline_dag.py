@@ -0,0 +1,68 @@
+import threading
+import pytest
+from pipeline_dag import Task, critical_path, no_result, plan_resume, run_dag
+
+
+def test_independent_tasks_overlap_and_receive_dependency_results(tmp_path):
+    barrier = threading.Barrier(2, timeout=5)
+
+    def branch(value):
+        barrier.wait()            # deadlocks unless both branches run at once
+        return value + 1
+
+    tasks = [
+        Task("load", lambda: 1),
+        Task("left", branch, ("load",)),
+        Task("right", branch, ("load",)),
+        Task("join", lambda a, b: a + b, ("left", "right")),
+    ]
+    result = run_dag(tasks, max_workers=2, state_path=str(tmp_path / "state.json"))
+    assert result.ok and result.results["join"] == 4
+    path, seconds = critical_path(tasks, result.timings)
+    assert path[0] == "load" and path[-1] == "join" and len(path) == 3
+    assert seconds <= result.wall + 1e-6
+
+
+def test_resume_continues_from_failed_task(tmp_path):
+    state = str(tmp_path / "state.json")
+    calls = []
+    fail = {"on": True}
+
+    def step(name, value=0):
+        calls.append(name)
+        if name == "plot" and fail["on"]:
+            raise RuntimeError("boom")
+        return value + 1
+
+    tasks = [
+        Task("prep", lambda: step("prep"), restore=lambda: 1),
+        Task("score", lambda v: step("score", v), ("prep",)),
+        Task("report", lambda v: step("report", v), ("score",), restore=no_result),
+        Task("plot", lambda v: step("plot", v), ("score",), restore=no_result),
+    ]
+    first = run_dag(tasks, max_workers=1, state_path=state)
+    assert not first.ok and first.failed == "plot"
+
+    fail["on"] = False
+    calls.clear()
+    assert plan_resume(tasks, {"prep", "score", "report"}) == {"score", "plot"}
+    second = run_dag(tasks, max_workers=1, state_path=state, resume=True)
+    assert second.ok and sorted(second.skipped) == ["prep", "report"]
+    # score has no restore, so it is recomputed from the restored prep result
+    assert calls == ["score", "plot"] and second.results["plot"] == 3
+
+
+def test_rejects_cycles_and_unknown_dependencies():
+    with pytest.raises(ValueError, match="cycle"):
+        run_dag([Task("a", lambda b: b, ("b",)), Task("b", lambda a: a, ("a",))], state_path=None)
+    with pytest.raises(ValueError, match="unknown"):
+        run_dag([Task("a", lambda x: x, ("x",))], state_path=None)
+
+
+def test_pipeline_tasks_accept_their_dependency_results():
+    import inspect
+    from run_all import pipeline_tasks
+
+    for task in pipeline_tasks():
+        # Raises TypeError if run_dag's call fn(*dep_results) would fail
+        inspect.signature(task.fn).bind(*[None] * len(task.deps))
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+from milestone_4_integration import CAPACITY_COL, FEATURES, plan_capacity
+from quantile_forecast import (
+    SERVICE_LEVEL_COL, fit_quantile_model, load_quantile_model, quantile_at,
+    save_quantile_model,
+)
+
+
+def _data(n=2000):
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.uniform(0, 10, (n, len(FEATURES))), columns=FEATURES)
+    # Noise grows with usage_lag_1, so the P90/P50 gap should too
+    y = X["usage_lag_1"] * 10 + rng.normal(scale=1 + X["usage_lag_1"], size=n)
+    return X, y
+
+
+def test_one_model_gives_ordered_calibrated_quantiles(tmp_path):
+    X, y = _data()
+    model = fit_quantile_model(X, y, quantiles=(0.5, 0.9, 0.99), n_jobs=1)
+    preds = model.predict(X)
+    assert preds.shape == (len(X), 3)
+    assert (np.diff(preds, axis=1) >= 0).all()
+    coverage = (y.to_numpy()[:, None] <= preds).mean(axis=0)
+    assert coverage[0] < coverage[1] < coverage[2]
+    spread = preds[:, 1] - preds[:, 0]
+    noisy = X["usage_lag_1"].to_numpy() > 5
+    assert spread[noisy].mean() > spread[~noisy].mean()
+
+    model_dir = str(tmp_path / "model")
+    save_quantile_model(model, model_dir)
+    loaded = load_quantile_model(model_dir)
+    np.testing.assert_allclose(loaded.predict(X), preds, rtol=1e-6)
+    assert loaded.quantiles == (0.5, 0.9, 0.99)
+    assert load_quantile_model(str(tmp_path / "missing")) is None
+
+
+def test_quantile_at_interpolates_between_trained_quantiles():
+    preds = np.array([[10.0, 20.0, 40.0]])
+    assert quantile_at(preds, (0.5, 0.9, 0.99), 0.9)[0] == 20.0
+    assert quantile_at(preds, (0.5, 0.9, 0.99), 0.7)[0] == pytest.approx(15.0)
+    with pytest.raises(ValueError):
+        quantile_at(preds, (0.5, 0.9, 0.99), 0.999)
+
+
+def test_plan_capacity_uses_service_level_without_flat_buffer():
+    X, y = _data(500)
+    model = fit_quantile_model(X, y, n_jobs=1)
+    frame = X.assign(region="eastus", service_type="compute", forecasted_usage=y,
+                     **{CAPACITY_COL: 100.0})
+    planned = plan_capacity(frame, model, service_level=0.99)
+    np.testing.assert_allclose(planned["recommended_capacity"], planned["forecast_p99"])
+    np.testing.assert_array_equal(planned[SERVICE_LEVEL_COL], planned["forecast_p99"])
+    flat = plan_capacity(frame)
+    np.testing.assert_allclose(flat["recommended_capacity"], y * 1.15, rtol=1e-6)
+
+
+def test_legacy_pkl_model_gets_a_sibling_quantile_store(tmp_path, monkeypatch):
+    from milestone_3_model_development import TARGET, train_and_evaluate
+
+    monkeypatch.chdir(tmp_path)
+    X, y = _data(400)
+    df = X.assign(**{TARGET: y}, timestamp=pd.date_range("2024-01-01", periods=len(X), freq="h"))
+    train_and_evaluate(df, str(tmp_path / "legacy_model.pkl"))
+    assert (tmp_path / "legacy_model.pkl").is_file()
+    assert (tmp_path / "legacy_model_quantiles").is_dir()
+    assert load_quantile_model(str(tmp_path / "legacy_model.pkl")).quantiles == (0.5, 0.9, 0.99)
@@ -0,0 +1,49 @@
+import os
+import numpy as np
+import pandas as pd
+from render_charts import render_charts
+
+
+def _scored(n=300):
+    rng = np.random.default_rng(0)
+    frames = []
+    for region in ("eastus", "westus"):
+        for s_type in ("compute", "storage"):
+            usage = rng.uniform(50, 150, n)
+            frames.append(pd.DataFrame({
+                "timestamp": pd.date_range("2023-01-01", periods=n, freq="h"),
+                "region": region, "service_type": s_type,
+                "usage_units": usage, "forecasted_usage": usage * 0.97,
+            }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def _charts(out):
+    return sorted(f for f in os.listdir(out) if f.endswith(".png"))
+
+
+def test_renders_every_series_and_skips_unchanged(tmp_path):
+    out = str(tmp_path / "charts")
+    df = _scored()
+    first = render_charts(df, out, n_workers=1, batch_size=3)
+    assert first["rendered"] == 4 and first["skipped"] == 0
+    assert _charts(out) == ["eastus__compute.png", "eastus__storage.png",
+                            "westus__compute.png", "westus__storage.png"]
+
+    again = render_charts(df, out, n_workers=1)
+    assert again["rendered"] == 0 and again["skipped"] == 4
+
+    df.loc[(df["region"] == "westus") & (df["service_type"] == "storage"), "forecasted_usage"] += 1
+    changed = render_charts(df, out, n_workers=1)
+    assert changed["rendered"] == 1 and changed["skipped"] == 3
+
+
+def test_removed_series_and_process_pool(tmp_path):
+    out = str(tmp_path / "charts")
+    df = _scored()
+    render_charts(df, out, n_workers=1)
+    summary = render_charts(df[df["region"] == "eastus"], out, fmt="svg",
+                            n_workers=2, batch_size=1)
+    assert summary["rendered"] == 2 and summary["removed"] == 4
+    assert sorted(os.listdir(out)) == ["eastus__compute.svg", "eastus__storage.svg",
+                                       "manifest.json"]
@@ -0,0 +1,56 @@
+import sys
+import types
+import pytest
+import run_all
+
+
+@pytest.fixture
+def stub_stages(tmp_path, monkeypatch):
+    """Replace the milestone functions with recorders; returns the call log."""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / run_all.RAW_DATA).write_text("timestamp\n")
+    calls = []
+
+    def stage(module, name, fn):
+        monkeypatch.setitem(sys.modules, module, types.SimpleNamespace(**{name: fn}))
+
+    def prepare_data(raw, out):
+        calls.append(("prep", raw, out))
+        return "cleaned"
+
+    def engineer_features(cleaned, out):
+        calls.append(("features", cleaned, out))
+        return "featured"
+
+    def train_and_evaluate(featured, model_path):
+        calls.append(("train", featured, model_path))
+        return "model"
+
+    def run_integration(featured, model, report, quantile_model=None):
+        calls.append(("integrate", featured, model))
+        return "latest"
+
+    stage("milestone_1_data_prep", "prepare_data", prepare_data)
+    stage("milestone_2_feature_engineering", "engineer_features", engineer_features)
+    stage("milestone_3_model_development", "train_and_evaluate", train_and_evaluate)
+    stage("milestone_4_integration", "run_integration", run_integration)
+    stage("quantile_forecast", "load_quantile_model", lambda path: None)
+    stage("render_charts", "render_charts", lambda latest, out: calls.append(("charts", latest)))
+    return calls
+
+
+def test_in_process_hands_frames_between_stages_without_intermediates(stub_stages):
+    assert run_all.run_in_process() == 0
+    assert stub_stages == [
+        ("prep", run_all.RAW_DATA, None),
+        ("features", "cleaned", None),
+        ("train", "featured", run_all.MODEL_PATH),
+        ("integrate", "featured", "model"),
+        ("charts", "latest"),
+    ]
+
+
+def test_in_process_writes_intermediates_on_request(stub_stages):
+    assert run_all.run_in_process(write_intermediates=True, fmt="parquet") == 0
+    assert stub_stages[0][2] == run_all.CLEANED_STEM + ".parquet"
+    assert stub_stages[1][2] == run_all.FEATURED_STEM + ".parquet"
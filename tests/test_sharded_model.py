@@ -0,0 +1,74 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from milestone_3_model_development import FEATURES, TARGET
+from sharded_model import MANIFEST, ShardedModel, train_shards
+
+
+class _Constant:
+    def __init__(self, value):
+        self.value = value
+
+    def predict(self, X):
+        return np.full(len(X), self.value)
+
+
+def _featured(n_stamps=150):
+    rng = np.random.default_rng(0)
+    stamps = pd.date_range("2024-01-01", periods=n_stamps, freq="h")
+    regions = ["eastus", "westus", "centralus"]
+    df = pd.DataFrame({"timestamp": stamps.repeat(len(regions)), "region": regions * n_stamps,
+                       "service_type": "compute"})
+    df[FEATURES] = rng.uniform(0, 10, (len(df), len(FEATURES)))
+    df[TARGET] = df["usage_lag_1"] * 10 + rng.normal(size=len(df))
+    return df
+
+
+def _mtimes(out_dir):
+    return {name: os.stat(os.path.join(out_dir, name, "metadata.json")).st_mtime_ns
+            for name in os.listdir(out_dir) if name != MANIFEST}
+
+
+def test_shards_record_holdout_mae_and_retrain_selectively(tmp_path):
+    df = _featured()
+    out = str(tmp_path / "shards")
+    manifest = train_shards(df, out_dir=out, min_rows=50, n_workers=1)
+    entries = list(manifest["shards"].values()) + [manifest["global"]]
+    assert len(manifest["shards"]) == 3
+    assert all(e["holdout_mae"] is not None and e["holdout_rows"] > 0 for e in entries)
+    # Holdout = the last 20% of timestamps, as in Milestone 3
+    assert manifest["shards"]["eastus/compute"]["holdout_rows"] == 30
+    assert manifest["global"]["holdout_rows"] == 90
+
+    before = _mtimes(out)
+    manifest = train_shards(df, out_dir=out, min_rows=50, n_workers=1, only=["westus/compute"])
+    after = _mtimes(out)
+    assert after["shard_westus_compute"] != before["shard_westus_compute"]
+    assert {k: v for k, v in after.items() if k != "shard_westus_compute"} == \
+        {k: v for k, v in before.items() if k != "shard_westus_compute"}
+    assert len(manifest["shards"]) == 3 and manifest["global"]["holdout_mae"] is not None
+
+
+def test_shards_load_lazily(tmp_path):
+    df = _featured()
+    out = str(tmp_path / "shards")
+    train_shards(df, out_dir=out, min_rows=50, n_workers=1)
+    model = ShardedModel(out)
+    assert model._models == {}
+    east = df[df["region"] == "eastus"].head(10)
+    assert np.isfinite(model.predict(east)).all()
+    assert list(model._models) == ["shard_eastus_compute"]
+
+
+def test_rows_without_a_shard_key_use_the_global_model(tmp_path):
+    manifest = {"group_cols": ["region", "service_type"], "features": FEATURES,
+                "global": {"file": "global"},
+                "shards": {"eastus/compute": {"file": "shard_eastus_compute"}}}
+    (tmp_path / MANIFEST).write_text(json.dumps(manifest))
+    model = ShardedModel(str(tmp_path))
+    model._models = {"global": _Constant(1.0), "shard_eastus_compute": _Constant(2.0)}
+
+    frame = pd.DataFrame(np.zeros((4, len(FEATURES))), columns=FEATURES).assign(
+        region=["eastus", None, "westus", "eastus"], service_type="compute")
+    np.testing.assert_array_equal(model.predict(frame), [2.0, 1.0, 1.0, 2.0])
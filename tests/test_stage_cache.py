@@ -0,0 +1,85 @@
+import os
+from stage_cache import StageCache, local_sources
+
+
+def _write(path, text):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def test_local_sources_follows_repository_imports(tmp_path):
+    _write(tmp_path / "stage.py", "import os\nfrom helper import f\n")
+    _write(tmp_path / "helper.py", "def f():\n    import leaf\n")
+    _write(tmp_path / "leaf.py", "import numpy\n")
+    found = [os.path.basename(p) for p in local_sources(str(tmp_path / "stage.py"))]
+    assert found == ["helper.py", "leaf.py", "stage.py"]
+
+
+def test_key_changes_with_source_input_and_params(tmp_path):
+    cache = StageCache(str(tmp_path / "cache"))
+    src, data = tmp_path / "stage.py", tmp_path / "in.csv"
+    _write(src, "x = 1\n")
+    _write(data, "a\n1\n")
+    key = cache.stage_key("s", [str(src)], [str(data)], {"format": "csv"})
+    assert key == cache.stage_key("s", [str(src)], [str(data)], {"format": "csv"})
+    assert key != cache.stage_key("s", [str(src)], [str(data)], {"format": "parquet"})
+    _write(data, "a\n2\n")
+    changed_input = cache.stage_key("s", [str(src)], [str(data)], {"format": "csv"})
+    _write(src, "x = 2\n")
+    changed_source = cache.stage_key("s", [str(src)], [str(data)], {"format": "csv"})
+    assert len({key, changed_input, changed_source}) == 3
+
+
+def test_store_restore_and_lru_eviction(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    cache = StageCache("cache", max_bytes=10_000)
+    os.makedirs("model")
+    _write("model/weights.bin", "w" * 4000)
+    _write("report.csv", "r" * 4000)
+    first = cache.store("k1", "train", ["model", "report.csv"])
+    assert first["size_bytes"] >= 8000
+
+    os.remove("report.csv")
+    _write("model/weights.bin", "changed")
+    assert sorted(cache.restore(cache.lookup("k1"))) == ["model", "report.csv"]
+    with open("model/weights.bin", encoding="utf-8") as f:
+        assert f.read() == "w" * 4000
+    assert cache.restore(cache.lookup("k1")) == []
+
+    _write("other.csv", "o" * 4000)
+    cache.store("k2", "integrate", ["other.csv"])
+    assert cache.evict(keep={"k2"}) == ["k1"]
+    assert cache.lookup("k1") is None and cache.lookup("k2") is not None
+
+
+def test_changed_drift_state_invalidates_milestone_4(tmp_path, monkeypatch):
+    import run_all
+
+    monkeypatch.chdir(tmp_path)
+    runs = []
+
+    def fake_run(label, description, script, **kwargs):
+        runs.append(script)
+        for path in ("optimization_actions_report.csv", "milestone_4_summary_report.txt"):
+            _write(path, "report\n")
+        _write(run_all.DRIFT_STATE, f"state after run {len(runs)}")
+        return True
+
+    monkeypatch.setattr(run_all, "run_milestone", fake_run)
+    _write("milestone_2_featured_data.csv", "a\n1\n")
+    os.makedirs(run_all.MODEL_PATH)
+    cache = StageCache("cache")
+    args = (cache, "Milestone 4", "Forecast Integration", "milestone_4_integration.py",
+            {"format": "csv"})
+
+    ok, first = run_all.run_cached(*args)
+    assert ok and runs == ["milestone_4_integration.py"]
+    # The run updated the drift state it was keyed on, so it runs again
+    ok, second = run_all.run_cached(*args)
+    assert second != first and len(runs) == 2
+    # Back to the state the second run saw: a hit restores the state it produced
+    _write(run_all.DRIFT_STATE, "state after run 1")
+    ok, third = run_all.run_cached(*args)
+    assert third == second and len(runs) == 2
+    with open(run_all.DRIFT_STATE, encoding="utf-8") as f:
+        assert f.read() == "state after run 2"